@@ -0,0 +1,273 @@
+"""Benchmarks of the stages of a transfer
+
+Walking, metadata extraction, path formatting, indexing and the copy and move
+loops are timed separately on a synthetic corpus. Every stage runs in a fresh
+process so that its peak memory use is measured on its own. Setup, like
+indexing before the copy loop, is not part of the timed section.
+
+Results can be saved as JSON and compared with an earlier run, in which case
+the exit code is 1 if any stage got slower or used more memory than allowed.
+
+Usage:
+    python benchmarks/bench.py --files 20000 --json results.json
+    python benchmarks/bench.py --files 20000 --baseline results.json
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import functools
+import json
+import logging
+import multiprocessing
+from pathlib import Path
+import shutil
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+from rich.console import Console
+from rich.table import Table
+
+from corpus import generate
+
+DIR_FORMAT = "%Y/%m/%d"
+DEFAULT_THRESHOLD = 0.1
+
+
+class Timer:
+    """Context manager measuring the timed section of a stage"""
+
+    def __init__(self):
+        self.seconds = 0.0
+
+    def __enter__(self) -> "Timer":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.seconds += time.perf_counter() - self._start
+
+
+# Stages take source directory, scratch directory, timer and number of jobs and
+# return the number of files and bytes processed
+Stage = Callable[[Path, Path, Timer, int], Tuple[int, int]]
+STAGES: Dict[str, Stage] = {}
+
+
+def stage(name: str):
+    def register(func: Stage) -> Stage:
+        STAGES[name] = func
+        return func
+
+    return register
+
+
+@stage("walk")
+def bench_walk(src: Path, work: Path, timer: Timer, jobs: int) -> Tuple[int, int]:
+    from imgtrf import core, extractors
+
+    with timer:
+        files = list(
+            core.walk(src, extensions=extractors.supported_extensions(), jobs=jobs)
+        )
+    return len(files), 0
+
+
+@stage("get_creation_time")
+def bench_creation_time(
+    src: Path, work: Path, timer: Timer, jobs: int
+) -> Tuple[int, int]:
+    from imgtrf import core, extractors, meta
+
+    files = list(core.walk(src, extensions=extractors.supported_extensions()))
+    with timer:
+        for path in files:
+            meta.get_creation_time(path)
+    return len(files), 0
+
+
+@stage("create_path_from")
+def bench_create_path_from(
+    src: Path, work: Path, timer: Timer, jobs: int
+) -> Tuple[int, int]:
+    from imgtrf import core, extractors
+
+    count = sum(1 for _ in core.walk(src, extensions=extractors.supported_extensions()))
+    start = datetime(2000, 1, 1)
+    dates = [start + timedelta(minutes=7 * number) for number in range(count)]
+    with timer:
+        for date in dates:
+            core._create_path_from(date, DIR_FORMAT)
+    return count, 0
+
+
+@stage("create_src_dest_pairs")
+def bench_pairs(src: Path, work: Path, timer: Timer, jobs: int) -> Tuple[int, int]:
+    from imgtrf import core
+
+    with timer:
+        pairs = core._create_src_dest_pairs(src, work / "dest", DIR_FORMAT, jobs=jobs)
+    return len(pairs), 0
+
+
+@stage("copy")
+def bench_copy(src: Path, work: Path, timer: Timer, jobs: int) -> Tuple[int, int]:
+    from imgtrf import core
+
+    pairs = core._create_src_dest_pairs(src, work / "dest", DIR_FORMAT)
+    transfer = functools.partial(core._copy_file, create_dirs=False)
+    with timer:
+        core._transfer_files(pairs, transfer, "Copying", jobs=jobs)
+    return len(pairs), sum(dest.stat().st_size for _, dest in pairs)
+
+
+@stage("move")
+def bench_move(src: Path, work: Path, timer: Timer, jobs: int) -> Tuple[int, int]:
+    from imgtrf import core
+
+    moving = work / "moving"
+    shutil.copytree(src, moving)
+    pairs = core._create_src_dest_pairs(moving, work / "dest", DIR_FORMAT)
+    size = sum(path.stat().st_size for path, _ in pairs)
+    transfer = functools.partial(core._move_file, create_dirs=False)
+    with timer:
+        core._transfer_files(pairs, transfer, "Moving", jobs=jobs)
+    return len(pairs), size
+
+
+def _peak_rss() -> Optional[int]:
+    """Returns peak resident set size of this process in bytes"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Reported in kilobytes on Linux and in bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _run_stage(name: str, src: str, jobs: int, verbose: bool = False) -> dict:
+    from imgtrf.logger import FileSink, console
+
+    console.quiet = True
+    timer = Timer()
+    with tempfile.TemporaryDirectory(prefix="imgtrf-bench-") as work:
+        if verbose:
+            # Log every file, like --verbose with --log-file would
+            sink = FileSink(Path(work) / "bench.log", level=logging.INFO)
+        else:
+            logging.disable(logging.WARNING)
+        try:
+            files, size = STAGES[name](Path(src), Path(work), timer, jobs)
+        finally:
+            if verbose:
+                sink.close()
+
+    seconds = max(timer.seconds, 1e-9)
+    return {
+        "stage": name,
+        "files": files,
+        "bytes": size,
+        "seconds": timer.seconds,
+        "files_per_s": files / seconds,
+        "bytes_per_s": size / seconds,
+        "peak_rss": _peak_rss(),
+    }
+
+
+def run(
+    src: Path, stages: List[str], jobs: int = 1, verbose: bool = False
+) -> List[dict]:
+    """Runs stages one by one, each in a process of its own
+
+    With `verbose`, every stage logs at info level to a file.
+    """
+    context = multiprocessing.get_context("spawn")
+    results = []
+    for name in stages:
+        with context.Pool(1) as pool:
+            results.append(pool.apply(_run_stage, (name, str(src), jobs, verbose)))
+    return results
+
+
+def compare(results: List[dict], baseline: List[dict], threshold: float) -> List[str]:
+    """Returns descriptions of stages that regressed compared with baseline"""
+    previous = {result["stage"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        old = previous.get(result["stage"])
+        if old is None:
+            continue
+        if result["files_per_s"] < old["files_per_s"] * (1 - threshold):
+            regressions.append(
+                f"{result['stage']}: {result['files_per_s']:.0f} files/s, "
+                f"was {old['files_per_s']:.0f}"
+            )
+        if result["peak_rss"] and old["peak_rss"]:
+            if result["peak_rss"] > old["peak_rss"] * (1 + threshold):
+                regressions.append(
+                    f"{result['stage']}: peak RSS {result['peak_rss'] / 1024**2:.1f} "
+                    f"MB, was {old['peak_rss'] / 1024**2:.1f} MB"
+                )
+    return regressions
+
+
+def _print_results(results: List[dict], console: Console) -> None:
+    table = Table("Stage", "Files", "Seconds", "Files/s", "MB/s", "Peak RSS MB")
+    for result in results:
+        peak = result["peak_rss"]
+        table.add_row(
+            result["stage"],
+            str(result["files"]),
+            f"{result['seconds']:.3f}",
+            f"{result['files_per_s']:.0f}",
+            f"{result['bytes_per_s'] / 1024**2:.1f}" if result["bytes"] else "-",
+            f"{peak / 1024**2:.1f}" if peak else "-",
+        )
+    console.print(table)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--corpus", type=Path, help="Existing corpus to reuse")
+    parser.add_argument("--files", type=int, default=10_000)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--file-size", type=int, default=0, help="Bytes")
+    parser.add_argument("--jobs", type=int, default=1)
+    parser.add_argument("--stage", action="append", choices=list(STAGES))
+    parser.add_argument("--verbose", action="store_true", help="Log to a file")
+    parser.add_argument("--json", type=Path, help="Write results to file")
+    parser.add_argument("--baseline", type=Path, help="Compare with results file")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args()
+
+    console = Console()
+    stages = args.stage or list(STAGES)
+
+    with tempfile.TemporaryDirectory(prefix="imgtrf-corpus-") as temp_dir:
+        src = args.corpus
+        if src is None:
+            src = Path(temp_dir)
+            with console.status(f"Generating {args.files} files"):
+                generate(src, args.files, depth=args.depth, file_size=args.file_size)
+        results = run(src, stages, jobs=args.jobs, verbose=args.verbose)
+
+    _print_results(results, console)
+    if args.json:
+        args.json.write_text(json.dumps(results, indent=2))
+
+    if args.baseline:
+        baseline = json.loads(args.baseline.read_text())
+        regressions = compare(results, baseline, args.threshold)
+        for regression in regressions:
+            console.print(f"[red]Regression[/red] {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
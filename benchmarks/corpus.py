@@ -0,0 +1,166 @@
+"""Generator of synthetic media trees for benchmarking
+
+Images are JPEGs with the creation time in their EXIF block and videos are MP4
+files with the creation time in their movie header. Both are built from
+templates, so generating millions of files is limited by the file system
+rather than by encoding. Unsupported files are mixed in and the files are
+spread over a tree of configurable depth.
+
+Usage:
+    python benchmarks/corpus.py {directory} --files 100000 --depth 6
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import io
+from pathlib import Path
+import random
+import struct
+from typing import NamedTuple
+
+from PIL import Image
+
+_EPOCH = datetime(1904, 1, 1)
+_START = datetime(2000, 1, 1)
+_SPAN_SECONDS = 25 * 365 * 24 * 3600
+_UNSUPPORTED_EXT = ["txt", "xmp", "aae", "thm", "ini"]
+
+
+class Corpus(NamedTuple):
+    root: Path
+    files: int
+    media_files: int
+    bytes: int
+
+
+def _jpeg_body() -> bytes:
+    """Returns a small encoded JPEG without its start of image marker"""
+    buffer = io.BytesIO()
+    with Image.new("RGB", (16, 16), (90, 120, 150)) as image:
+        image.save(buffer, format="JPEG")
+    return buffer.getvalue()[2:]
+
+
+_JPEG_BODY = _jpeg_body()
+
+
+def jpeg_bytes(creation_time: datetime, padding: int = 0) -> bytes:
+    """Returns a JPEG with creation time as EXIF DateTime
+
+    `padding` bytes are added as a comment to reach a wanted file size.
+    """
+    value = creation_time.strftime("%Y:%m:%d %H:%M:%S").encode() + b"\0"
+    # Little endian TIFF with one IFD entry, value stored right after the IFD
+    value_offset = 8 + 2 + 12 + 4
+    tiff = b"II*\0" + struct.pack("<I", 8)
+    tiff += struct.pack("<H", 1)
+    tiff += struct.pack("<HHII", 0x0132, 2, len(value), value_offset)
+    tiff += struct.pack("<I", 0) + value
+    exif = b"Exif\0\0" + tiff
+    app1 = b"\xff\xe1" + struct.pack(">H", len(exif) + 2) + exif
+
+    comments = b""
+    while padding > 0:
+        chunk = min(padding, 65533)
+        comments += b"\xff\xfe" + struct.pack(">H", chunk + 2) + bytes(chunk)
+        padding -= chunk
+    return b"\xff\xd8" + app1 + comments + _JPEG_BODY
+
+
+def _box(box_type: bytes, content: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(content), box_type) + content
+
+
+def mp4_bytes(creation_time: datetime, padding: int = 0) -> bytes:
+    """Returns an MP4 stub with creation time in its movie header"""
+    seconds = int((creation_time - _EPOCH).total_seconds())
+    ftyp = _box(b"ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso2mp41")
+    mvhd = _box(b"mvhd", struct.pack(">B3xIII", 0, seconds, seconds, 1000) + bytes(84))
+    mdat = _box(b"mdat", bytes(padding))
+    return ftyp + _box(b"moov", mvhd) + mdat
+
+
+def generate(
+    root: Path,
+    files: int,
+    depth: int = 4,
+    fan_out: int = 8,
+    video_ratio: float = 0.1,
+    unsupported_ratio: float = 0.05,
+    file_size: int = 0,
+    seed: int = 0,
+) -> Corpus:
+    """Writes a synthetic media tree below root
+
+    Args:
+        root (Path): Directory to write files to, created if missing
+        files (int): Total number of files
+        depth (int): Maximum directory depth below root
+        fan_out (int): Number of sub directories per directory
+        video_ratio (float): Share of media files that are videos
+        unsupported_ratio (float): Share of files without a supported extension
+        file_size (int): Approximate size in bytes of every media file
+        seed (int): Seed making the tree reproducible
+    """
+    rng = random.Random(seed)
+    total_bytes = 0
+    media_files = 0
+    created = set()
+
+    for number in range(files):
+        parts = [f"d{rng.randrange(fan_out)}" for _ in range(rng.randint(0, depth))]
+        directory = root.joinpath(*parts)
+        if directory not in created:
+            directory.mkdir(parents=True, exist_ok=True)
+            created.add(directory)
+
+        creation_time = _START + timedelta(seconds=rng.randrange(_SPAN_SECONDS))
+        kind = rng.random()
+        if kind < unsupported_ratio:
+            extension = rng.choice(_UNSUPPORTED_EXT)
+            data = bytes(128)
+        elif kind < unsupported_ratio + video_ratio:
+            extension = "mp4"
+            data = mp4_bytes(creation_time, padding=file_size)
+            media_files += 1
+        else:
+            extension = "jpg"
+            data = jpeg_bytes(creation_time, padding=file_size)
+            media_files += 1
+
+        (directory / f"file{number:08}.{extension}").write_bytes(data)
+        total_bytes += len(data)
+
+    return Corpus(root, files, media_files, total_bytes)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("root", type=Path)
+    parser.add_argument("--files", type=int, default=10_000)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--fan-out", type=int, default=8)
+    parser.add_argument("--video-ratio", type=float, default=0.1)
+    parser.add_argument("--unsupported-ratio", type=float, default=0.05)
+    parser.add_argument("--file-size", type=int, default=0, help="Bytes")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    corpus = generate(
+        args.root,
+        files=args.files,
+        depth=args.depth,
+        fan_out=args.fan_out,
+        video_ratio=args.video_ratio,
+        unsupported_ratio=args.unsupported_ratio,
+        file_size=args.file_size,
+        seed=args.seed,
+    )
+    print(
+        f"Wrote {corpus.files} files, {corpus.media_files} media, "
+        f"{corpus.bytes / 1024**2:.1f} MB to {corpus.root}"
+    )
+
+
+if __name__ == "__main__":
+    main()
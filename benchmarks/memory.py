@@ -0,0 +1,82 @@
+"""Benchmark of the memory used by planned transfers
+
+Builds the transfers of a synthetic tree in memory, without touching the file
+system, both as a list of `(src, dest)` path pairs and as a `PlanTable`. Each
+representation is built in a fresh process and its peak memory is reported,
+scaled to one million files.
+
+Usage:
+    python benchmarks/memory.py --files 1000000
+"""
+
+import argparse
+from datetime import datetime, timedelta
+import multiprocessing
+from pathlib import Path
+import random
+from typing import Iterator
+
+from rich.console import Console
+from rich.table import Table
+
+from bench import _peak_rss
+
+SRC_DIR = Path("/mnt/camera/DCIM")
+DEST_DIR = Path("/mnt/archive/photos")
+
+
+def planned_transfers(files: int, seed: int = 0) -> Iterator[tuple]:
+    """Yields transfers from a camera like tree into a Y/m/d tree"""
+    from imgtrf.plan import PlannedTransfer
+
+    rng = random.Random(seed)
+    start = datetime(2000, 1, 1)
+    for number in range(files):
+        created = start + timedelta(seconds=rng.randrange(25 * 365 * 24 * 3600))
+        name = f"IMG_{number:08}.JPG"
+        yield PlannedTransfer(
+            SRC_DIR / f"{100 + number // 9999}CANON" / name,
+            DEST_DIR / created.strftime("%Y/%m/%d") / name,
+            rng.randrange(1024**2, 8 * 1024**2),
+            created,
+        )
+
+
+def _measure(representation: str, files: int) -> dict:
+    # Measured against the peak of the generator alone
+    baseline = _peak_rss()
+    if representation == "pairs":
+        plan = [(planned.src, planned.dest) for planned in planned_transfers(files)]
+    else:
+        from imgtrf.plan import PlanTable
+
+        plan = PlanTable(planned_transfers(files))
+    assert len(plan) == files
+    peak = _peak_rss()
+    return {
+        "representation": representation,
+        "peak_rss": peak,
+        "growth": peak - baseline,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--files", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    context = multiprocessing.get_context("spawn")
+    table = Table("Representation", "Peak RSS MB", "MB per million files")
+    for representation in ("pairs", "table"):
+        with context.Pool(1) as pool:
+            result = pool.apply(_measure, (representation, args.files))
+        table.add_row(
+            representation,
+            f"{result['peak_rss'] / 1024**2:.0f}",
+            f"{result['growth'] / 1024**2 * 1_000_000 / args.files:.0f}",
+        )
+    Console().print(table)
+
+
+if __name__ == "__main__":
+    main()
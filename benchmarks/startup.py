@@ -0,0 +1,90 @@
+"""Benchmark of command line startup time
+
+Runs short commands, that return before any file is read, in fresh
+interpreters and reports how long they took and which heavy optional
+libraries got imported on the way.
+
+Usage:
+    python benchmarks/startup.py --runs 20
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import List
+
+from rich.console import Console
+from rich.table import Table
+
+# Libraries that only some files need and that should be imported on demand
+HEAVY_MODULES = ["PIL"]
+
+_REPORT_MODULES = (
+    "import runpy, sys\n"
+    "try:\n"
+    "    runpy.run_module('imgtrf', run_name='__main__')\n"
+    "except SystemExit:\n"
+    "    pass\n"
+    "print(','.join(m for m in {modules} if m in sys.modules), file=sys.stderr)\n"
+)
+
+
+def commands(scratch: str) -> dict:
+    return {
+        "--help": ["--help"],
+        "copy --help": ["copy", "--help"],
+        "remove dirs": ["remove", "dirs", scratch],
+    }
+
+
+def time_command(command: List[str], runs: int) -> List[float]:
+    """Returns wall clock seconds of every run of command"""
+    seconds = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def imported_heavy_modules(args: List[str]) -> List[str]:
+    """Returns heavy modules imported while running command"""
+    code = _REPORT_MODULES.format(modules=HEAVY_MODULES)
+    process = subprocess.run(
+        [sys.executable, "-c", code, *args],
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    last_line = process.stderr.strip().rsplit("\n", 1)[-1]
+    return [name for name in last_line.split(",") if name in HEAVY_MODULES]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    args = parser.parse_args()
+
+    table = Table("Command", "Min ms", "Median ms", "Heavy imports")
+    # Startup of a bare interpreter, the part imgtrf can not do anything about
+    bare = time_command([sys.executable, "-c", "pass"], args.runs)
+    table.add_row("python -c pass", *_format(bare), "-")
+    with tempfile.TemporaryDirectory(prefix="imgtrf-startup-") as scratch:
+        for name, command in commands(scratch).items():
+            seconds = time_command(
+                [sys.executable, "-m", "imgtrf", *command], args.runs
+            )
+            heavy = imported_heavy_modules(command)
+            table.add_row(name, *_format(seconds), ", ".join(heavy) or "-")
+    Console().print(table)
+
+
+def _format(seconds: List[float]) -> List[str]:
+    return [f"{min(seconds) * 1000:.0f}", f"{statistics.median(seconds) * 1000:.0f}"]
+
+
+if __name__ == "__main__":
+    main()
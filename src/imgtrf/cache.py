@@ -0,0 +1,181 @@
+"""Persistent cache of file creation times
+
+Extracting metadata means opening every image and probing every video. Results
+are stored in a SQLite database keyed on file identity so unchanged files can be
+resolved from the cache on later runs.
+"""
+from datetime import datetime
+import os
+from pathlib import Path
+import platform
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+
+import logging
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 1_000_000
+CACHE_FILE_NAME = "metadata.sqlite"
+
+# Number of pending writes before they are committed
+_COMMIT_INTERVAL = 1000
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS creation_time (
+    device INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    creation_time TEXT NOT NULL,
+    source TEXT NOT NULL,
+    last_used REAL NOT NULL,
+    PRIMARY KEY (device, inode)
+)
+"""
+
+
+def default_cache_dir() -> Path:
+    """Returns user cache directory, can be overridden with `IMGTRF_CACHE_DIR`"""
+    if "IMGTRF_CACHE_DIR" in os.environ:
+        return Path(os.environ["IMGTRF_CACHE_DIR"])
+
+    if platform.system() == "Windows" and "LOCALAPPDATA" in os.environ:
+        return Path(os.environ["LOCALAPPDATA"]) / "imgtrf"
+
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / "imgtrf"
+
+
+class MetadataCache:
+    """SQLite backed cache of creation times keyed on file identity
+
+    A file is identified by device and inode. Size and modification time are
+    stored along with the result and a mismatch on either is treated as a miss,
+    so modified files are always extracted again. The least recently used
+    entries are evicted on `close` when the cache exceeds `max_entries`.
+
+    Can be used from several threads at once.
+    """
+
+    def __init__(self, path: Optional[Path] = None, max_entries=DEFAULT_MAX_ENTRIES):
+        if path is None:
+            path = default_cache_dir() / CACHE_FILE_NAME
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._connection = sqlite3.connect(str(path), check_same_thread=False)
+        self._connection.execute(_SCHEMA)
+
+    def __enter__(self) -> "MetadataCache":
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def get(self, path: Path) -> Optional[Tuple[datetime, str]]:
+        """Returns cached creation time and its source, None if not cached"""
+        key = _file_key(path)
+        if key is None:
+            return None
+        device, inode, size, mtime_ns = key
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT size, mtime_ns, creation_time, source FROM creation_time "
+                "WHERE device = ? AND inode = ?",
+                (device, inode),
+            ).fetchone()
+            if row is None or row[0] != size or row[1] != mtime_ns:
+                return None
+
+            self._connection.execute(
+                "UPDATE creation_time SET last_used = ? WHERE device = ? AND inode = ?",
+                (time.time(), device, inode),
+            )
+            self._written()
+
+        return datetime.fromisoformat(row[2]), row[3]
+
+    def put(self, path: Path, creation_time: datetime, source: str) -> None:
+        """Stores creation time of file along with where it was found"""
+        key = _file_key(path)
+        if key is None:
+            return
+
+        with self._lock:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO creation_time VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (*key, creation_time.isoformat(), source, time.time()),
+            )
+            self._written()
+
+    def invalidate(self, path: Path) -> None:
+        """Removes any cached entry for file"""
+        key = _file_key(path)
+        if key is None:
+            return
+
+        with self._lock:
+            self._connection.execute(
+                "DELETE FROM creation_time WHERE device = ? AND inode = ?", key[:2]
+            )
+            self._written()
+
+    def clear(self) -> None:
+        """Removes all cached entries"""
+        with self._lock:
+            self._connection.execute("DELETE FROM creation_time")
+            self._connection.commit()
+            self._pending = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._connection.execute(
+                "SELECT COUNT(*) FROM creation_time"
+            ).fetchone()[0]
+
+    def evict(self) -> int:
+        """Removes least recently used entries above `max_entries`
+
+        Returns:
+            int: Number of removed entries
+        """
+        with self._lock:
+            cursor = self._connection.execute(
+                "DELETE FROM creation_time WHERE rowid IN ("
+                "SELECT rowid FROM creation_time ORDER BY last_used DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            )
+            self._connection.commit()
+            self._pending = 0
+
+        if cursor.rowcount:
+            log.info(f"Evicted {cursor.rowcount} entries from metadata cache")
+        return cursor.rowcount
+
+    def close(self) -> None:
+        """Evicts surplus entries and closes the database"""
+        self.evict()
+        self._connection.close()
+
+    def _written(self) -> None:
+        # Committing every write would make the cache slower than extraction
+        self._pending += 1
+        if self._pending >= _COMMIT_INTERVAL:
+            self._connection.commit()
+            self._pending = 0
+
+
+def _file_key(path: Path) -> Optional[Tuple[int, int, int, int]]:
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns
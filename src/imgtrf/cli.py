@@ -1,22 +1,217 @@
+from contextlib import nullcontext
+import cProfile
+import logging
 from pathlib import Path
+from typing import List, Optional
 
 import typer
 from rich import print
+from rich.markup import escape
 
 from imgtrf import logger
 from imgtrf import core
+from imgtrf import device
+from imgtrf import exceptions
+from imgtrf import meta
+from imgtrf import probe
+from imgtrf import stats
+from imgtrf.cache import MetadataCache
+from imgtrf.index import Compare
+from imgtrf.journal import JournalError
+from imgtrf.template import compile_template
+from imgtrf.manifest import MANIFEST_NAME
+from imgtrf.meta import TimeSource
+from imgtrf.plan import PlanError, parse_shard
+from imgtrf import transfer
+from imgtrf import watch
+from imgtrf.transfer import Mode, Sync
 
 app = typer.Typer(name="Image Transfer", add_completion=False)
 
 
+def _validate_dir_format(dir_format: str) -> str:
+    try:
+        compile_template(dir_format)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    return dir_format
+
+
 _option_dir_format = typer.Option(
     default="Y/m/d",
     help="""Format of destination directory.Directories seperated with '/' and format codes with '%' followed by single character.""",
+    callback=_validate_dir_format,
+)
+
+_option_jobs = typer.Option(
+    1,
+    "--jobs",
+    "-j",
+    min=1,
+    help="Number of files to extract metadata from and transfer concurrently.",
+)
+
+_option_stream = typer.Option(
+    False,
+    "--stream",
+    help="Start transferring while the source directory is still being indexed.",
+)
+
+_option_include = typer.Option(
+    None,
+    "--include",
+    help="Only transfer files matching glob pattern. Can be given several times.",
+)
+
+_option_exclude = typer.Option(
+    None,
+    "--exclude",
+    help="Skip files and directories matching glob pattern. Can be given several times.",
+)
+
+_option_compare = typer.Option(
+    Compare.NAME,
+    "--compare",
+    help="When an existing destination file counts as already transferred: "
+    "same name, same name and size, or same name, size and modification time.",
+)
+
+_option_dedup = typer.Option(
+    False,
+    "--dedup",
+    help="Compare files by content. Skip files identical to one in the destination "
+    "and rename files whose name is taken by a different file.",
+)
+
+_help_mode = (
+    "How files on the same device as the destination are transferred. "
+    "Files on other devices are always copied."
+)
+
+_option_buffer_size = typer.Option(
+    transfer.DEFAULT_BUFFER_SIZE // 1024**2,
+    "--buffer-size",
+    min=1,
+    help="Size in MB of each read and write when copying data.",
+)
+
+_option_sync = typer.Option(
+    Sync.NONE,
+    "--sync",
+    help="When copied files are flushed to disk: left to the operating system, "
+    "or before each file is renamed into place, with its directory flushed "
+    "right after or in batches of --sync-every MB.",
+)
+
+_option_sync_every = typer.Option(
+    transfer.DEFAULT_SYNC_INTERVAL // 1024**2,
+    "--sync-every",
+    min=1,
+    help="MB written between directory flushes with '--sync batch'.",
+)
+_option_verify = typer.Option(
+    False,
+    "--verify",
+    help="Hash copied data while copying and compare it with the destination. "
+    "A moved file is only removed once its copy is found identical.",
+)
+_option_manifest = typer.Option(
+    False,
+    "--manifest",
+    help=f"Record every transferred file in {MANIFEST_NAME} in the destination. "
+    "Hashes of verified copies are reused by --dedup in later runs.",
+)
+_option_resume = typer.Option(
+    False,
+    "--resume",
+    help="Continue an interrupted run from the journal in the destination, "
+    "without indexing files that were already planned.",
+)
+
+_option_time_source = typer.Option(
+    None,
+    "--time-source",
+    help="Where to look for the creation time of a file, tried in the order given: "
+    "date and time in the file name, image or video metadata, or modification "
+    "time. Can be given several times. Defaults to metadata, followed by "
+    "modification time on Windows.",
+)
+
+_option_no_cache = typer.Option(
+    False,
+    "--no-cache",
+    help="Do not read or store creation times in the metadata cache.",
+)
+
+_option_probe_jobs = typer.Option(
+    probe.DEFAULT_MAX_WORKERS,
+    "--probe-jobs",
+    min=1,
+    help="Maximum number of ffprobe processes running at the same time.",
+)
+
+_option_probe_timeout = typer.Option(
+    probe.DEFAULT_TIMEOUT,
+    "--probe-timeout",
+    min=0.1,
+    help="Seconds before an ffprobe process is killed.",
+)
+
+_option_max_in_flight = typer.Option(
+    core.DEFAULT_MAX_IN_FLIGHT // 1024**2,
+    "--max-in-flight",
+    min=1,
+    help="Maximum size in MB of files being transferred at the same time.",
+)
+
+_option_device_jobs = typer.Option(
+    None,
+    "--device-jobs",
+    min=1,
+    help="Number of files read or written concurrently on any one device. "
+    "Defaults to 1 for spinning disks and --jobs for other devices.",
+)
+
+_option_max_rate = typer.Option(
+    None,
+    "--max-rate",
+    min=1,
+    help="Maximum MB per second copied, shared by all transfers.",
 )
 
 
 @app.callback()
-def main(verbose: bool = False, debug: bool = False):
+def main(
+    ctx: typer.Context,
+    verbose: bool = False,
+    debug: bool = False,
+    stats_file: Optional[Path] = typer.Option(
+        None,
+        "--stats",
+        help="Write counts and timings of each stage as JSON to this file and "
+        "print a summary when done.",
+    ),
+    profile_file: Optional[Path] = typer.Option(
+        None,
+        "--profile",
+        help="Profile the run with cProfile and dump the result to this file.",
+    ),
+    log_file: Optional[Path] = typer.Option(
+        None,
+        "--log-file",
+        help="Also write the log to this file, at info level or at debug level "
+        "with --debug. Written from a background thread.",
+    ),
+    log_json: bool = typer.Option(
+        False, "--log-json", help="Write the log file as JSON lines."
+    ),
+    low_priority: bool = typer.Option(
+        False,
+        "--low-priority",
+        help="Run with the lowest CPU and I/O priority, leaving the disks to "
+        "other work first.",
+    ),
+):
     """Image Transfer
 
     Used to transfer images and video files from a directory
@@ -25,15 +220,73 @@ def main(verbose: bool = False, debug: bool = False):
     # Set verbosity
     logger.set_verbosity(verbose, debug)
 
+    if low_priority:
+        # Before any worker thread is started, threads inherit the priority
+        device.lower_priority()
+
+    if log_file is not None:
+        sink = logger.FileSink(
+            log_file,
+            json_lines=log_json,
+            level=logging.DEBUG if debug else logging.INFO,
+        )
+        ctx.call_on_close(sink.close)
+
+    if stats_file is not None:
+        run_stats = stats.reset()
+
+        def report_stats():
+            run_stats.write(stats_file)
+            logger.console.print(run_stats.table())
+
+        ctx.call_on_close(report_stats)
+
+    if profile_file is not None:
+        profiler = cProfile.Profile()
+
+        def report_profile():
+            profiler.disable()
+            profiler.dump_stats(profile_file)
+            print(f"Profile written to {escape(str(profile_file))}")
+
+        # Registered last so it is stopped before statistics are reported
+        ctx.call_on_close(report_profile)
+        profiler.enable()
+
 
 @app.command()
 def copy(
     src_dir: str,
     dest_dir: str,
-    dir_format: str = "Y/m/d",
+    dir_format: str = _option_dir_format,
+    jobs: int = _option_jobs,
+    max_in_flight: int = _option_max_in_flight,
+    device_jobs: Optional[int] = _option_device_jobs,
+    max_rate: Optional[int] = _option_max_rate,
+    stream: bool = _option_stream,
+    no_cache: bool = _option_no_cache,
+    time_source: Optional[List[TimeSource]] = _option_time_source,
+    probe_jobs: int = _option_probe_jobs,
+    probe_timeout: float = _option_probe_timeout,
+    include: Optional[List[str]] = _option_include,
+    exclude: Optional[List[str]] = _option_exclude,
+    compare: Compare = _option_compare,
+    dedup: bool = _option_dedup,
+    buffer_size: int = _option_buffer_size,
+    sync: Sync = _option_sync,
+    sync_every: int = _option_sync_every,
+    verify: bool = _option_verify,
+    manifest: bool = _option_manifest,
+    resume: bool = _option_resume,
+    mode: Mode = typer.Option(Mode.COPY, "--mode", help=_help_mode),
 ):
     """Copy files from source dir to destination dir"""
 
+    if mode == Mode.RENAME:
+        raise typer.BadParameter(
+            "Files can not be renamed when copying", param_hint="--mode"
+        )
+
     source_path = Path(src_dir).resolve()
     destination_path = Path(dest_dir).resolve()
 
@@ -41,9 +294,37 @@ def copy(
         print("Source directory does not exists")
         raise NotADirectoryError(src_dir)
 
-    core.copy_files(
-        src_dir=source_path, dest_dir=destination_path, dir_format=dir_format
-    )
+    probe.configure(max_workers=probe_jobs, timeout=probe_timeout)
+    meta.configure(time_sources=time_source)
+    device.configure(jobs=device_jobs, max_rate=_bytes_per_second(max_rate))
+    try:
+        with _open_cache(no_cache) as cache:
+            core.copy_files(
+                src_dir=source_path,
+                dest_dir=destination_path,
+                dir_format=dir_format,
+                compare=compare,
+                jobs=jobs,
+                max_in_flight=max_in_flight * 1024**2,
+                stream=stream,
+                cache=cache,
+                include=include or (),
+                exclude=exclude or (),
+                dedup=dedup,
+                mode=mode,
+                buffer_size=buffer_size * 1024**2,
+                sync=sync,
+                sync_interval=sync_every * 1024**2,
+                verify=verify,
+                manifest=manifest,
+                resume=resume,
+            )
+    except exceptions.TransferError as e:
+        _print_failed(e)
+        raise typer.Exit(code=1)
+    except JournalError as e:
+        print(f"[red]{escape(str(e))}[/red]")
+        raise typer.Exit(code=1)
 
 
 @app.command()
@@ -51,6 +332,32 @@ def move(
     src_dir: str,
     dest_dir: str,
     dir_format: str = _option_dir_format,
+    jobs: int = _option_jobs,
+    max_in_flight: int = _option_max_in_flight,
+    device_jobs: Optional[int] = _option_device_jobs,
+    max_rate: Optional[int] = _option_max_rate,
+    stream: bool = _option_stream,
+    no_cache: bool = _option_no_cache,
+    time_source: Optional[List[TimeSource]] = _option_time_source,
+    probe_jobs: int = _option_probe_jobs,
+    probe_timeout: float = _option_probe_timeout,
+    include: Optional[List[str]] = _option_include,
+    exclude: Optional[List[str]] = _option_exclude,
+    compare: Compare = _option_compare,
+    dedup: bool = _option_dedup,
+    buffer_size: int = _option_buffer_size,
+    sync: Sync = _option_sync,
+    sync_every: int = _option_sync_every,
+    verify: bool = _option_verify,
+    manifest: bool = _option_manifest,
+    resume: bool = _option_resume,
+    mode: Mode = typer.Option(Mode.RENAME, "--mode", help=_help_mode),
+    prune: bool = typer.Option(
+        False,
+        "--prune",
+        help="Remove source directories left empty by the move. "
+        "The source directory itself is kept.",
+    ),
 ):
     """Move files from source dir to destination dir"""
 
@@ -61,9 +368,265 @@ def move(
         print("Source directory does not exists")
         raise NotADirectoryError(src_dir)
 
-    core.move_files(
-        src_dir=source_path, dest_dir=destination_path, dir_format=dir_format
-    )
+    probe.configure(max_workers=probe_jobs, timeout=probe_timeout)
+    meta.configure(time_sources=time_source)
+    device.configure(jobs=device_jobs, max_rate=_bytes_per_second(max_rate))
+    try:
+        with _open_cache(no_cache) as cache:
+            core.move_files(
+                src_dir=source_path,
+                dest_dir=destination_path,
+                dir_format=dir_format,
+                compare=compare,
+                jobs=jobs,
+                max_in_flight=max_in_flight * 1024**2,
+                stream=stream,
+                cache=cache,
+                include=include or (),
+                exclude=exclude or (),
+                dedup=dedup,
+                mode=mode,
+                buffer_size=buffer_size * 1024**2,
+                sync=sync,
+                sync_interval=sync_every * 1024**2,
+                verify=verify,
+                manifest=manifest,
+                resume=resume,
+                prune=prune,
+            )
+    except exceptions.TransferError as e:
+        _print_failed(e)
+        raise typer.Exit(code=1)
+    except JournalError as e:
+        print(f"[red]{escape(str(e))}[/red]")
+        raise typer.Exit(code=1)
+
+
+@app.command("watch")
+def watch_dir(
+    src_dir: str,
+    dest_dir: str,
+    dir_format: str = _option_dir_format,
+    move: bool = typer.Option(
+        False, "--move", help="Move arriving files instead of copying them."
+    ),
+    jobs: int = _option_jobs,
+    device_jobs: Optional[int] = _option_device_jobs,
+    max_rate: Optional[int] = _option_max_rate,
+    no_cache: bool = _option_no_cache,
+    time_source: Optional[List[TimeSource]] = _option_time_source,
+    include: Optional[List[str]] = _option_include,
+    exclude: Optional[List[str]] = _option_exclude,
+    compare: Compare = _option_compare,
+    mode: Optional[Mode] = typer.Option(None, "--mode", help=_help_mode),
+    settle: float = typer.Option(
+        watch.DEFAULT_SETTLE_TIME,
+        "--settle",
+        help="Seconds a file must stay unchanged before it is transferred.",
+    ),
+    poll: bool = typer.Option(
+        False, "--poll", help="Poll directories instead of using inotify."
+    ),
+    poll_interval: float = typer.Option(
+        watch.DEFAULT_POLL_INTERVAL,
+        "--poll-interval",
+        help="Seconds between polls when inotify is not used.",
+    ),
+):
+    """Transfer files from source dir to destination dir as they arrive
+
+    Files already in the source are transferred first, then the source is
+    watched until interrupted.
+    """
+
+    if mode is None:
+        mode = Mode.RENAME if move else Mode.COPY
+    if not move and mode == Mode.RENAME:
+        raise typer.BadParameter(
+            "Files can not be renamed when copying", param_hint="--mode"
+        )
+
+    source_path = Path(src_dir).resolve()
+    destination_path = Path(dest_dir).resolve()
+
+    if not source_path.exists() or not source_path.is_dir():
+        print("Source directory does not exists")
+        raise NotADirectoryError(src_dir)
+
+    meta.configure(time_sources=time_source)
+    device.configure(jobs=device_jobs, max_rate=_bytes_per_second(max_rate))
+    transfer_files = core.move_files if move else core.copy_files
+
+    with _open_cache(no_cache) as cache:
+
+        def transfer(sources: Optional[List[Path]] = None) -> None:
+            try:
+                transfer_files(
+                    src_dir=source_path,
+                    dest_dir=destination_path,
+                    dir_format=dir_format,
+                    compare=compare,
+                    jobs=jobs,
+                    cache=cache,
+                    include=include or (),
+                    exclude=exclude or (),
+                    mode=mode,
+                    sources=sources,
+                )
+            except exceptions.TransferError as e:
+                _print_failed(e)
+
+        # Watch before the first pass so no file arriving meanwhile is missed
+        watcher = watch.create_watcher(
+            source_path, polling=poll, interval=poll_interval
+        )
+        try:
+            transfer()
+            print(f"Watching {escape(str(source_path))}, press Ctrl+C to stop")
+            watch.watch(watcher, transfer, settle_time=settle)
+        except KeyboardInterrupt:
+            pass
+        finally:
+            watcher.close()
+
+
+@app.command("plan")
+def plan_dir(
+    src_dir: str,
+    dest_dir: str,
+    out: Path = typer.Option(..., "--out", help="File to write the plan to."),
+    dir_format: str = _option_dir_format,
+    jobs: int = _option_jobs,
+    device_jobs: Optional[int] = _option_device_jobs,
+    no_cache: bool = _option_no_cache,
+    time_source: Optional[List[TimeSource]] = _option_time_source,
+    probe_jobs: int = _option_probe_jobs,
+    probe_timeout: float = _option_probe_timeout,
+    include: Optional[List[str]] = _option_include,
+    exclude: Optional[List[str]] = _option_exclude,
+    compare: Compare = _option_compare,
+    dedup: bool = _option_dedup,
+):
+    """Write the transfers from source dir to destination dir to a plan
+
+    Nothing is transferred. The plan lists source, destination, size and
+    creation time of every file and is carried out with the apply command.
+    """
+
+    source_path = Path(src_dir).resolve()
+    destination_path = Path(dest_dir).resolve()
+
+    if not source_path.exists() or not source_path.is_dir():
+        print("Source directory does not exists")
+        raise NotADirectoryError(src_dir)
+
+    probe.configure(max_workers=probe_jobs, timeout=probe_timeout)
+    meta.configure(time_sources=time_source)
+    device.configure(jobs=device_jobs)
+    with _open_cache(no_cache) as cache:
+        count = core.plan_files(
+            src_dir=source_path,
+            dest_dir=destination_path,
+            dir_format=dir_format,
+            plan_path=out,
+            compare=compare,
+            jobs=jobs,
+            cache=cache,
+            include=include or (),
+            exclude=exclude or (),
+            dedup=dedup,
+        )
+    print(f"Planned {count} transfers in {escape(str(out))}")
+
+
+def _validate_shard(shard: str) -> str:
+    try:
+        parse_shard(shard)
+    except ValueError as e:
+        raise typer.BadParameter(str(e))
+    return shard
+
+
+@app.command("apply")
+def apply_plan(
+    plan_file: Path,
+    shard: str = typer.Option(
+        "1/1",
+        "--shard",
+        help="Only transfer shard i of N, e.g. 2/4. Shards hold about the same "
+        "amount of data and can be applied by separate processes or hosts.",
+        callback=_validate_shard,
+    ),
+    move: bool = typer.Option(
+        False, "--move", help="Move planned files instead of copying them."
+    ),
+    src_dir: Optional[Path] = typer.Option(
+        None, "--src-dir", help="Source dir to use instead of the planned one."
+    ),
+    dest_dir: Optional[Path] = typer.Option(
+        None, "--dest-dir", help="Destination dir to use instead of the planned one."
+    ),
+    jobs: int = _option_jobs,
+    max_in_flight: int = _option_max_in_flight,
+    device_jobs: Optional[int] = _option_device_jobs,
+    max_rate: Optional[int] = _option_max_rate,
+    buffer_size: int = _option_buffer_size,
+    sync: Sync = _option_sync,
+    sync_every: int = _option_sync_every,
+    verify: bool = _option_verify,
+    manifest: bool = _option_manifest,
+    mode: Optional[Mode] = typer.Option(None, "--mode", help=_help_mode),
+):
+    """Transfer files listed in a plan written by the plan command
+
+    Files already at their destination are skipped, so an interrupted shard
+    can be applied again.
+    """
+
+    if not move and mode == Mode.RENAME:
+        raise typer.BadParameter(
+            "Files can not be renamed when copying", param_hint="--mode"
+        )
+
+    device.configure(jobs=device_jobs, max_rate=_bytes_per_second(max_rate))
+    try:
+        core.apply_plan(
+            plan_file,
+            move=move,
+            mode=mode,
+            shard=parse_shard(shard),
+            src_dir=src_dir.resolve() if src_dir else None,
+            dest_dir=dest_dir.resolve() if dest_dir else None,
+            jobs=jobs,
+            max_in_flight=max_in_flight * 1024**2,
+            buffer_size=buffer_size * 1024**2,
+            sync=sync,
+            sync_interval=sync_every * 1024**2,
+            verify=verify,
+            manifest=manifest,
+        )
+    except exceptions.TransferError as e:
+        _print_failed(e)
+        raise typer.Exit(code=1)
+    except PlanError as e:
+        print(f"[red]{escape(str(e))}[/red]")
+        raise typer.Exit(code=1)
+
+
+def _bytes_per_second(max_rate: Optional[int]) -> Optional[int]:
+    return None if max_rate is None else max_rate * 1024**2
+
+
+def _open_cache(no_cache: bool):
+    if no_cache:
+        return nullcontext()
+    return MetadataCache()
+
+
+def _print_failed(error: exceptions.TransferError) -> None:
+    print(f"[red]{error}[/red]")
+    for path, reason in error.failed:
+        print(f"  {escape(str(path))}: {escape(str(reason))}")
 
 
 remove_app = typer.Typer(name="remove")
@@ -86,3 +649,21 @@ def remove_dirs(directory: str = typer.Argument(..., help="Root directory to rem
         raise NotADirectoryError(dir_path)
 
     core.remove_dirs(dir_path)
+
+
+cache_app = typer.Typer(name="cache")
+app.add_typer(cache_app)
+
+
+@cache_app.callback()
+def cache_main():
+    """Metadata cache handling"""
+    pass
+
+
+@cache_app.command("clear")
+def cache_clear():
+    """Remove all cached creation times"""
+    with MetadataCache() as cache:
+        cache.clear()
+    print("Metadata cache cleared")
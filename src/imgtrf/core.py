@@ -1,108 +1,1069 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+import fnmatch
+import functools
+import heapq
+import itertools
+import os
 from pathlib import Path
-import string
-from typing import Iterator, List, Tuple
-import shutil
+import threading
+import time
+from typing import (
+    Callable,
+    Collection,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
 
-from rich.progress import Progress
+from rich.progress import MofNCompleteColumn, Progress
 
 import logging
 from imgtrf.logger import console
+from imgtrf import device
 from imgtrf import meta
+from imgtrf import extractors
+from imgtrf import exceptions
+from imgtrf.cache import MetadataCache
+from imgtrf.dedup import Deduplicator
+from imgtrf.index import Compare, DestinationIndex, FileInfo
+from imgtrf import journal
+from imgtrf.journal import Journal
+from imgtrf.manifest import MANIFEST_NAME, Manifest, load_hashes
+from imgtrf import plan
+from imgtrf.plan import PlannedTransfer, PlanTable
+from imgtrf import stats
+from imgtrf.template import compile_template
+from imgtrf import transfer
+from imgtrf.transfer import Durability, Mode, Sync
 
 log = logging.getLogger(__name__)
 
+T = TypeVar("T")
+R = TypeVar("R")
+
+# Default cap on the size of files being transferred at the same time
+DEFAULT_MAX_IN_FLIGHT = 256 * 1024**2
+
+# Least number of seconds between updates of a progress task
+PROGRESS_INTERVAL = 0.1
+
+# Destination files and directories listed at most at once when streaming
+STREAM_INDEX_ENTRIES = 200_000
+
 
 def copy_files(
     src_dir: Path,
     dest_dir: Path,
     dir_format: str,
     skip_existing=True,
+    compare: Compare = Compare.NAME,
+    jobs: int = 1,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    stream: bool = False,
+    cache: Optional[MetadataCache] = None,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    dedup: bool = False,
+    mode: Mode = Mode.COPY,
+    buffer_size: int = transfer.DEFAULT_BUFFER_SIZE,
+    sync: Sync = Sync.NONE,
+    sync_interval: int = transfer.DEFAULT_SYNC_INTERVAL,
+    verify: bool = False,
+    manifest: bool = False,
+    resume: bool = False,
+    sources: Optional[Iterable[Path]] = None,
 ) -> None:
-    """Copies files from source to target directory"""
-    src_dest_paths = _create_src_dest_pairs(
+    """Copies files from source to target directory
+
+    `mode` selects hard linking or cloning instead of copying data. It is
+    applied per file when source and destination are on the same device and
+    falls back on copying otherwise.
+
+    With `verify`, copied data is hashed while it is copied and compared with
+    the destination. With `manifest`, every transferred file is recorded in a
+    manifest in the destination directory.
+
+    If `sources` is given, only those files below `src_dir` are considered
+    instead of walking it.
+
+    Raises:
+        TransferError: If one or more files could not be copied. Remaining files
+            are still transferred.
+    """
+    if mode == Mode.RENAME:
+        raise ValueError("Files can not be renamed when copying")
+
+    _transfer_tree(
         src_dir=src_dir,
         dest_dir=dest_dir,
         dir_format=dir_format,
+        transfer=functools.partial(_copy_file, mode=mode),
+        description="Copying",
         skip_existing=skip_existing,
+        compare=compare,
+        jobs=jobs,
+        max_in_flight=max_in_flight,
+        stream=stream,
+        cache=cache,
+        include=include,
+        exclude=exclude,
+        dedup=dedup,
+        buffer_size=buffer_size,
+        sync=sync,
+        sync_interval=sync_interval,
+        verify=verify,
+        manifest=manifest,
+        resume=resume,
+        sources=sources,
     )
 
-    if not src_dest_paths:
-        log.info("No files to copy")
-        return
 
-    with Progress(console=console) as progress:
-        for src_file_path, target_path in progress.track(
-            src_dest_paths, description="Copying"
-        ):
-            log.info(f"Copying {src_file_path} to {target_path}")
-            _copy_file(src_file_path, target_path)
+def move_files(
+    src_dir: Path,
+    dest_dir: Path,
+    dir_format: str,
+    skip_existing=True,
+    compare: Compare = Compare.NAME,
+    jobs: int = 1,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    stream: bool = False,
+    cache: Optional[MetadataCache] = None,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    dedup: bool = False,
+    mode: Mode = Mode.RENAME,
+    buffer_size: int = transfer.DEFAULT_BUFFER_SIZE,
+    sync: Sync = Sync.NONE,
+    sync_interval: int = transfer.DEFAULT_SYNC_INTERVAL,
+    verify: bool = False,
+    manifest: bool = False,
+    resume: bool = False,
+    sources: Optional[Iterable[Path]] = None,
+    prune: bool = False,
+) -> None:
+    """Moves files from source to target directory
 
+    Files on the same device as the destination are renamed, or linked or
+    cloned depending on `mode`, before the source is removed. Other files are
+    copied and then removed. With `verify`, a copied source is only removed
+    once the destination has been found identical. With `manifest`, every
+    transferred file is recorded in a manifest in the destination directory.
+    If `sources` is given, only those files below `src_dir` are considered
+    instead of walking it.
 
-def move_files(
+    With `prune`, source directories left empty by the move are removed
+    afterwards, see `prune_dirs`. `src_dir` itself is kept.
+
+    Raises:
+        TransferError: If one or more files could not be moved. Remaining files
+            are still transferred.
+    """
+    # Only added to, which is safe from several threads at once
+    moved_from = set()
+
+    def move_and_track(src_file_path: Path, dest_path: Path, **kwargs) -> None:
+        _move_file(src_file_path, dest_path, mode=mode, **kwargs)
+        moved_from.add(src_file_path.parent)
+
+    try:
+        _transfer_tree(
+            src_dir=src_dir,
+            dest_dir=dest_dir,
+            dir_format=dir_format,
+            transfer=move_and_track,
+            description="Moving",
+            skip_existing=skip_existing,
+            compare=compare,
+            jobs=jobs,
+            max_in_flight=max_in_flight,
+            stream=stream,
+            cache=cache,
+            include=include,
+            exclude=exclude,
+            dedup=dedup,
+            buffer_size=buffer_size,
+            sync=sync,
+            sync_interval=sync_interval,
+            verify=verify,
+            manifest=manifest,
+            resume=resume,
+            sources=sources,
+        )
+    finally:
+        if prune:
+            prune_dirs(moved_from, src_dir)
+
+
+def plan_files(
     src_dir: Path,
     dest_dir: Path,
     dir_format: str,
+    plan_path: Path,
     skip_existing=True,
+    compare: Compare = Compare.NAME,
+    jobs: int = 1,
+    cache: Optional[MetadataCache] = None,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    dedup: bool = False,
+) -> int:
+    """Indexes source directory and writes the transfers to a plan file
+
+    Files are skipped and named like `copy_files` would, but nothing is written
+    to the destination. Returns the number of planned transfers.
+    """
+    compile_template(dir_format)
+    with _create_progress() as progress:
+        planned_transfers = _iter_planned_transfers(
+            src_dir=src_dir,
+            dest_dir=dest_dir,
+            dir_format=dir_format,
+            skip_existing=skip_existing,
+            compare=compare,
+            jobs=jobs,
+            progress=progress,
+            cache=cache,
+            include=include,
+            exclude=exclude,
+            dedup=dedup,
+            create_dirs=False,
+        )
+        return plan.write(plan_path, planned_transfers, src_dir, dest_dir, dir_format)
+
+
+def apply_plan(
+    plan_path: Path,
+    move: bool = False,
+    mode: Optional[Mode] = None,
+    shard: Tuple[int, int] = (1, 1),
+    src_dir: Optional[Path] = None,
+    dest_dir: Optional[Path] = None,
+    jobs: int = 1,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    buffer_size: int = transfer.DEFAULT_BUFFER_SIZE,
+    sync: Sync = Sync.NONE,
+    sync_interval: int = transfer.DEFAULT_SYNC_INTERVAL,
+    verify: bool = False,
+    manifest: bool = False,
 ) -> None:
-    """Copies files from source to target directory"""
-    src_dest_paths = _create_src_dest_pairs(
-        src_dir=src_dir,
-        dest_dir=dest_dir,
-        dir_format=dir_format,
-        skip_existing=skip_existing,
+    """Copies, or moves, the files of one shard of a plan
+
+    `shard` is given as `(i, N)` with `i` counted from 1, see `plan.shard`. The
+    plan is applied to `src_dir` and `dest_dir` instead of the directories it
+    was made for if given.
+
+    Transfers whose destination already exists are skipped, so an interrupted
+    shard can be applied again. Sources that changed size since planning are
+    skipped as well.
+
+    Raises:
+        PlanError: If the plan can not be read
+        TransferError: If one or more files could not be transferred. Remaining
+            files are still transferred.
+    """
+    if mode is None:
+        mode = Mode.RENAME if move else Mode.COPY
+    if not move and mode == Mode.RENAME:
+        raise ValueError("Files can not be renamed when copying")
+
+    loaded = plan.read(plan_path)
+    if src_dir is not None or dest_dir is not None:
+        loaded = plan.relocate(
+            loaded, src_dir or loaded.src_dir, dest_dir or loaded.dest_dir
+        )
+    selected = plan.shard(loaded.transfers, *shard)
+    pending = _unapplied(selected)
+    log.info(
+        f"Applying {len(pending)} of {len(selected)} transfers in shard "
+        f"{shard[0]}/{shard[1]} of {plan_path}"
     )
+    if not pending:
+        log.info("No files to transfer")
+        return
+
+    durability = Durability(sync, sync_interval)
+    record = Manifest(loaded.dest_dir / MANIFEST_NAME) if manifest else None
+    transfer_file = _move_file if move else _copy_file
+    try:
+        _transfer_files(
+            pending,
+            transfer=functools.partial(
+                transfer_file,
+                create_dirs=False,
+                mode=mode,
+                buffer_size=buffer_size,
+                durability=durability,
+                verify=verify,
+                manifest=record,
+            ),
+            description="Moving" if move else "Copying",
+            jobs=jobs,
+            max_in_flight=max_in_flight,
+        )
+    finally:
+        durability.flush()
+        if record is not None:
+            record.close()
+
+
+def _unapplied(transfers: PlanTable) -> PlanTable:
+    """Returns planned transfers that still need to be done
+
+    Destination directories of the remaining transfers are created.
+    """
+    run_stats = stats.get()
+    unapplied = PlanTable()
+    directories = set()
+    for planned in transfers.transfers():
+        if planned.dest.exists():
+            log.info("Skipping %s, %s exists", planned.src, planned.dest)
+            run_stats.count("skipped.existing")
+            continue
+        try:
+            size = planned.src.stat().st_size
+        except OSError as e:
+            log.warning("Skipping %s: %s", planned.src, e)
+            run_stats.count("skipped.errors")
+            continue
+        if size != planned.size:
+            log.warning("Skipping %s, changed since it was planned", planned.src)
+            run_stats.count("skipped.changed")
+            continue
+        unapplied.add(*planned)
+        directories.add(planned.dest.parent)
+
+    for directory in directories:
+        directory.mkdir(parents=True, exist_ok=True)
+    return unapplied
+
+
+def _transfer_tree(
+    src_dir: Path,
+    dest_dir: Path,
+    dir_format: str,
+    transfer: Callable[[Path, Path], None],
+    description: str,
+    skip_existing: bool = True,
+    compare: Compare = Compare.NAME,
+    jobs: int = 1,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    stream: bool = False,
+    cache: Optional[MetadataCache] = None,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    dedup: bool = False,
+    buffer_size: int = transfer.DEFAULT_BUFFER_SIZE,
+    sync: Sync = Sync.NONE,
+    sync_interval: int = transfer.DEFAULT_SYNC_INTERVAL,
+    verify: bool = False,
+    manifest: bool = False,
+    resume: bool = False,
+    sources: Optional[Iterable[Path]] = None,
+) -> None:
+    """Indexes source directory and transfers files into destination directory
+
+    By default the whole source tree is indexed before the first file is
+    transferred. With `stream` the stages are chained as generators instead, so
+    transfers start right away and only a bounded number of files are held in
+    memory at any time, see `_iter_src_dest_pairs`. Apart from that, memory
+    grows with the number of destination directories, and with `dedup` with
+    the number of files.
+
+    Destination directories are created while indexing, so `transfer` is called
+    with `create_dirs=False`. Written files are flushed to disk according to
+    `sync`, pending flushes are done before returning.
+
+    Planned and completed transfers are recorded in a journal in the destination
+    directory, which is removed once all files are transferred. With `resume`,
+    unfinished transfers from the journal are done first, and only files not
+    planned before are indexed unless the earlier run indexed the whole tree.
+    """
+    # Fail on an invalid format before anything is written
+    compile_template(dir_format)
+    durability = Durability(sync, sync_interval)
+    record = Manifest(dest_dir / MANIFEST_NAME) if manifest else None
+    transfer = functools.partial(
+        transfer,
+        create_dirs=False,
+        buffer_size=buffer_size,
+        durability=durability,
+        verify=verify,
+        manifest=record,
+    )
+
+    journal_path = journal.path_for(dest_dir, src_dir)
+    state = journal.load(journal_path, src_dir) if resume else None
+    if resume and state is None:
+        log.info(f"No journal found in {dest_dir}, starting from the beginning")
+    run_journal = Journal(journal_path, src_dir, append=state is not None)
+
+    def transfer_and_record(src_file_path: Path, dest_path: Path) -> None:
+        transfer(src_file_path, dest_path)
+        run_journal.done(src_file_path)
+
+    pending = PlanTable()
+    planned: Collection[str] = ()
+    indexed = False
+    if state is not None:
+        pending.extend(_unfinished(state.pending, run_journal))
+        planned = state.planned
+        indexed = state.indexed
+        log.info(f"Resuming {len(pending)} planned transfers from {journal_path}")
+
+    try:
+        if stream:
+            with _create_progress() as progress:
+                src_dest_paths: Iterable[Tuple[Path, Path]] = pending
+                if not indexed:
+                    src_dest_paths = itertools.chain(
+                        pending,
+                        run_journal.plan(
+                            _iter_src_dest_pairs(
+                                src_dir=src_dir,
+                                dest_dir=dest_dir,
+                                dir_format=dir_format,
+                                skip_existing=skip_existing,
+                                compare=compare,
+                                jobs=jobs,
+                                progress=progress,
+                                cache=cache,
+                                include=include,
+                                exclude=exclude,
+                                dedup=dedup,
+                                planned=planned,
+                                sources=sources,
+                            )
+                        ),
+                    )
+                _transfer_files(
+                    src_dest_paths,
+                    transfer=transfer_and_record,
+                    description=description,
+                    jobs=jobs,
+                    max_in_flight=max_in_flight,
+                    progress=progress,
+                )
+        else:
+            if not indexed:
+                indexed_paths = _create_src_dest_pairs(
+                    src_dir=src_dir,
+                    dest_dir=dest_dir,
+                    dir_format=dir_format,
+                    skip_existing=skip_existing,
+                    compare=compare,
+                    jobs=jobs,
+                    cache=cache,
+                    include=include,
+                    exclude=exclude,
+                    dedup=dedup,
+                    planned=planned,
+                    sources=sources,
+                )
+                for _ in run_journal.plan(indexed_paths):
+                    pass
+                # Only copied when resumed transfers have to go first
+                if pending:
+                    pending.extend(indexed_paths)
+                else:
+                    pending = indexed_paths
+
+            if pending:
+                _transfer_files(
+                    pending,
+                    transfer=transfer_and_record,
+                    description=description,
+                    jobs=jobs,
+                    max_in_flight=max_in_flight,
+                )
+            else:
+                log.info("No files to transfer")
+    finally:
+        durability.flush()
+        if record is not None:
+            record.close()
+        run_journal.close()
+
+    # Only reached when every planned file has been transferred
+    run_journal.remove()
+
+
+def _unfinished(
+    pending: List[Tuple[Path, Path]], run_journal: Journal
+) -> List[Tuple[Path, Path]]:
+    """Returns planned transfers that still need to be done
+
+    A move interrupted after its source was removed, but before it was marked as
+    done, is marked as done now. Temporary files left by interrupted copies are
+    removed, and destination directories are created again in case they were
+    removed since.
+    """
+    unfinished = []
+    for src_file_path, dest_path in pending:
+        try:
+            os.remove(transfer.temp_path_for(dest_path))
+        except FileNotFoundError:
+            pass
+        if not src_file_path.exists() and dest_path.exists():
+            run_journal.done(src_file_path)
+            continue
+        unfinished.append((src_file_path, dest_path))
+
+    for directory in {dest_path.parent for _, dest_path in unfinished}:
+        directory.mkdir(parents=True, exist_ok=True)
+    return unfinished
+
+
+def _transfer_files(
+    src_dest_paths: Iterable[Tuple[Path, Path]],
+    transfer: Callable[[Path, Path], None],
+    description: str,
+    jobs: int = 1,
+    max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+    progress: Optional[Progress] = None,
+) -> None:
+    """Transfers files using a pool of `jobs` worker threads
+
+    Files are handed to the workers in order, but only as long as the total size
+    of files being transferred stays below `max_in_flight` bytes. A worker holds
+    a slot of the source and destination device while transferring, see
+    `device.hold`. A failing file is logged and collected while the rest of the
+    files are still transferred.
+
+    `src_dest_paths` may be a lazy iterator, in which case it is only advanced
+    when there is room for another file.
+
+    Raises:
+        TransferError: If any of the files failed to transfer
+    """
+    if progress is None:
+        with _create_progress() as progress:
+            return _transfer_files(
+                src_dest_paths,
+                transfer=transfer,
+                description=description,
+                jobs=jobs,
+                max_in_flight=max_in_flight,
+                progress=progress,
+            )
+
+    failed: List[Tuple[Path, Exception]] = []
+    limit = _InFlightLimit(max_bytes=max_in_flight, max_files=jobs * 2)
+    task = _ThrottledTask(progress, description, total=0)
+
+    run_stats = stats.get()
+
+    def run(src_file_path: Path, target_path: Path, size: int, reserved: int) -> None:
+        try:
+            log.info("%s %s to %s", description, src_file_path, target_path)
+            with device.hold(src_file_path.parent, target_path.parent):
+                with run_stats.time("transfer.file"):
+                    transfer(src_file_path, target_path)
+            run_stats.count("transfer.files")
+            run_stats.count("transfer.bytes", size)
+        except OSError as e:
+            log.error("%s %s failed: %s", description, src_file_path, e)
+            run_stats.count("transfer.errors")
+            failed.append((src_file_path, e))
+        except Exception as e:
+            # Not expected from a transfer, so the traceback is logged as well.
+            # Raised in a worker it would otherwise be lost with its future.
+            log.exception("%s %s failed", description, src_file_path)
+            run_stats.count("transfer.errors")
+            failed.append((src_file_path, e))
+        finally:
+            limit.release(reserved)
+            task.advance()
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for submitted, (src_file_path, target_path) in enumerate(src_dest_paths, 1):
+            size = _file_size(src_file_path)
+            reserved = limit.acquire(size)
+            task.set_total(submitted)
+            executor.submit(run, src_file_path, target_path, size, reserved)
+    task.flush()
+
+    if failed:
+        raise exceptions.TransferError(failed)
+
+
+def _create_progress() -> Progress:
+    """Progress display showing a count per stage"""
+    return Progress(
+        *Progress.get_default_columns(),
+        MofNCompleteColumn(),
+        console=console,
+    )
+
+
+class _ThrottledTask:
+    """Progress task that is updated at most every `interval` seconds
+
+    Updating a rich task takes its lock and records a speed sample, which adds
+    up when done for every file. Advances are collected here instead and handed
+    on in batches. Call `flush()` when done. Can be used from several threads.
+    """
+
+    def __init__(
+        self,
+        progress: Progress,
+        description: str,
+        total: Optional[float] = None,
+        interval: float = PROGRESS_INTERVAL,
+    ):
+        self._progress = progress
+        self._task = progress.add_task(description, total=total)
+        self._interval = interval
+        self._total = total
+        self._advanced = 0
+        self._next_update = 0.0
+        self._lock = threading.Lock()
+
+    def advance(self, amount: int = 1) -> None:
+        with self._lock:
+            self._advanced += amount
+            self._update(force=False)
+
+    def set_total(self, total: float) -> None:
+        with self._lock:
+            self._total = total
+            self._update(force=False)
 
-    if not src_dest_paths:
-        log.info("No files to move")
+    def flush(self) -> None:
+        with self._lock:
+            self._update(force=True)
+
+    def _update(self, force: bool) -> None:
+        now = time.monotonic()
+        if not force and now < self._next_update:
+            return
+        self._progress.update(self._task, total=self._total, advance=self._advanced)
+        self._advanced = 0
+        self._next_update = now + self._interval
+
+
+class _InFlightLimit:
+    """Blocks until there is room for another file to be transferred
+
+    A file larger than `max_bytes` is allowed, but only when nothing else is in
+    flight.
+    """
+
+    def __init__(self, max_bytes: int, max_files: int):
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.bytes = 0
+        self.files = 0
+        self._condition = threading.Condition()
+
+    def acquire(self, size: int) -> int:
+        """Reserves room for a file of `size` bytes, returns the reserved amount"""
+        size = min(size, self.max_bytes)
+        with self._condition:
+            self._condition.wait_for(
+                lambda: self.files < self.max_files
+                and self.bytes + size <= self.max_bytes
+            )
+            self.bytes += size
+            self.files += 1
+        return size
+
+    def release(self, size: int) -> None:
+        with self._condition:
+            self.bytes -= size
+            self.files -= 1
+            self._condition.notify_all()
+
+
+def _file_size(path: Path) -> int:
+    try:
+        return path.stat().st_size
+    except OSError:
+        # Let the transfer itself report the problem
+        return 0
+
+
+def walk(
+    root: Path,
+    extensions: Optional[Collection[str]] = None,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    jobs: int = 1,
+) -> Iterator[Path]:
+    """Iterates through directories and yields file paths
+
+    Directories are listed with `os.scandir`, which on most platforms knows the
+    type of each entry without an extra stat call. Traversal is iterative so
+    deep trees are not limited by recursion depth. Symbolic links to
+    directories are not followed.
+
+    Args:
+        root (Path): Directory to walk
+        extensions (Collection[str], optional): Lower case extensions, without
+            leading dot, of files to yield. All files are yielded if None.
+        include (Sequence[str]): Glob patterns of which a file must match at
+            least one, if any. Matched against file name and path relative to root.
+        exclude (Sequence[str]): Glob patterns of files and directories to skip.
+        jobs (int): Number of directories to list concurrently, within the slots
+            of their device. Files are yielded in the same order regardless.
+    """
+    root_path = os.fspath(root)
+    root_length = len(root_path.rstrip(os.sep)) + 1
+
+    run_stats = stats.get()
+
+    def scan(directory: str) -> Tuple[List[Path], List[str]]:
+        with device.hold(directory), run_stats.time("walk.scandir"):
+            files, sub_dirs = _scan_dir(
+                directory, root_length, extensions, include, exclude
+            )
+        run_stats.count("walk.files", len(files))
+        return files, sub_dirs
+
+    if jobs <= 1:
+        stack = [root_path]
+        while stack:
+            files, sub_dirs = scan(stack.pop())
+            yield from files
+            stack.extend(reversed(sub_dirs))
         return
 
-    with Progress(console=console) as progress:
-        for src_file_path, target_path in progress.track(
-            src_dest_paths, description="Moving"
-        ):
-            log.info(f"Moving {src_file_path} to {target_path}")
-            _move_file(src_file_path, target_path)
+    # Directories are listed ahead in the pool, but their files are yielded in
+    # the same order as above
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        stack = [executor.submit(scan, root_path)]
+        while stack:
+            files, sub_dirs = stack.pop().result()
+            yield from files
+            stack.extend(reversed([executor.submit(scan, path) for path in sub_dirs]))
+
+
+def _scan_dir(
+    directory: str,
+    root_length: int,
+    extensions: Optional[Collection[str]],
+    include: Sequence[str],
+    exclude: Sequence[str],
+) -> Tuple[List[Path], List[str]]:
+    """Returns files to yield and sub directories to descend into"""
+    files: List[Path] = []
+    sub_dirs: List[str] = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                relative_path = entry.path[root_length:].replace(os.sep, "/")
+                if exclude and _matches(entry.name, relative_path, exclude):
+                    continue
 
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        sub_dirs.append(entry.path)
+                        continue
+                    if not entry.is_file():
+                        continue
+                except OSError:
+                    continue
 
-def walk(root: str) -> Iterator[Path]:
-    """Recureivly iterates through directories and yields file paths"""
-    for path in Path(root).iterdir():
-        if path.is_dir():
-            yield from walk(path)
+                if extensions is not None:
+                    extension = os.path.splitext(entry.name)[1][1:].lower()
+                    if extension not in extensions:
+                        continue
+                if include and not _matches(entry.name, relative_path, include):
+                    continue
+                files.append(Path(entry.path))
+    except OSError as e:
+        log.warning(f"Could not list directory {directory}: {e}")
+
+    return files, sub_dirs
+
+
+def filter_paths(
+    paths: Iterable[Path],
+    root: Path,
+    extensions: Optional[Collection[str]] = None,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+) -> Iterator[Path]:
+    """Yields the paths below root that `walk` would have yielded
+
+    A path is left out if it, or any directory between it and root, matches an
+    exclude pattern. See `walk` for the arguments.
+    """
+    root_length = len(os.fspath(root).rstrip(os.sep)) + 1
+    for path in paths:
+        relative_path = os.fspath(path)[root_length:].replace(os.sep, "/")
+        parts = relative_path.split("/")
+        if exclude and any(
+            _matches(part, "/".join(parts[: index + 1]), exclude)
+            for index, part in enumerate(parts)
+        ):
+            continue
+        if extensions is not None:
+            extension = os.path.splitext(path.name)[1][1:].lower()
+            if extension not in extensions:
+                continue
+        if include and not _matches(path.name, relative_path, include):
             continue
         yield path
 
 
+def _matches(name: str, relative_path: str, patterns: Sequence[str]) -> bool:
+    return any(
+        fnmatch.fnmatch(name, pattern) or fnmatch.fnmatch(relative_path, pattern)
+        for pattern in patterns
+    )
+
+
 def _create_src_dest_pairs(
-    src_dir: Path, dest_dir: Path, dir_format: str, skip_existing: bool = True
-) -> List[Tuple[str, str]]:
-    src_dest_paths: List[Tuple[str, str]] = []
-
-    with Progress(console=console) as progress:
-        for src_file_path in progress.track(
-            walk(src_dir),
-            description="Indexing",
-        ):
-            target_path = _create_path_by_creation_date(
-                src_file_path=src_file_path, dest_dir=dest_dir, dir_format=dir_format
+    src_dir: Path,
+    dest_dir: Path,
+    dir_format: str,
+    skip_existing: bool = True,
+    compare: Compare = Compare.NAME,
+    jobs: int = 1,
+    cache: Optional[MetadataCache] = None,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    dedup: bool = False,
+    planned: Collection[str] = (),
+    sources: Optional[Iterable[Path]] = None,
+) -> PlanTable:
+    """Pairs every source file with its destination path, size and date"""
+    with _create_progress() as progress:
+        return PlanTable(
+            _iter_planned_transfers(
+                src_dir=src_dir,
+                dest_dir=dest_dir,
+                dir_format=dir_format,
+                skip_existing=skip_existing,
+                compare=compare,
+                jobs=jobs,
+                progress=progress,
+                cache=cache,
+                include=include,
+                exclude=exclude,
+                dedup=dedup,
+                planned=planned,
+                sources=sources,
             )
-            if skip_existing and target_path.exists():
-                log.info(f"Skipping {src_file_path}")
+        )
+
+
+def _iter_src_dest_pairs(
+    src_dir: Path,
+    dest_dir: Path,
+    dir_format: str,
+    skip_existing: bool,
+    jobs: int,
+    progress: Progress,
+    compare: Compare = Compare.NAME,
+    cache: Optional[MetadataCache] = None,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    dedup: bool = False,
+    planned: Collection[str] = (),
+    sources: Optional[Iterable[Path]] = None,
+) -> Iterator[Tuple[Path, Path]]:
+    """Lazily pairs source files with their destination path
+
+    Meant for transferring files as they are yielded. Listings of destination
+    directories are dropped once more than `STREAM_INDEX_ENTRIES` entries are
+    held, so memory does not grow with the number of files. See
+    `_iter_planned_transfers` for the arguments.
+    """
+    for planned_transfer in _iter_planned_transfers(
+        src_dir=src_dir,
+        dest_dir=dest_dir,
+        dir_format=dir_format,
+        skip_existing=skip_existing,
+        jobs=jobs,
+        progress=progress,
+        compare=compare,
+        cache=cache,
+        include=include,
+        exclude=exclude,
+        dedup=dedup,
+        planned=planned,
+        sources=sources,
+        max_index_entries=STREAM_INDEX_ENTRIES,
+    ):
+        yield planned_transfer.src, planned_transfer.dest
+
+
+def _iter_planned_transfers(
+    src_dir: Path,
+    dest_dir: Path,
+    dir_format: str,
+    skip_existing: bool,
+    jobs: int,
+    progress: Progress,
+    compare: Compare = Compare.NAME,
+    cache: Optional[MetadataCache] = None,
+    include: Sequence[str] = (),
+    exclude: Sequence[str] = (),
+    dedup: bool = False,
+    planned: Collection[str] = (),
+    sources: Optional[Iterable[Path]] = None,
+    create_dirs: bool = True,
+    max_index_entries: Optional[int] = None,
+) -> Iterator[PlannedTransfer]:
+    """Lazily pairs source files with their destination path, size and date
+
+    Metadata extraction is the expensive part of indexing, so it is spread over
+    `jobs` worker threads. Results are consumed in walk order so skipping and
+    progress behave the same regardless of the number of workers.
+
+    Existing destination files are looked up in a `DestinationIndex`, and each
+    destination directory is created once before its first file is yielded
+    unless `create_dirs` is False. The index drops listings beyond
+    `max_index_entries`, which is only correct when every yielded file is
+    transferred shortly after.
+
+    With `dedup`, files are compared by content instead of by name. A file
+    identical to any file in the destination, or to an earlier source file, is
+    skipped, and a different file with an existing name gets a new name. Hashes
+    recorded in the destination manifest are used instead of reading files.
+
+    Source files in `planned` were planned by an earlier run and are left out
+    before their metadata is extracted. If `sources` is given, those files are
+    filtered like a walk would instead of walking `src_dir`.
+    """
+    index = DestinationIndex(max_entries=max_index_entries)
+    deduplicator = None
+    if dedup:
+        deduplicator = Deduplicator()
+        hashes = load_hashes(dest_dir / MANIFEST_NAME)
+        count = deduplicator.add_tree(dest_dir, hashes)
+        log.info(f"Indexed {count} files in {dest_dir} for duplicate detection")
+
+    template = compile_template(dir_format)
+
+    def create_path(src_file_path: Path) -> Optional[Tuple[datetime, Path]]:
+        date = meta.get_creation_time(src_file_path, cache=cache)
+        if date is None:
+            return None
+        sub_directories = template.format(date, src_file_path)
+        return date, dest_dir / sub_directories / src_file_path.name
+
+    run_stats = stats.get()
+    index_task = _ThrottledTask(progress, "Indexing")
+    skip_task = _ThrottledTask(progress, "Skipped")
+    src_file_paths: Iterable[Path]
+    if sources is None:
+        src_file_paths = walk(
+            src_dir,
+            extensions=extractors.supported_extensions(),
+            include=include,
+            exclude=exclude,
+            jobs=jobs,
+        )
+    else:
+        src_file_paths = filter_paths(
+            sources,
+            src_dir,
+            extensions=extractors.supported_extensions(),
+            include=include,
+            exclude=exclude,
+        )
+    if planned:
+        src_file_paths = (
+            path for path in src_file_paths if os.fspath(path) not in planned
+        )
+
+    for src_file_path, created in _map_concurrent(
+        create_path, src_file_paths, jobs=jobs
+    ):
+        index_task.advance()
+        run_stats.count("index.files")
+        if created is None:
+            log.warning("Skipping %s, no creation time found", src_file_path)
+            run_stats.count("skipped.no_creation_time")
+            skip_task.advance()
+            continue
+        date, target_path = created
+
+        if deduplicator is None and skip_existing:
+            with run_stats.time("index.lookup"):
+                up_to_date = index.is_up_to_date(src_file_path, target_path, compare)
+            if up_to_date:
+                log.info("Skipping %s", src_file_path)
+                run_stats.count("skipped.existing")
+                skip_task.advance()
                 continue
-            else:
-                src_dest_paths.append((src_file_path, target_path))
-        return src_dest_paths
 
+        if deduplicator is not None and index.exists(target_path):
+            target_path = _unique_path(target_path, index)
+
+        try:
+            src_stat = src_file_path.stat()
+            duplicate = None
+            if deduplicator is not None:
+                # The destination is read instead once the source is moved
+                with run_stats.time("index.dedup"):
+                    duplicate = deduplicator.find_duplicate(
+                        src_file_path, src_stat.st_size, destination=target_path
+                    )
+        except OSError as e:
+            log.warning("Skipping %s: %s", src_file_path, e)
+            run_stats.count("skipped.errors")
+            skip_task.advance()
+            continue
+
+        if duplicate is not None:
+            log.info("Skipping %s, identical to %s", src_file_path, duplicate)
+            run_stats.count("skipped.duplicates")
+            skip_task.advance()
+            continue
+
+        index.add(target_path, FileInfo(src_stat.st_size, src_stat.st_mtime))
+        if create_dirs:
+            index.ensure_dir(target_path.parent)
+        yield PlannedTransfer(src_file_path, target_path, src_stat.st_size, date)
 
-def _create_path_by_creation_date(
-    src_file_path: Path, dest_dir: Path, dir_format: str
-) -> Path:
-    """Returns path based on creation date of file"""
-    date = meta.get_creation_time(src_file_path)
-    sub_directories = _create_path_from(date, dir_format)
+    index_task.flush()
+    skip_task.flush()
 
-    return dest_dir / sub_directories / src_file_path.name
+
+def _unique_path(path: Path, index: DestinationIndex) -> Path:
+    """Returns path with a numbered suffix that does not exist in index"""
+    number = 1
+    while True:
+        candidate = path.with_name(f"{path.stem}_{number}{path.suffix}")
+        if not index.exists(candidate):
+            return candidate
+        number += 1
+
+
+def _map_concurrent(
+    func: Callable[[T], R], items: Iterable[T], jobs: int = 1
+) -> Iterator[Tuple[T, R]]:
+    """Yields `(item, func(item))` in input order using up to `jobs` threads
+
+    Only a bounded number of items are submitted ahead of the consumer so that
+    a lazy `items` iterator is not exhausted up front.
+    """
+    if jobs <= 1:
+        for item in items:
+            yield item, func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for item in items:
+            pending.append((item, executor.submit(func, item)))
+            if len(pending) >= jobs * 4:
+                item, future = pending.popleft()
+                yield item, future.result()
+
+        while pending:
+            item, future = pending.popleft()
+            yield item, future.result()
 
 
 def _create_path_from(date_time: datetime, dir_format: str) -> Path:
@@ -113,61 +1074,138 @@ def _create_path_from(date_time: datetime, dir_format: str) -> Path:
 
     Args:
         date_time (datetime): time to be used in path formatting
-        dir_format (str): String including format codes of how to format the path
+        dir_format (str): String including format codes of how to format the path.
+            Every letter is taken as a format code if there are no % signs.
 
     Returns:
         Path: A path formatted by datetime
     """
+    return compile_template(dir_format).format(date_time)
 
-    # Assume that we strictly indicate format codes with %
-    if "%" in dir_format:
-        return Path(date_time.strftime(dir_format))
 
-    # If no % signs in dir_format, assume that it is loosly formated and that every
-    # character could be a format code.
-    path = Path()
-    for directory_string in dir_format.split("/"):
-        folder_name = ""
-        for char in directory_string:
-            if char not in string.ascii_letters:
-                folder_name += char
-                continue
-            try:
-                dir_part = date_time.strftime(f"%{char}")
-            except ValueError:
-                # If we cant translate, we append that character instead.
-                folder_name += char
-            else:
-                folder_name += dir_part
-        path = path.joinpath(folder_name)
+def _copy_file(
+    src_file_path: Path,
+    dest_path: Path,
+    create_dirs=True,
+    mode: Mode = Mode.COPY,
+    buffer_size: int = transfer.DEFAULT_BUFFER_SIZE,
+    durability: Optional[Durability] = None,
+    verify: bool = False,
+    manifest: Optional[Manifest] = None,
+) -> None:
+    """Copies file from source to target path, recording it in manifest if given"""
+    if create_dirs:
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+    result = transfer.copy_file(
+        src_file_path,
+        dest_path,
+        mode=mode,
+        buffer_size=buffer_size,
+        durability=durability,
+        verify=verify,
+    )
+    if manifest is not None:
+        manifest.record(src_file_path, dest_path, result)
 
-    return path
 
+def _move_file(
+    src_file_path: Path,
+    dest_path: Path,
+    create_dirs=True,
+    mode: Mode = Mode.RENAME,
+    buffer_size: int = transfer.DEFAULT_BUFFER_SIZE,
+    durability: Optional[Durability] = None,
+    verify: bool = False,
+    manifest: Optional[Manifest] = None,
+) -> None:
+    """Moves file from source to target path, recording it in manifest if given"""
+    if create_dirs:
+        dest_path.parent.mkdir(parents=True, exist_ok=True)
+    result = transfer.move_file(
+        src_file_path,
+        dest_path,
+        mode=mode,
+        buffer_size=buffer_size,
+        durability=durability,
+        verify=verify,
+    )
+    if manifest is not None:
+        manifest.record(src_file_path, dest_path, result)
 
-def _copy_file(src_file_path: Path, dest_path: Path) -> None:
-    """Copies file from source to target path"""
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
-    shutil.copy2(src_file_path, dest_path)
 
+def remove_dirs(root_dir: Path) -> int:
+    """Removes empty directories below root, root included, bottom up
 
-def _move_file(src_file_path: Path, dest_path: Path) -> None:
-    """Moves file from source to target path"""
-    dest_path.parent.mkdir(parents=True, exist_ok=True)
-    shutil.move(src_file_path, dest_path)
+    Every directory is listed once. A directory counts as empty when it held no
+    files and all of its sub directories were removed, so it is not listed
+    again. Symbolic links to directories are not followed, and the current
+    working directory is kept. Returns the number of removed directories.
+    """
+    cwd = os.getcwd()
+    # Directories in the order they were listed, with their number of entries
+    directories: List[Tuple[str, int]] = []
+    stack = [os.path.realpath(root_dir)]
+    while stack:
+        directory = stack.pop()
+        entries = 0
+        try:
+            with os.scandir(directory) as scanned:
+                for entry in scanned:
+                    entries += 1
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+        except OSError as e:
+            log.warning(f"Could not list directory {directory}: {e}")
+            continue
+        directories.append((directory, entries))
 
+    # Children are listed after their parent, so walking the list backwards
+    # removes them first and updates the entry count of their parent
+    removed_entries: Dict[str, int] = {}
+    removed = 0
+    for directory, entries in reversed(directories):
+        if entries > removed_entries.pop(directory, 0) or directory == cwd:
+            continue
+        try:
+            os.rmdir(directory)
+        except OSError as e:
+            log.warning("Could not remove %s: %s", directory, e)
+            continue
+        log.info("Removed %s", directory)
+        removed += 1
+        parent = os.path.dirname(directory)
+        removed_entries[parent] = removed_entries.get(parent, 0) + 1
+    return removed
 
-def remove_dirs(root_dir: Path) -> None:
-    """Recursivly remove empty directories"""
-    for path in Path(root_dir).iterdir():
-        if path.is_dir():
-            remove_dirs(path)
 
-    if Path.cwd() == root_dir.resolve():
-        # Cant remove current working directory
-        return
+def prune_dirs(directories: Iterable[Path], root_dir: Path) -> int:
+    """Removes the directories that are empty, and parents they leave empty
+
+    Only directories below `root_dir` are removed, `root_dir` itself is kept.
+    Nothing is listed, removing a directory that is not empty simply fails.
+    Returns the number of removed directories.
+    """
+    root = os.path.abspath(root_dir)
+    prefix = os.path.join(root, "")
+    cwd = os.getcwd()
 
-    children = [child for child in root_dir.iterdir()]
-    # remove if empty
-    if len(children) == 0:
-        root_dir.rmdir()
-        log.info(f"Removed {root_dir}")
+    # Deepest directories first, so parents are tried after all their children
+    pending = {os.path.abspath(directory) for directory in directories}
+    heap = [(-directory.count(os.sep), directory) for directory in pending]
+    heapq.heapify(heap)
+    removed = 0
+    while heap:
+        _, directory = heapq.heappop(heap)
+        if not directory.startswith(prefix) or directory == cwd:
+            continue
+        try:
+            os.rmdir(directory)
+        except OSError:
+            continue
+        log.info("Removed %s", directory)
+        removed += 1
+        parent = os.path.dirname(directory)
+        if parent not in pending:
+            pending.add(parent)
+            heapq.heappush(heap, (-parent.count(os.sep), parent))
+    return removed
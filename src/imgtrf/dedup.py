@@ -0,0 +1,160 @@
+"""Content based duplicate detection
+
+Files are first grouped by size, which takes a stat call per file but no reads.
+Only files sharing a size with a known file are read, and then only a block from
+the head and the tail. The whole file is hashed only when those blocks match
+too.
+"""
+
+import hashlib
+import logging
+import os
+from pathlib import Path
+from typing import Callable, Dict, List, Mapping, Optional
+
+log = logging.getLogger(__name__)
+
+BLOCK_SIZE = 64 * 1024
+_READ_SIZE = 1024**2
+
+
+def new_hash():
+    """Returns hash object used for file content"""
+    return hashlib.blake2b(digest_size=32)
+
+
+def hash_file(path: Path) -> str:
+    """Returns hex digest of whole file content"""
+    digest = new_hash()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(_READ_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _hash_partial(path: Path, size: int) -> str:
+    """Returns hex digest of first and last block of file"""
+    digest = new_hash()
+    with open(path, "rb") as file:
+        digest.update(file.read(BLOCK_SIZE))
+        if size > 2 * BLOCK_SIZE:
+            file.seek(size - BLOCK_SIZE)
+        digest.update(file.read(BLOCK_SIZE))
+    return digest.hexdigest()
+
+
+def _known_hash(
+    hashes: Optional[Mapping], relative_path: str, stat: os.stat_result
+) -> Optional[str]:
+    known = hashes.get(relative_path) if hashes else None
+    if known is None or known.size != stat.st_size:
+        return None
+    if known.mtime_ns != stat.st_mtime_ns:
+        return None
+    return known.digest
+
+
+class _Entry:
+    __slots__ = ("path", "size", "destination", "partial_hash", "full_hash")
+
+    def __init__(
+        self,
+        path: Path,
+        size: int,
+        full_hash: Optional[str] = None,
+        destination: Optional[Path] = None,
+    ):
+        self.path = path
+        self.size = size
+        self.destination = destination
+        self.partial_hash: Optional[str] = None
+        self.full_hash = full_hash
+
+    def get_partial_hash(self) -> str:
+        if self.partial_hash is None:
+            self.partial_hash = self._read(lambda path: _hash_partial(path, self.size))
+        return self.partial_hash
+
+    def get_full_hash(self) -> str:
+        if self.full_hash is None:
+            self.full_hash = self._read(hash_file)
+        return self.full_hash
+
+    def _read(self, read: Callable[[Path], str]) -> str:
+        try:
+            return read(self.path)
+        except FileNotFoundError:
+            if self.destination is None:
+                raise
+            # Moved since it was registered. A move never removes the source
+            # before the destination exists, so one of them is found.
+            return read(self.destination)
+
+
+class Deduplicator:
+    """Finds files with the same content as a file seen before
+
+    Known files are registered with `add` or `add_tree`, and every file passed
+    to `find_duplicate` that is not a duplicate becomes known as well.
+    """
+
+    def __init__(self):
+        self._by_size: Dict[int, List[_Entry]] = {}
+
+    def add(self, path: Path, size: int, full_hash: Optional[str] = None) -> None:
+        """Registers a known file, optionally with an already computed hash"""
+        self._by_size.setdefault(size, []).append(_Entry(path, size, full_hash))
+
+    def add_tree(self, root: Path, hashes: Optional[Mapping] = None) -> int:
+        """Registers all files below root, returns number of files
+
+        `hashes` maps paths relative to root on a `manifest.KnownHash`. A hash
+        is only used if size and modification time of the file still match.
+        """
+        count = 0
+        root = os.fspath(root)
+        root_length = len(os.path.join(root, ""))
+        stack = [root]
+        while stack:
+            try:
+                with os.scandir(stack.pop()) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append(entry.path)
+                        elif entry.is_file():
+                            stat = entry.stat()
+                            relative_path = entry.path[root_length:]
+                            full_hash = _known_hash(hashes, relative_path, stat)
+                            self.add(Path(entry.path), stat.st_size, full_hash)
+                            count += 1
+            except FileNotFoundError:
+                continue
+        return count
+
+    def find_duplicate(
+        self, path: Path, size: int, destination: Optional[Path] = None
+    ) -> Optional[Path]:
+        """Returns a known file with the same content as path
+
+        If there is none, path is registered as known and None is returned.
+        `destination` is where path is about to be transferred, which is read
+        instead if path is moved away before it is compared with later files.
+        """
+        candidate = _Entry(path, size, destination=destination)
+        for entry in self._by_size.get(size, []):
+            try:
+                if entry.full_hash is not None and entry.partial_hash is None:
+                    # Hash given up front, compare without reading known file
+                    if entry.full_hash == candidate.get_full_hash():
+                        return entry.path
+                    continue
+                if entry.get_partial_hash() != candidate.get_partial_hash():
+                    continue
+                if entry.get_full_hash() == candidate.get_full_hash():
+                    return entry.path
+            except OSError as e:
+                # A known file may have been removed since it was registered
+                log.debug("Could not compare %s with %s: %s", path, entry.path, e)
+
+        self._by_size.setdefault(size, []).append(candidate)
+        return None
@@ -0,0 +1,237 @@
+"""Scheduling of file system work per device
+
+Working on many files at once pays off on SSDs and network storage, but makes
+a spinning disk move its heads back and forth between them. Reading metadata,
+listing directories and transferring files is therefore done while holding a
+slot of every device involved. By default a rotational disk has a single slot
+and other devices have no limit besides the number of jobs.
+
+Copied data can also be capped to a number of bytes per second, shared by all
+transfers, and the process can lower its own CPU and I/O priority so a bulk
+import leaves the disks to other work first.
+"""
+
+import contextlib
+import functools
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+from typing import Dict, Iterator, Optional, Union
+
+log = logging.getLogger(__name__)
+
+# Slots of a spinning disk unless configured otherwise
+DEFAULT_ROTATIONAL_JOBS = 1
+
+# ioprio_set system call numbers per architecture, see linux/ioprio.h
+_IOPRIO_SET = {
+    "x86_64": 251,
+    "i386": 289,
+    "i686": 289,
+    "aarch64": 30,
+    "riscv64": 30,
+    "armv7l": 314,
+    "ppc64le": 273,
+    "s390x": 282,
+}
+_IOPRIO_WHO_PROCESS = 1
+_IOPRIO_CLASS_IDLE = 3
+_IOPRIO_CLASS_SHIFT = 13
+
+# Windows priority class lowering both CPU and I/O priority of the process
+_PROCESS_MODE_BACKGROUND_BEGIN = 0x00100000
+
+
+@functools.lru_cache(maxsize=4096)
+def device_of(directory: str) -> int:
+    """Returns the device of a directory
+
+    Cached, as directories are few compared to files and do not move between
+    devices during a run.
+    """
+    return os.stat(directory).st_dev
+
+
+@functools.lru_cache(maxsize=None)
+def is_rotational(device: int) -> Optional[bool]:
+    """True for a spinning disk, None if unknown
+
+    Only known on Linux, where it is read from sysfs. Network and virtual file
+    systems, which have no block device, are not rotational.
+    """
+    if not sys.platform.startswith("linux"):
+        return None
+    if os.major(device) == 0:
+        return False
+
+    block = f"/sys/dev/block/{os.major(device)}:{os.minor(device)}"
+    # A partition has no queue of its own, it is found on its disk
+    for queue in (os.path.join(block, "queue"), os.path.join(block, "..", "queue")):
+        try:
+            with open(os.path.join(queue, "rotational")) as file:
+                return file.read().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+
+class DeviceSlots:
+    """Limits how many files of each device are worked on at the same time
+
+    Args:
+        jobs (int, optional): Slots of every device. If None, a rotational disk
+            gets `rotational_jobs` slots and other devices are not limited.
+        rotational_jobs (int): Slots of a rotational disk, if `jobs` is None
+    """
+
+    def __init__(
+        self,
+        jobs: Optional[int] = None,
+        rotational_jobs: int = DEFAULT_ROTATIONAL_JOBS,
+    ):
+        self.jobs = jobs
+        self.rotational_jobs = rotational_jobs
+        self._semaphores: Dict[int, Optional[threading.Semaphore]] = {}
+        self._lock = threading.Lock()
+
+    def limit(self, device: int) -> Optional[int]:
+        """Returns number of slots of device, None if unlimited"""
+        if self.jobs is not None:
+            return self.jobs
+        if is_rotational(device):
+            return self.rotational_jobs
+        return None
+
+    @contextlib.contextmanager
+    def hold(self, *devices: int) -> Iterator[None]:
+        """Holds a slot of every device for the duration of the block
+
+        Slots are taken in device order, so two threads each waiting for a slot
+        held by the other can not happen.
+        """
+        with contextlib.ExitStack() as stack:
+            for device in sorted(set(devices)):
+                semaphore = self._semaphore(device)
+                if semaphore is not None:
+                    stack.enter_context(semaphore)
+            yield
+
+    def _semaphore(self, device: int) -> Optional[threading.Semaphore]:
+        with self._lock:
+            if device not in self._semaphores:
+                limit = self.limit(device)
+                log.debug("Device %s limited to %s jobs", device, limit)
+                self._semaphores[device] = (
+                    None if limit is None else threading.Semaphore(limit)
+                )
+            return self._semaphores[device]
+
+
+class RateLimit:
+    """Caps the bytes per second consumed by any number of threads
+
+    Bytes are consumed first and paid for by sleeping afterwards, so a single
+    chunk larger than a second's worth of bytes is never blocked forever. Up to
+    one second's worth of unused bytes is saved for later.
+    """
+
+    def __init__(self, bytes_per_second: int):
+        self.bytes_per_second = bytes_per_second
+        self._allowance = 0.0
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, size: int) -> None:
+        """Consumes `size` bytes, sleeps until they fit within the rate"""
+        with self._lock:
+            now = time.monotonic()
+            self._allowance = min(
+                self.bytes_per_second,
+                self._allowance + (now - self._last) * self.bytes_per_second,
+            )
+            self._last = now
+            self._allowance -= size
+            delay = -self._allowance / self.bytes_per_second
+        if delay > 0:
+            time.sleep(delay)
+
+
+_slots = DeviceSlots()
+_rate: Optional[RateLimit] = None
+
+
+def configure(jobs: Optional[int] = None, max_rate: Optional[int] = None) -> None:
+    """Sets slots per device and the cap on copied bytes per second
+
+    See `DeviceSlots` for `jobs`. Copying is not capped if `max_rate` is None.
+    """
+    global _slots, _rate
+    _slots = DeviceSlots(jobs=jobs)
+    _rate = None if max_rate is None else RateLimit(max_rate)
+
+
+@contextlib.contextmanager
+def hold(*directories: Union[str, os.PathLike]) -> Iterator[None]:
+    """Holds a slot of the device of every directory for the duration of the block
+
+    A directory that can not be found is left out, for the work itself to report.
+    """
+    devices = []
+    for directory in directories:
+        try:
+            devices.append(device_of(os.fspath(directory)))
+        except OSError:
+            continue
+    with _slots.hold(*devices):
+        yield
+
+
+def throttle(size: int) -> None:
+    """Accounts for `size` copied bytes, sleeps if above the configured rate"""
+    if _rate is not None:
+        _rate.consume(size)
+
+
+def lower_priority() -> None:
+    """Lowers CPU and I/O priority of the process and the threads it starts
+
+    On Linux the process gets the lowest CPU priority and the idle I/O class,
+    where schedulers supporting it only give it disk time no one else wants.
+    On Windows the process enters background mode. Elsewhere only the CPU
+    priority is lowered. Failures are logged and otherwise ignored.
+    """
+    if sys.platform == "win32":
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        if not kernel32.SetPriorityClass(
+            kernel32.GetCurrentProcess(), _PROCESS_MODE_BACKGROUND_BEGIN
+        ):
+            log.debug("Could not enter background mode: %s", ctypes.WinError())
+        return
+
+    try:
+        os.nice(19)
+    except OSError as e:
+        log.debug("Could not lower CPU priority: %s", e)
+
+    if sys.platform.startswith("linux"):
+        _set_idle_io_priority()
+
+
+def _set_idle_io_priority() -> None:
+    number = _IOPRIO_SET.get(platform.machine())
+    if number is None:
+        log.debug("I/O priority not supported on %s", platform.machine())
+        return
+
+    import ctypes
+
+    libc = ctypes.CDLL(None, use_errno=True)
+    priority = _IOPRIO_CLASS_IDLE << _IOPRIO_CLASS_SHIFT
+    if libc.syscall(number, _IOPRIO_WHO_PROCESS, 0, priority) != 0:
+        error = ctypes.get_errno()
+        log.debug("Could not lower I/O priority: %s", os.strerror(error))
@@ -4,4 +4,14 @@ class ImgtrfError(Exception):
     pass
 
 class MetaDataError(ImgtrfError):
-    pass
\ No newline at end of file
+    pass
+
+class TransferError(ImgtrfError):
+    """One or more files failed to transfer
+
+    `failed` holds the path and the exception of every failed file.
+    """
+
+    def __init__(self, failed):
+        self.failed = failed
+        super().__init__(f"{len(failed)} file(s) failed to transfer")
@@ -0,0 +1,176 @@
+"""Minimal EXIF reader for creation time
+
+Only the header of the file is read, through a memory map when possible, and
+only the date tags are decoded. Anything out of the ordinary raises `ExifError`
+so that the caller can fall back on a full parser such as Pillow.
+
+Reference:
+    https://www.cipa.jp/std/documents/e/DC-008-2012_E.pdf
+"""
+from datetime import datetime
+import mmap
+from pathlib import Path
+import struct
+from typing import Callable, Dict, Optional, Tuple, Union
+
+from imgtrf import exceptions
+
+# EXIF is stored in APP segments in the beginning of a JPEG file, each segment
+# being at most 64 KiB. Nothing beyond this many bytes is ever read.
+MAX_HEADER_SIZE = 256 * 1024
+
+TAG_DATE_TIME = 0x0132
+TAG_EXIF_IFD = 0x8769
+TAG_DATE_TIME_ORIGINAL = 0x9003
+TAG_DATE_TIME_DIGITIZED = 0x9004
+
+_TYPE_ASCII = 2
+_TYPE_LONG = 4
+
+_TIME_FORMAT = r"%Y:%m:%d %H:%M:%S"
+
+Buffer = Union[bytes, mmap.mmap]
+
+
+class ExifError(exceptions.MetaDataError):
+    """File header could not be parsed by this reader"""
+
+    pass
+
+
+def read_creation_time(path: Path) -> Optional[datetime]:
+    """Returns creation time from EXIF header of a JPEG or TIFF file
+
+    `DateTime` is preferred, `DateTimeOriginal` and `DateTimeDigitized` are used
+    if it is missing or invalid.
+
+    Raises:
+        ExifError: If file could not be parsed
+        OSError: If file could not be read
+
+    Returns:
+        datetime | None: creation time, None if file has no date tags
+    """
+    with open(path, "rb") as file:
+        try:
+            buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            # Empty files and some file systems can not be memory mapped
+            buffer = file.read(MAX_HEADER_SIZE)
+
+        try:
+            tags = read_date_tags(buffer)
+        finally:
+            if isinstance(buffer, mmap.mmap):
+                buffer.close()
+
+    for tag in (TAG_DATE_TIME, TAG_DATE_TIME_ORIGINAL, TAG_DATE_TIME_DIGITIZED):
+        if tag not in tags:
+            continue
+        try:
+            return datetime.strptime(tags[tag], _TIME_FORMAT)
+        except ValueError:
+            # Unset dates are often stored as blanks or zeros
+            continue
+    return None
+
+
+def read_date_tags(buffer: Buffer) -> Dict[int, str]:
+    """Returns date tags found in header of JPEG or TIFF data"""
+    limit = min(len(buffer), MAX_HEADER_SIZE)
+    head = buffer[:4]
+
+    if head[:2] == b"\xff\xd8":
+        return _read_jpeg(buffer, limit)
+    if head in (b"II*\x00", b"MM\x00*"):
+        return _read_tiff(buffer, 0, limit)
+    raise ExifError("Not a JPEG or TIFF file")
+
+
+def _read_jpeg(buffer: Buffer, limit: int) -> Dict[int, str]:
+    position = 2
+    while position + 4 <= limit:
+        if buffer[position] != 0xFF:
+            raise ExifError(f"Expected JPEG marker at offset {position}")
+
+        marker = buffer[position + 1]
+        if marker == 0xFF:
+            # Padding before marker
+            position += 1
+            continue
+        if marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            # Markers without a length
+            position += 2
+            continue
+        if marker in (0xD9, 0xDA):
+            # End of image or start of image data, no EXIF segment in header
+            return {}
+
+        (length,) = struct.unpack(">H", buffer[position + 2 : position + 4])
+        start = position + 4
+        end = position + 2 + length
+        if marker == 0xE1 and buffer[start : start + 6] == b"Exif\x00\x00":
+            return _read_tiff(buffer, start + 6, min(end, limit))
+        position = end
+
+    raise ExifError("No EXIF segment found within header")
+
+
+def _read_tiff(buffer: Buffer, start: int, end: int) -> Dict[int, str]:
+    byte_order = buffer[start : start + 2]
+    if byte_order == b"II":
+        endian = "<"
+    elif byte_order == b"MM":
+        endian = ">"
+    else:
+        raise ExifError("Invalid TIFF byte order")
+
+    def unpack(fmt: str, offset: int) -> tuple:
+        size = struct.calcsize(endian + fmt)
+        if offset < start or offset + size > end:
+            raise ExifError(f"TIFF offset {offset} out of bounds")
+        return struct.unpack(endian + fmt, buffer[offset : offset + size])
+
+    magic, ifd_offset = unpack("HI", start + 2)
+    if magic != 42:
+        raise ExifError("Invalid TIFF header")
+
+    tags: Dict[int, str] = {}
+    exif_ifd_offset = _read_ifd(unpack, start, ifd_offset, (TAG_DATE_TIME,), tags)
+    if exif_ifd_offset is not None:
+        _read_ifd(
+            unpack,
+            start,
+            exif_ifd_offset,
+            (TAG_DATE_TIME_ORIGINAL, TAG_DATE_TIME_DIGITIZED),
+            tags,
+        )
+    return tags
+
+
+def _read_ifd(
+    unpack: Callable[[str, int], tuple],
+    start: int,
+    ifd_offset: int,
+    wanted: Tuple[int, ...],
+    tags: Dict[int, str],
+) -> Optional[int]:
+    """Reads wanted ASCII tags of IFD into `tags`, returns offset of EXIF IFD"""
+    exif_ifd_offset = None
+
+    (count,) = unpack("H", start + ifd_offset)
+    for index in range(count):
+        entry = start + ifd_offset + 2 + index * 12
+        tag, type_, value_count = unpack("HHI", entry)
+
+        if tag == TAG_EXIF_IFD and type_ == _TYPE_LONG:
+            (exif_ifd_offset,) = unpack("I", entry + 8)
+        elif tag in wanted and type_ == _TYPE_ASCII:
+            if value_count <= 4:
+                value_offset = entry + 8
+            else:
+                value_offset = start + unpack("I", entry + 8)[0]
+            (raw,) = unpack(f"{value_count}s", value_offset)
+            tags[tag] = raw.rstrip(b"\x00 ").decode("ascii", errors="replace")
+
+    return exif_ifd_offset
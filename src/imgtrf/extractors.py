@@ -0,0 +1,128 @@
+"""Registry of creation time extractors by file extension
+
+Which files are read for a creation time, and how, is decided by the extractor
+registered for their extension. Built in extractors read images through their
+EXIF header and videos through their container or ffprobe.
+
+Other packages can add extractors, e.g. for HEIC or RAW files, through the
+`imgtrf.extractors` entry point group. Each entry point refers to an
+`Extractor`, and an extractor registered later for an extension replaces an
+earlier one.
+
+Extractor functions are given as "module:function" and only imported the first
+time a file is extracted, and plugins are only loaded the first time the
+registry is consulted. Commands that never read metadata therefore import
+neither imaging libraries nor plugins.
+"""
+
+from datetime import datetime
+import importlib
+import logging
+from pathlib import Path
+import sys
+import threading
+from typing import Callable, Dict, FrozenSet, NamedTuple, Optional, Union
+
+log = logging.getLogger(__name__)
+
+ENTRY_POINT_GROUP = "imgtrf.extractors"
+
+ExtractFunction = Callable[[Path], Optional[datetime]]
+
+
+class Extractor(NamedTuple):
+    """Reads creation time of files with one of `extensions`
+
+    Args:
+        name: Name stored as source of the creation time, e.g. in the cache
+        extensions: Lower case extensions without leading dot
+        media: Kind of media, "image" or "video"
+        function: Extract function or "module:function" to import on first use
+    """
+
+    name: str
+    extensions: FrozenSet[str]
+    media: str
+    function: Union[str, ExtractFunction]
+
+    def extract(self, path: Path) -> Optional[datetime]:
+        function = self.function
+        if isinstance(function, str):
+            function = _import(function)
+        return function(path)
+
+
+IMAGE = Extractor(
+    "image",
+    frozenset({"jpg", "jpeg", "png"}),
+    "image",
+    "imgtrf.meta:get_image_creation_time",
+)
+VIDEO = Extractor(
+    "video",
+    frozenset({"mp4", "mov", "m4v", "3gp"}),
+    "video",
+    "imgtrf.meta:get_video_creation_time",
+)
+
+_by_extension: Dict[str, Extractor] = {}
+_plugins_loaded = False
+_lock = threading.Lock()
+
+
+def register(extractor: Extractor) -> None:
+    """Makes extractor handle its extensions, replacing earlier registrations"""
+    for extension in extractor.extensions:
+        _by_extension[extension.lower()] = extractor
+
+
+def get(extension: str) -> Optional[Extractor]:
+    """Returns extractor for a lower case extension, None if unsupported"""
+    _load_plugins()
+    return _by_extension.get(extension)
+
+
+def for_path(path: Path) -> Optional[Extractor]:
+    return get(path.suffix[1:].lower())
+
+
+def supported_extensions() -> FrozenSet[str]:
+    """Returns extensions of all files that creation time can be read from"""
+    _load_plugins()
+    return frozenset(_by_extension)
+
+
+def _load_plugins() -> None:
+    global _plugins_loaded
+    if _plugins_loaded:
+        return
+
+    with _lock:
+        if _plugins_loaded:
+            return
+        for entry_point in _entry_points():
+            try:
+                extractor = entry_point.load()
+            except Exception as e:
+                log.warning(f"Could not load extractor plugin {entry_point.name}: {e}")
+                continue
+            log.debug(f"Loaded extractor {extractor.name} from {entry_point.value}")
+            register(extractor)
+        _plugins_loaded = True
+
+
+def _entry_points():
+    from importlib import metadata
+
+    if sys.version_info >= (3, 10):
+        return metadata.entry_points(group=ENTRY_POINT_GROUP)
+    return metadata.entry_points().get(ENTRY_POINT_GROUP, [])
+
+
+def _import(target: str) -> ExtractFunction:
+    module_name, _, attribute = target.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+register(IMAGE)
+register(VIDEO)
@@ -0,0 +1,41 @@
+"""Creation time from file names
+
+Phones and cameras commonly put the time a picture was taken in its file name,
+like IMG_20200101_123456.jpg, PXL_20200101_123456789.jpg or
+VID-20200101-WA0001.mp4. Reading it from there needs no file access at all.
+
+A date must be written as year, month and day, optionally followed by hour,
+minute and second, with at most one separator between each part. Names with a
+date but no time give midnight of that day.
+"""
+
+from datetime import datetime
+import re
+from typing import Optional
+
+_PATTERN = re.compile(
+    r"(?<!\d)"
+    r"(?P<year>(?:19|20)\d{2})[-_.]?"
+    r"(?P<month>0[1-9]|1[0-2])[-_.]?"
+    r"(?P<day>0[1-9]|[12]\d|3[01])"
+    r"(?:[-_. T]?"
+    r"(?P<hour>[01]\d|2[0-3])[-_.:]?"
+    r"(?P<minute>[0-5]\d)[-_.:]?"
+    r"(?P<second>[0-5]\d)"
+    # Milliseconds, as in Pixel file names
+    r"(?:[.,]?\d{1,3})?"
+    r")?"
+    r"(?!\d)"
+)
+
+
+def read_creation_time(name: str) -> Optional[datetime]:
+    """Returns the first valid date and time in a file name, None if there is none"""
+    for match in _PATTERN.finditer(name):
+        parts = [int(part or 0) for part in match.groups()]
+        try:
+            return datetime(*parts)
+        except ValueError:
+            # Such as the 31st of a month with 30 days
+            continue
+    return None
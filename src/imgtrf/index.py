@@ -0,0 +1,172 @@
+"""In-memory index of the destination directory
+
+Looking up every planned destination file with `exists()` and creating its
+directory with `mkdir()` costs a round trip per file on network storage. The
+index instead lists each destination directory once, the first time a path in
+it is looked up, and answers the remaining questions from memory.
+
+When files are transferred while the source is still being indexed, listings
+can be dropped again to keep memory bounded. A dropped directory is listed
+anew when needed, which then finds the files transferred to it since.
+"""
+
+from collections import OrderedDict
+from enum import Enum
+import os
+from pathlib import Path
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# Modification times within this many seconds are considered equal, FAT file
+# systems only store them with a two second resolution.
+MTIME_TOLERANCE = 2.0
+
+# Files added last that are remembered even if their directory is dropped, as
+# they may not have been written yet. Far more than are ever in flight.
+DEFAULT_RECENT_FILES = 10_000
+
+
+class Compare(str, Enum):
+    """How an existing destination file is compared to its source"""
+
+    NAME = "name"
+    SIZE = "size"
+    SIZE_MTIME = "size-mtime"
+
+
+class FileInfo(NamedTuple):
+    size: int
+    mtime: float
+
+
+class DestinationIndex:
+    """Lazily populated view of destination directories
+
+    Files planned to be written are added to the index so that later files with
+    the same destination are treated as existing. Existing files are only
+    stat'ed when their size or modification time is asked for.
+
+    With `max_entries`, the least recently used directory listings are dropped
+    once the listed files and directories add up to more than that. This is
+    only correct when added files are written shortly after, as the last
+    `recent_files` added files are all that is kept of dropped listings. The
+    listing in use is never dropped, however large.
+    """
+
+    def __init__(
+        self,
+        max_entries: Optional[int] = None,
+        recent_files: int = DEFAULT_RECENT_FILES,
+    ):
+        # A directory maps to None if it does not exist yet and a file maps to
+        # None until it has been stat'ed.
+        self._dirs: "OrderedDict[str, Optional[Dict[str, Optional[FileInfo]]]]" = (
+            OrderedDict()
+        )
+        self._entries = 0
+        self._recent: "OrderedDict[Tuple[str, str], FileInfo]" = OrderedDict()
+        self._created = set()
+        self._lock = threading.Lock()
+        self.max_entries = max_entries
+        self.recent_files = recent_files
+
+    def exists(self, path: Path) -> bool:
+        directory = os.fspath(path.parent)
+        files = self._list(directory)
+        if files is not None and path.name in files:
+            return True
+        with self._lock:
+            return (directory, path.name) in self._recent
+
+    def lookup(self, path: Path) -> Optional[FileInfo]:
+        """Returns size and modification time of file, None if it does not exist"""
+        directory = os.fspath(path.parent)
+        files = self._list(directory)
+        if files is None or path.name not in files:
+            with self._lock:
+                return self._recent.get((directory, path.name))
+
+        info = files[path.name]
+        if info is None:
+            stat = path.stat()
+            info = files[path.name] = FileInfo(stat.st_size, stat.st_mtime)
+        return info
+
+    def is_up_to_date(
+        self, src_file_path: Path, target_path: Path, compare: Compare = Compare.NAME
+    ) -> bool:
+        """Returns True if target exists and matches source according to `compare`"""
+        if compare == Compare.NAME:
+            return self.exists(target_path)
+
+        info = self.lookup(target_path)
+        if info is None:
+            return False
+
+        src_stat = src_file_path.stat()
+        if src_stat.st_size != info.size:
+            return False
+        if compare == Compare.SIZE_MTIME:
+            return abs(src_stat.st_mtime - info.mtime) <= MTIME_TOLERANCE
+        return True
+
+    def add(self, path: Path, info: FileInfo) -> None:
+        """Records that a file is, or will be, written to path"""
+        directory = os.fspath(path.parent)
+        self._list(directory)
+        with self._lock:
+            # Unless another thread dropped the listing meanwhile
+            if directory in self._dirs:
+                files = self._dirs[directory]
+                if files is None:
+                    files = self._dirs[directory] = {}
+                if path.name not in files:
+                    self._entries += 1
+                files[path.name] = info
+
+            self._recent[directory, path.name] = info
+            self._recent.move_to_end((directory, path.name))
+            if len(self._recent) > self.recent_files:
+                self._recent.popitem(last=False)
+            self._evict()
+
+    def ensure_dir(self, directory: Path) -> None:
+        """Creates directory and its parents unless already done"""
+        key = os.fspath(directory)
+        with self._lock:
+            if key in self._created:
+                return
+            directory.mkdir(parents=True, exist_ok=True)
+            self._created.add(key)
+
+    def _list(self, directory: str) -> Optional[Dict[str, Optional[FileInfo]]]:
+        with self._lock:
+            if directory in self._dirs:
+                self._dirs.move_to_end(directory)
+                return self._dirs[directory]
+
+        files: Optional[Dict[str, Optional[FileInfo]]]
+        try:
+            with os.scandir(directory) as entries:
+                files = {entry.name: None for entry in entries if entry.is_file()}
+        except FileNotFoundError:
+            files = None
+
+        with self._lock:
+            if directory not in self._dirs:
+                self._dirs[directory] = files
+                # The directory itself counts as well
+                self._entries += 1 + len(files or ())
+                self._evict()
+            return self._dirs[directory]
+
+    def _evict(self) -> None:
+        """Drops least recently used listings while above `max_entries`
+
+        Called with the lock held.
+        """
+        if self.max_entries is None:
+            return
+        while self._entries > self.max_entries and len(self._dirs) > 1:
+            _, files = self._dirs.popitem(last=False)
+            self._entries -= 1 + len(files or ())
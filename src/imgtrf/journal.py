@@ -0,0 +1,129 @@
+"""Append-only journal of planned and completed transfers
+
+The journal is kept in the destination directory while files are transferred,
+one per source directory so that runs from several sources into the same
+destination do not overwrite each other's journal.
+Every planned transfer is appended before it is started and marked as done once
+it has completed, and the end of indexing is marked as well. An interrupted run
+can then be resumed from the journal instead of indexing the source again.
+
+Lines are flushed as soon as they are written, and a line cut short by a crash
+is ignored when the journal is read. The journal is removed once every planned
+file has been transferred.
+"""
+
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from imgtrf import exceptions
+from imgtrf.jsonl import JsonLinesWriter
+
+log = logging.getLogger(__name__)
+
+JOURNAL_PREFIX = ".imgtrf-journal-"
+
+
+class JournalError(exceptions.ImgtrfError):
+    pass
+
+
+class JournalState(NamedTuple):
+    """What an earlier run planned and did not finish
+
+    Args:
+        pending: Planned transfers that were not completed, in planned order
+        planned: Every planned source path
+        indexed: True if the whole source directory was indexed
+    """
+
+    pending: List[Tuple[Path, Path]]
+    planned: Set[str]
+    indexed: bool
+
+
+def path_for(dest_dir: Path, src_dir: Path) -> Path:
+    """Returns path of the journal of transfers from src_dir to dest_dir"""
+    key = hashlib.sha1(os.fsencode(src_dir.resolve())).hexdigest()[:16]
+    return dest_dir / f"{JOURNAL_PREFIX}{key}.jsonl"
+
+
+class Journal(JsonLinesWriter):
+    """Records planned and completed transfers from one source directory
+
+    Unless `append`, an existing journal is replaced. Can be used from several
+    threads at once.
+    """
+
+    def __init__(self, path: Path, src_dir: Path, append: bool = False):
+        super().__init__(path, append=append)
+        if not append:
+            self.write({"op": "start", "src_dir": os.fspath(src_dir)})
+
+    def plan(
+        self, src_dest_paths: Iterable[Tuple[Path, Path]]
+    ) -> Iterator[Tuple[Path, Path]]:
+        """Records each transfer before yielding it, and the end of indexing"""
+        for src_file_path, dest_path in src_dest_paths:
+            self.write(
+                {
+                    "op": "plan",
+                    "src": os.fspath(src_file_path),
+                    "dest": os.fspath(dest_path),
+                }
+            )
+            yield src_file_path, dest_path
+        self.write({"op": "indexed"})
+
+    def done(self, src_file_path: Path) -> None:
+        """Records that the transfer of a file has completed"""
+        self.write({"op": "done", "src": os.fspath(src_file_path)})
+
+    def remove(self) -> None:
+        """Closes and removes the journal, all planned transfers are done"""
+        self.close()
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def load(path: Path, src_dir: Path) -> Optional[JournalState]:
+    """Reads journal left by an interrupted run, None if there is none
+
+    Raises:
+        JournalError: If the journal was written for another source directory
+    """
+    try:
+        file = open(path, encoding="utf-8")
+    except FileNotFoundError:
+        return None
+
+    plans = {}
+    done = set()
+    indexed = False
+    with file:
+        for number, line in enumerate(file, 1):
+            try:
+                entry = json.loads(line)
+                op = entry["op"]
+                if op == "start" and entry["src_dir"] != os.fspath(src_dir):
+                    raise JournalError(
+                        f"Journal {path} belongs to source {entry['src_dir']}"
+                    )
+                if op == "plan":
+                    plans[entry["src"]] = entry["dest"]
+                elif op == "done":
+                    done.add(entry["src"])
+                elif op == "indexed":
+                    indexed = True
+            except (ValueError, KeyError, TypeError):
+                log.warning(f"Skipping malformed line {number} in {path}")
+
+    pending = [
+        (Path(src), Path(dest)) for src, dest in plans.items() if src not in done
+    ]
+    return JournalState(pending, set(plans), indexed)
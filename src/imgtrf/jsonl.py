@@ -0,0 +1,40 @@
+"""Append-only files of JSON lines, such as the manifest and the journal
+
+Every line is written under a lock and flushed as soon as it is written, so
+lines from several threads never interleave and a crash cuts at most the last
+line short.
+"""
+
+import json
+from pathlib import Path
+import threading
+
+
+class JsonLinesWriter:
+    """Writes one JSON object per line to a file
+
+    The parent directory is created if needed. Unless `append`, an existing
+    file is replaced. Can be used from several threads at once.
+    """
+
+    def __init__(self, path: Path, append: bool = True):
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.path = path
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+    def write(self, entry: dict) -> None:
+        """Appends entry as a line and flushes it"""
+        line = json.dumps(entry) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
@@ -1,12 +1,16 @@
 import functools
+import json
 import logging
+from logging.handlers import QueueHandler, QueueListener
+from pathlib import Path
+import queue
 import sys
 import imgtrf
-import rich
+from rich.console import Console
 from rich.logging import RichHandler
 
 root_logger = logging.getLogger(imgtrf.__name__)
-console = rich.console.Console()
+console = Console()
 rich_handler = RichHandler(console=console)
 
 
@@ -28,18 +32,24 @@ def set_verbosity(verbose: bool = False, debug: bool = False, log=root_logger) -
 
 
 def log_func(log=root_logger):
+    """Logs calls, return values and exceptions of the decorated function
+
+    Nothing is formatted unless debug logging is enabled, so the decorator
+    only costs a level check per call otherwise.
+    """
+
     def wrapper(func):
         @functools.wraps(func)
         def decorator(*args, **kwargs):
-            log.debug(f"{func.__name__} called with: args {args}, kwargs {kwargs}")
-            # print(f"{func.__name__} called with args {args} and kwargs {kwargs}")
+            if not log.isEnabledFor(logging.DEBUG):
+                return func(*args, **kwargs)
+
+            log.debug("%s called with: args %s, kwargs %s", func.__name__, args, kwargs)
             try:
                 value = func(*args, **kwargs)
-                log.debug(f"{func.__name__} returned: {value!r}")
+                log.debug("%s returned: %r", func.__name__, value)
             except:
-                log.debug(
-                    f"{func.__name__} rasied exception: \n{str(sys.exc_info()[1])}"
-                )
+                log.debug("%s rasied exception: \n%s", func.__name__, sys.exc_info()[1])
                 raise
 
             return value
@@ -47,3 +57,78 @@ def log_func(log=root_logger):
         return decorator
 
     return wrapper
+
+
+class JsonFormatter(logging.Formatter):
+    """Formats records as one JSON object per line"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "thread": record.threadName,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry)
+
+
+class _LazyQueueHandler(QueueHandler):
+    """Queues records as they are, leaving all formatting to the listener
+
+    The standard handler formats the message before queuing it, on the thread
+    that logged it. Records never leave the process here, so arguments can be
+    formatted later.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class FileSink:
+    """Writes log records to a file from a background thread
+
+    Records are put on a queue by the logging threads and formatted and written
+    by a listener thread, so workers never wait on the file. Records are
+    written as plain text, or as JSON lines with `json_lines`. Messages shown
+    on the console are unchanged. Call `close()` to flush and close the file.
+    """
+
+    def __init__(
+        self,
+        path: Path,
+        json_lines: bool = False,
+        level=logging.INFO,
+        log=root_logger,
+    ):
+        self._log = log
+        self._file_handler = logging.FileHandler(path, encoding="utf-8")
+        if json_lines:
+            self._file_handler.setFormatter(JsonFormatter())
+        else:
+            self._file_handler.setFormatter(
+                logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s")
+            )
+
+        # Let records through for the file but keep the console as quiet
+        self._levels = (log.level, rich_handler.level)
+        if log.getEffectiveLevel() > level:
+            rich_handler.setLevel(log.getEffectiveLevel())
+            log.setLevel(level)
+
+        records: queue.SimpleQueue = queue.SimpleQueue()
+        self._queue_handler = _LazyQueueHandler(records)
+        self._queue_handler.setLevel(level)
+        self._listener = QueueListener(records, self._file_handler)
+        self._listener.start()
+        log.addHandler(self._queue_handler)
+
+    def close(self) -> None:
+        """Writes queued records and closes the file"""
+        self._log.removeHandler(self._queue_handler)
+        self._log.setLevel(self._levels[0])
+        rich_handler.setLevel(self._levels[1])
+        self._listener.stop()
+        self._file_handler.close()
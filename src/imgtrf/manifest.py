@@ -0,0 +1,90 @@
+"""Record of transferred files
+
+Every transferred file is appended as a line of JSON to a manifest kept in the
+destination directory. Hashes of verified copies are recorded along with size
+and modification time, so later runs can find duplicates among files already in
+the destination without reading them again.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+from typing import Dict, Iterator, NamedTuple
+
+from imgtrf.jsonl import JsonLinesWriter
+from imgtrf.transfer import TransferResult
+
+log = logging.getLogger(__name__)
+
+MANIFEST_NAME = ".imgtrf-manifest.jsonl"
+
+
+class KnownHash(NamedTuple):
+    size: int
+    mtime_ns: int
+    digest: str
+
+
+class Manifest(JsonLinesWriter):
+    """Appends one line per transferred file to a manifest
+
+    Destination paths are stored relative to the directory of the manifest.
+    Every line is flushed as soon as it is written. Can be used from several
+    threads at once.
+    """
+
+    def __init__(self, path: Path):
+        super().__init__(path)
+        self._root = os.fspath(path.parent)
+
+    def record(
+        self, src_file_path: Path, dest_path: Path, result: TransferResult
+    ) -> None:
+        """Appends transferred file to the manifest"""
+        entry = {
+            "src": os.fspath(src_file_path),
+            "dest": os.path.relpath(dest_path, self._root),
+            "size": result.size,
+            "mtime_ns": os.stat(dest_path).st_mtime_ns,
+            "mode": result.mode.value,
+            "hash": result.digest,
+        }
+        self.write(entry)
+
+
+def read(path: Path) -> Iterator[dict]:
+    """Yields entries of manifest, nothing if it does not exist
+
+    Lines that can not be parsed, like one cut short by a crash, are skipped.
+    """
+    try:
+        file = open(path, encoding="utf-8")
+    except FileNotFoundError:
+        return
+
+    with file:
+        for number, line in enumerate(file, 1):
+            try:
+                yield json.loads(line)
+            except ValueError:
+                log.warning(f"Skipping malformed line {number} in {path}")
+
+
+def load_hashes(path: Path) -> Dict[str, KnownHash]:
+    """Returns hashes recorded in manifest keyed on relative destination path
+
+    Later entries replace earlier ones, and a file last transferred without a
+    hash has no entry.
+    """
+    hashes: Dict[str, KnownHash] = {}
+    for entry in read(path):
+        try:
+            dest = os.path.normpath(entry["dest"])
+            if entry.get("hash") is None:
+                hashes.pop(dest, None)
+                continue
+            hashes[dest] = KnownHash(entry["size"], entry["mtime_ns"], entry["hash"])
+        except (KeyError, TypeError):
+            continue
+    return hashes
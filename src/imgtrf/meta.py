@@ -1,65 +1,150 @@
 from pathlib import Path
 from datetime import datetime
+from enum import Enum
 import platform
-
-import ffmpeg
-from PIL import Image
-from PIL.ExifTags import TAGS
-import PIL
+import time
 
 import logging
 from imgtrf.logger import log_func
+from imgtrf import device
 from imgtrf import exceptions
+from imgtrf import exif
+from imgtrf import extractors
+from imgtrf import filename
+from imgtrf import mp4
+from imgtrf import probe
+from imgtrf import stats
+from imgtrf.cache import MetadataCache
 
-from typing import Optional
+from typing import Optional, Sequence, Tuple
 
 log = logging.getLogger(__name__)
 
 
-# Supported formats
-IMAGE_EXT = {"jpg", "jpeg" "png"}
-VIDEO_EXT = {"mp4"}
+# Formats of the built in extractors, see `extractors` for all supported ones
+IMAGE_EXT = extractors.IMAGE.extensions
+VIDEO_EXT = extractors.VIDEO.extensions
+SUPPORTED_EXT = IMAGE_EXT | VIDEO_EXT
+
+
+class TimeSource(str, Enum):
+    """Where the creation time of a file is looked for"""
+
+    # Date and time in the file name, see `filename`
+    NAME = "name"
+    # Image or video metadata, read by the extractor of the file format
+    METADATA = "metadata"
+    # Modification time of the file
+    MTIME = "mtime"
+
+
+def default_time_sources() -> Tuple[TimeSource, ...]:
+    if _is_windows():
+        return (TimeSource.METADATA, TimeSource.MTIME)
+    return (TimeSource.METADATA,)
+
+
+# Platform default if empty
+_time_sources: Tuple[TimeSource, ...] = ()
+
+
+def configure(time_sources: Optional[Sequence[TimeSource]] = None) -> None:
+    """Sets the sources tried, in order, by `get_creation_time`
+
+    The platform default is used if `time_sources` is None or empty.
+    """
+    global _time_sources
+    _time_sources = tuple(time_sources or ())
 
 
-def get_creation_time(path: Path) -> Optional[datetime]:
+def get_creation_time(
+    path: Path, cache: Optional[MetadataCache] = None
+) -> Optional[datetime]:
     """Returns file creation date
 
     --- STRATEGY ---
-    1) Figure out format of file.
-    2) Try to extract creation time metadata from that file
-    3) If no metadata can be gathered try to fallback on win creation time.
-    3) No metadata for file: Skip file and write error log
+    Time sources are tried in the order set by `configure`, until one of them
+    gives a creation time:
+    - name: Date and time in the file name, the file is not opened.
+    - metadata: Cached creation time if the file is unchanged since it was
+      cached, otherwise the metadata of the file.
+    - mtime: Modification time of the file.
+    No source giving a time: Skip file and write error log
 
 
     Args:
         path (Path): Path to file
+        cache (MetadataCache, optional): Cache to consult before reading the file
 
     Returns:
         datetime | None: file creation time
     """
-    creation_time: datetime = None
-
-    if _is_image(path):
-        creation_time = get_image_creation_time(path)
-
-    if _is_video(path):
-        creation_time = get_video_creation_time(path)
-
-    if _is_windows() and creation_time is None:
-        creation_time = get_win_creation_time(path)
+    run_stats = stats.get()
+    for time_source in _time_sources or default_time_sources():
+        if time_source == TimeSource.METADATA and cache is not None:
+            cached = cache.get(path)
+            if cached is not None:
+                run_stats.count("metadata.cache_hits")
+                return cached[0]
+
+        start = time.perf_counter()
+        creation_time, source = _extract_creation_time(path, time_source)
+        if source:
+            run_stats.observe(f"metadata.{source}", time.perf_counter() - start)
+        if creation_time is None:
+            continue
+
+        if time_source == TimeSource.METADATA and cache is not None:
+            cache.put(path, creation_time, source)
+        return creation_time
 
+    run_stats.count("metadata.not_found")
     # TODO: Return None or raise error?
     # if not creation_time:
     #   raise Error()?!
-    return creation_time
+    return None
+
+
+def _extract_creation_time(
+    path: Path, time_source: TimeSource
+) -> Tuple[Optional[datetime], str]:
+    """Returns creation time found by a time source and the name of the source"""
+    if time_source == TimeSource.NAME:
+        return filename.read_creation_time(path.name), "name"
+
+    if time_source == TimeSource.MTIME:
+        try:
+            return get_win_creation_time(path), "mtime"
+        except OSError as e:
+            log.debug("Could not stat %s: %s", path, e)
+            return None, "mtime"
+
+    extractor = extractors.for_path(path)
+    if extractor is None:
+        return None, ""
+    # Reading files of one spinning disk at once makes it seek between them
+    with device.hold(path.parent):
+        return extractor.extract(path), extractor.name
 
 
 @log_func(log)
 def get_image_creation_time(path: Path) -> Optional[datetime]:
-    """Returns creation time if exists in image metadata"""
+    """Returns creation time if exists in image metadata
+
+    Reads only the EXIF header of the file if possible and falls back on Pillow
+    for formats that the header reader does not handle.
+    """
+    try:
+        return exif.read_creation_time(path)
+    except (OSError, exif.ExifError) as e:
+        log.debug("Reading EXIF header of %s failed, using Pillow: %s", path, e)
+        stats.get().count("metadata.pillow_fallbacks")
+
+    from PIL import UnidentifiedImageError
+
     try:
         metadata = get_image_meta(path)
-    except PIL.UnidentifiedImageError as e:
+    except UnidentifiedImageError as e:
         log.error(e)
         return None
 
@@ -70,14 +155,30 @@ def get_image_creation_time(path: Path) -> Optional[datetime]:
         return creation_time
     
     else:
-        log.debug(f"Could not find 'DateTime' in {path}")
+        log.debug("Could not find 'DateTime' in %s", path)
         return None
 
 
 @log_func(log)
 def get_video_creation_time(path: Path) -> Optional[datetime]:
+    """Returns creation time if exists in video metadata
+
+    Reads the MP4/QuickTime container directly if possible and falls back on
+    ffprobe for containers that the reader does not handle.
+    """
     try:
-        metadata = get_video_meta(path)
+        return mp4.read_creation_time(path)
+    except (OSError, mp4.Mp4Error) as e:
+        log.debug("Reading container of %s failed, using ffprobe: %s", path, e)
+        stats.get().count("metadata.ffprobe_fallbacks")
+
+    try:
+        with stats.get().time("metadata.ffprobe"):
+            metadata = get_video_meta(path)
+    except probe.FFprobeNotFoundError as e:
+        # Already reported once by the probe pool
+        log.debug("%s, skipping %s", e, path)
+        return None
     except exceptions.MetaDataError as e:
         log.error(e)
         return None
@@ -107,13 +208,20 @@ def get_win_creation_time(path: Path) -> datetime:
     """Get creation time from windows file
 
     This does not wotk in linux environment since linuc does not store creation time.
+    Used as modification time on all platforms by the mtime time source.
     """
     timestamp = path.stat().st_mtime
     return datetime.fromtimestamp(timestamp)
 
 
 def get_image_meta(path: Path) -> dict:
-    """Get image metadata from file using pillow"""
+    """Get image metadata from file using pillow
+
+    Pillow is imported on first use as most images are read by `exif`.
+    """
+    from PIL import Image
+    from PIL.ExifTags import TAGS
+
     image = Image.open(path)
     exif = {}
     for tag, value in image.getexif().items():
@@ -126,30 +234,12 @@ def get_image_meta(path: Path) -> dict:
 
 
 def get_video_meta(path: Path) -> dict:
-    """Get video metadata from file using ffmpeg"""
-    try:
-        meta = ffmpeg.probe(path)
-    except FileNotFoundError as e:
-        raise exceptions.MetaDataError(  # ToDo: Not really an import error...
-            "Could not use ffmpeg propperly. Make sure its installed correctly and added to path"
-        ) from e
-    except ffmpeg.Error as e:
-        raise exceptions.MetaDataError(
-            f"Could not retrive meta data from file: {path}"
-        ) from e
+    """Get video metadata from file using ffprobe
 
-    return meta
+    Runs through the shared probe pool, see `probe.configure`.
+    """
+    return probe.get_pool().probe(path)
 
 
 def _is_windows() -> bool:
     return platform.system() == "Windows"
-
-
-def _is_image(path: Path) -> bool:
-    ext = path.suffix.lower()[1:]
-    return ext in IMAGE_EXT
-
-
-def _is_video(path: Path) -> bool:
-    ext = path.suffix.lower()[1:]
-    return ext in VIDEO_EXT
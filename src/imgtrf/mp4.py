@@ -0,0 +1,244 @@
+"""Minimal ISO base media file (MP4/MOV) reader for creation time
+
+Boxes are located by reading their headers and seeking past their content, so
+only a handful of small reads are needed even when `moov` is stored after the
+media data. Anything out of the ordinary raises `Mp4Error` so that the caller
+can fall back on ffprobe.
+
+Reference:
+    https://developer.apple.com/documentation/quicktime-file-format
+"""
+
+from datetime import datetime, timedelta
+import os
+from pathlib import Path
+import struct
+from typing import BinaryIO, Dict, Iterator, List, Optional, Tuple
+
+from imgtrf import exceptions
+
+# Timestamps in mvhd are seconds since midnight, January 1, 1904 UTC
+EPOCH = datetime(1904, 1, 1)
+
+CREATION_DATE_KEY = "com.apple.quicktime.creationdate"
+
+# Boxes that may start a valid file
+_FIRST_BOX_TYPES = {b"ftyp", b"moov", b"mdat", b"free", b"skip", b"wide", b"pnot"}
+
+# Boxes holding metadata are small, anything larger is not read into memory
+_MAX_METADATA_SIZE = 1024**2
+
+
+class Mp4Error(exceptions.MetaDataError):
+    """File could not be parsed by this reader"""
+
+    pass
+
+
+def read_creation_time(path: Path) -> Optional[datetime]:
+    """Returns creation time from `moov` box of an MP4 or QuickTime file
+
+    The movie header (`mvhd`) creation time is preferred as it is what ffprobe
+    reports as `creation_time`. QuickTime `creationdate` metadata and the
+    `©day` user data are used if it is unset.
+
+    Raises:
+        Mp4Error: If file could not be parsed
+        OSError: If file could not be read
+
+    Returns:
+        datetime | None: creation time in UTC, None if file has no timestamps
+    """
+    with open(path, "rb") as file:
+        file_size = os.fstat(file.fileno()).st_size
+        moov = _find_moov(file, file_size)
+        try:
+            times = _read_moov(file, *moov)
+        except struct.error as e:
+            raise Mp4Error(f"Truncated metadata in {path}") from e
+
+    for key in ("mvhd", "creationdate", "day"):
+        if times.get(key) is not None:
+            return times[key]
+    return None
+
+
+def _find_moov(file: BinaryIO, file_size: int) -> Tuple[int, int]:
+    first = True
+    for box_type, start, end in _iter_boxes(file, 0, file_size):
+        if first and box_type not in _FIRST_BOX_TYPES:
+            raise Mp4Error(f"Not an ISO base media file, starts with {box_type!r}")
+        first = False
+
+        if box_type == b"moov":
+            return start, end
+
+    raise Mp4Error("No 'moov' box found")
+
+
+def _read_moov(file: BinaryIO, start: int, end: int) -> Dict[str, datetime]:
+    times: Dict[str, datetime] = {}
+    for box_type, child_start, child_end in _iter_boxes(file, start, end):
+        if box_type == b"mvhd":
+            times["mvhd"] = _read_mvhd(_read(file, child_start, child_end))
+        elif box_type == b"udta":
+            _read_udta(file, child_start, child_end, times)
+        elif box_type == b"meta":
+            _read_meta(file, child_start, child_end, times)
+    return times
+
+
+def _read_mvhd(data: bytes) -> Optional[datetime]:
+    if len(data) < 4:
+        raise Mp4Error("Truncated 'mvhd' box")
+
+    version = data[0]
+    if version == 1:
+        fmt = ">Q"
+    elif version == 0:
+        fmt = ">I"
+    else:
+        raise Mp4Error(f"Unsupported 'mvhd' version {version}")
+
+    if len(data) < 4 + struct.calcsize(fmt):
+        raise Mp4Error("Truncated 'mvhd' box")
+    (seconds,) = struct.unpack_from(fmt, data, 4)
+    if seconds == 0:
+        return None
+    try:
+        return EPOCH + timedelta(seconds=seconds)
+    except OverflowError as e:
+        raise Mp4Error(f"Invalid 'mvhd' creation time {seconds}") from e
+
+
+def _read_udta(
+    file: BinaryIO, start: int, end: int, times: Dict[str, datetime]
+) -> None:
+    for box_type, child_start, child_end in _iter_boxes(file, start, end):
+        if box_type == b"\xa9day":
+            data = _read(file, child_start, child_end)
+            if data[4:8] == b"data":
+                # iTunes style, value stored in a 'data' box
+                value = _data_value(data)
+            else:
+                # QuickTime style, 16 bit length and language code
+                (length,) = struct.unpack_from(">H", data, 0)
+                value = data[4 : 4 + length]
+            _set_time(times, "day", _parse_date(value))
+        elif box_type == b"meta":
+            _read_meta(file, child_start, child_end, times)
+
+
+def _read_meta(
+    file: BinaryIO, start: int, end: int, times: Dict[str, datetime]
+) -> None:
+    # ISO 'meta' is a full box with version and flags, QuickTime 'meta' is not
+    header = _read(file, start, min(start + 4, end))
+    if header == b"\x00\x00\x00\x00":
+        start += 4
+
+    keys: List[str] = []
+    items: Dict[int, bytes] = {}
+    for box_type, child_start, child_end in _iter_boxes(file, start, end):
+        if box_type == b"keys":
+            keys = _read_keys(_read(file, child_start, child_end))
+        elif box_type == b"ilst":
+            for item_type, item_start, item_end in _iter_boxes(
+                file, child_start, child_end
+            ):
+                data = _read(file, item_start, item_end)
+                if data[4:8] != b"data":
+                    continue
+                if item_type == b"\xa9day":
+                    _set_time(times, "day", _parse_date(_data_value(data)))
+                else:
+                    (index,) = struct.unpack(">I", item_type)
+                    items[index] = _data_value(data)
+
+    # Keys are referenced by 1-based index from the item list
+    for index, key in enumerate(keys, 1):
+        if key == CREATION_DATE_KEY and index in items:
+            _set_time(times, "creationdate", _parse_date(items[index]))
+
+
+def _read_keys(data: bytes) -> List[str]:
+    if len(data) < 8:
+        raise Mp4Error("Truncated 'keys' box")
+
+    (count,) = struct.unpack_from(">I", data, 4)
+    keys = []
+    position = 8
+    for _ in range(count):
+        if position + 8 > len(data):
+            raise Mp4Error("Truncated 'keys' box")
+        (size,) = struct.unpack_from(">I", data, position)
+        if size < 8:
+            raise Mp4Error("Invalid key size")
+        # Skip size and namespace
+        keys.append(data[position + 8 : position + size].decode("utf-8", "replace"))
+        position += size
+    return keys
+
+
+def _data_value(data: bytes) -> bytes:
+    """Returns value of the 'data' box that `data` starts with
+
+    The box header is followed by data type and locale before the value.
+    """
+    (size,) = struct.unpack_from(">I", data, 0)
+    return data[16:size]
+
+
+def _set_time(times: Dict[str, datetime], key: str, value: Optional[datetime]) -> None:
+    if value is not None and key not in times:
+        times[key] = value
+
+
+def _parse_date(value: bytes) -> Optional[datetime]:
+    # E.g. 2020-01-01T12:00:00+0100, local time is kept and the offset dropped
+    # the same way as for ffprobe output.
+    text = value.decode("utf-8", "replace").strip("\x00 ")
+    try:
+        return datetime.fromisoformat(text[:19])
+    except ValueError:
+        return None
+
+
+def _iter_boxes(
+    file: BinaryIO, start: int, end: int
+) -> Iterator[Tuple[bytes, int, int]]:
+    """Yields type, content start and content end of boxes between offsets"""
+    position = start
+    while position + 8 <= end:
+        file.seek(position)
+        header = file.read(8)
+        if len(header) < 8:
+            raise Mp4Error("Truncated box header")
+
+        size, box_type = struct.unpack(">I4s", header)
+        header_size = 8
+        if size == 1:
+            large_size = file.read(8)
+            if len(large_size) < 8:
+                raise Mp4Error("Truncated box header")
+            (size,) = struct.unpack(">Q", large_size)
+            header_size = 16
+        elif size == 0:
+            # Box extends to end of enclosing box
+            size = end - position
+
+        if size < header_size or position + size > end:
+            raise Mp4Error(f"Invalid size of box {box_type!r} at offset {position}")
+
+        yield box_type, position + header_size, position + size
+        position += size
+
+
+def _read(file: BinaryIO, start: int, end: int) -> bytes:
+    if end - start > _MAX_METADATA_SIZE:
+        raise Mp4Error("Metadata box too large")
+    file.seek(start)
+    data = file.read(end - start)
+    if len(data) < end - start:
+        raise Mp4Error("Truncated box")
+    return data
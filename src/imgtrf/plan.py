@@ -0,0 +1,281 @@
+"""Transfer plans written before anything is transferred
+
+A plan holds every transfer that indexing a source directory decided on, one
+line of JSON per file with source, destination, size and creation time, after
+a header with the directories and format it was made from. Paths are stored
+relative to those directories, so a plan can be applied where the same storage
+is mounted somewhere else.
+
+A plan can be reviewed before it is applied, and applied in shards by several
+processes or hosts at once without indexing the source again.
+
+In memory, planned transfers are kept in a `PlanTable`, which stores paths as
+an index into a table of directories plus a file name.
+"""
+
+from array import array
+from datetime import datetime, timedelta
+import heapq
+import json
+import os
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from imgtrf import exceptions
+
+VERSION = 1
+
+
+class PlanError(exceptions.ImgtrfError):
+    pass
+
+
+class PlannedTransfer(NamedTuple):
+    src: Path
+    dest: Path
+    size: Optional[int]
+    created: Optional[datetime]
+
+
+# Creation times are stored as microseconds since this date
+_EPOCH = datetime(1970, 1, 1)
+_MICROSECOND = timedelta(microseconds=1)
+# Stored for unknown sizes and creation times
+_UNKNOWN = -(2**63)
+
+
+class PlanTable:
+    """Compact list of planned transfers
+
+    Millions of transfers share a few thousand directories, so each directory
+    is stored once and every path as the index of its directory and its name.
+    A destination usually has the same name as its source, in which case the
+    name is stored once as well. Sizes and creation times are kept in arrays.
+    Creation times are stored as wall clock time, without time zone.
+
+    Iterating yields `(src, dest)` pairs, like the lists of pairs used by the
+    transfer loop, while `transfers()` yields every `PlannedTransfer`.
+    """
+
+    __slots__ = (
+        "_dir_paths",
+        "_dir_indexes",
+        "_src_dirs",
+        "_src_names",
+        "_dest_dirs",
+        "_dest_names",
+        "_sizes",
+        "_created",
+    )
+
+    def __init__(self, transfers: Iterable[PlannedTransfer] = ()):
+        self._dir_paths: List[Path] = []
+        self._dir_indexes: Dict[str, int] = {}
+        self._src_dirs = array("I")
+        self._src_names: List[str] = []
+        self._dest_dirs = array("I")
+        self._dest_names: List[str] = []
+        self._sizes = array("q")
+        self._created = array("q")
+        for planned in transfers:
+            self.add(*planned)
+
+    def add(
+        self,
+        src: Path,
+        dest: Path,
+        size: Optional[int] = None,
+        created: Optional[datetime] = None,
+    ) -> None:
+        src_name = src.name
+        dest_name = dest.name
+        self._src_dirs.append(self._dir_index(src.parent))
+        self._src_names.append(src_name)
+        self._dest_dirs.append(self._dir_index(dest.parent))
+        self._dest_names.append(src_name if dest_name == src_name else dest_name)
+        self._sizes.append(_UNKNOWN if size is None else size)
+        if created is None:
+            self._created.append(_UNKNOWN)
+        else:
+            self._created.append(
+                (created.replace(tzinfo=None) - _EPOCH) // _MICROSECOND
+            )
+
+    def extend(self, src_dest_paths: Iterable[Tuple[Path, Path]]) -> None:
+        """Adds transfers of unknown size and creation time"""
+        for src, dest in src_dest_paths:
+            self.add(src, dest)
+
+    def __len__(self) -> int:
+        return len(self._src_names)
+
+    def __iter__(self) -> Iterator[Tuple[Path, Path]]:
+        dir_paths = self._dir_paths
+        for src_dir, src_name, dest_dir, dest_name in zip(
+            self._src_dirs, self._src_names, self._dest_dirs, self._dest_names
+        ):
+            yield dir_paths[src_dir] / src_name, dir_paths[dest_dir] / dest_name
+
+    def transfers(self) -> Iterator[PlannedTransfer]:
+        for (src, dest), size, created in zip(self, self._sizes, self._created):
+            yield PlannedTransfer(
+                src,
+                dest,
+                None if size == _UNKNOWN else size,
+                None if created == _UNKNOWN else _EPOCH + created * _MICROSECOND,
+            )
+
+    def relocate(self, moves: Dict[Path, Path]) -> None:
+        """Moves paths below each key of `moves` to the same place below its value
+
+        The deepest matching key is used for every path. Only the table of
+        directories is changed, not the transfers.
+        """
+        deepest_first = sorted(moves, key=lambda old: len(old.parts), reverse=True)
+        for index, directory in enumerate(self._dir_paths):
+            for old_dir in deepest_first:
+                try:
+                    relative = directory.relative_to(old_dir)
+                except ValueError:
+                    continue
+                self._dir_paths[index] = moves[old_dir] / relative
+                break
+        self._dir_indexes = {
+            os.fspath(directory): index
+            for index, directory in enumerate(self._dir_paths)
+        }
+
+    def _dir_index(self, directory: Path) -> int:
+        key = os.fspath(directory)
+        index = self._dir_indexes.get(key)
+        if index is None:
+            index = self._dir_indexes[key] = len(self._dir_paths)
+            self._dir_paths.append(directory)
+        return index
+
+
+class Plan(NamedTuple):
+    src_dir: Path
+    dest_dir: Path
+    dir_format: str
+    transfers: PlanTable
+
+
+def write(
+    path: Path,
+    transfers: Iterable[PlannedTransfer],
+    src_dir: Path,
+    dest_dir: Path,
+    dir_format: str,
+) -> int:
+    """Writes plan and returns number of planned transfers
+
+    The plan is written to a temporary file that replaces `path` once complete,
+    so an interrupted run never leaves a plan that looks finished.
+    """
+    header = {
+        "version": VERSION,
+        "src_dir": os.fspath(src_dir),
+        "dest_dir": os.fspath(dest_dir),
+        "dir_format": dir_format,
+    }
+    temp_path = path.with_name(f".{path.name}.part")
+    count = 0
+    try:
+        with open(temp_path, "w", encoding="utf-8") as file:
+            file.write(json.dumps(header) + "\n")
+            for planned in transfers:
+                entry = {
+                    "src": os.path.relpath(planned.src, src_dir),
+                    "dest": os.path.relpath(planned.dest, dest_dir),
+                    "size": planned.size,
+                    "created": planned.created.isoformat(),
+                }
+                file.write(json.dumps(entry) + "\n")
+                count += 1
+        os.replace(temp_path, path)
+    except BaseException:
+        temp_path.unlink(missing_ok=True)
+        raise
+    return count
+
+
+def read(path: Path) -> Plan:
+    """Reads plan written by `write`
+
+    Raises:
+        PlanError: If the plan is missing or any line of it can not be parsed
+    """
+    try:
+        file = open(path, encoding="utf-8")
+    except OSError as e:
+        raise PlanError(f"Could not open plan {path}: {e}")
+
+    with file:
+        try:
+            header = json.loads(file.readline())
+            if header.get("version") != VERSION:
+                raise PlanError(f"Unsupported plan version in {path}")
+            src_dir = Path(header["src_dir"])
+            dest_dir = Path(header["dest_dir"])
+            dir_format = header["dir_format"]
+        except (ValueError, KeyError, TypeError, AttributeError):
+            raise PlanError(f"{path} is not a plan")
+
+        transfers = PlanTable()
+        for number, line in enumerate(file, 2):
+            try:
+                entry = json.loads(line)
+                transfers.add(
+                    src_dir / entry["src"],
+                    dest_dir / entry["dest"],
+                    int(entry["size"]),
+                    datetime.fromisoformat(entry["created"]),
+                )
+            except (ValueError, KeyError, TypeError):
+                raise PlanError(f"Malformed line {number} in {path}")
+
+    return Plan(src_dir, dest_dir, dir_format, transfers)
+
+
+def relocate(plan: Plan, src_dir: Path, dest_dir: Path) -> Plan:
+    """Returns plan with its paths moved to other source and destination dirs
+
+    The transfers of `plan` are changed in place.
+    """
+    plan.transfers.relocate({plan.src_dir: src_dir, plan.dest_dir: dest_dir})
+    return Plan(src_dir, dest_dir, plan.dir_format, plan.transfers)
+
+
+def parse_shard(text: str) -> Tuple[int, int]:
+    """Parses a shard given as "i/N", with i counted from 1
+
+    Raises:
+        ValueError: If text is not a valid shard
+    """
+    index, _, count = text.partition("/")
+    try:
+        shard = int(index), int(count)
+    except ValueError:
+        raise ValueError(f"Shard '{text}' is not on the form i/N")
+    if not 1 <= shard[0] <= shard[1]:
+        raise ValueError(f"Shard '{text}' does not have 1 <= i <= N")
+    return shard
+
+
+def shard(transfers: PlanTable, index: int, count: int) -> PlanTable:
+    """Returns the transfers of shard `index` of `count`, counted from 1
+
+    Transfers are dealt out in plan order, each to the shard with the fewest
+    bytes so far, so shards get about the same amount of data. The split only
+    depends on the plan, so every process applying it agrees on it.
+    """
+    # Bytes and index of every shard, ties go to the lowest index
+    totals = [(0, number) for number in range(1, count + 1)]
+    selected = PlanTable()
+    for planned in transfers.transfers():
+        size, number = heapq.heappop(totals)
+        if number == index:
+            selected.add(*planned)
+        heapq.heappush(totals, (size + (planned.size or 0), number))
+    return selected
@@ -0,0 +1,116 @@
+"""Bounded pool of ffprobe processes
+
+ffprobe only accepts a single input per invocation, so the pool instead limits
+how many processes run at the same time and how long each may take. Whether
+ffprobe is installed is checked once per pool rather than once per file.
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+import shutil
+import subprocess
+import threading
+from typing import Optional
+
+from imgtrf import exceptions
+
+log = logging.getLogger(__name__)
+
+DEFAULT_MAX_WORKERS = os.cpu_count() or 1
+DEFAULT_TIMEOUT = 30.0
+
+
+class FFprobeNotFoundError(exceptions.MetaDataError):
+    pass
+
+
+class ProbePool:
+    """Runs ffprobe with at most `max_workers` processes at the same time
+
+    Args:
+        max_workers (int): Maximum number of concurrent ffprobe processes
+        timeout (float): Seconds before a single ffprobe process is killed
+        cmd (str): ffprobe executable
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_MAX_WORKERS,
+        timeout: float = DEFAULT_TIMEOUT,
+        cmd: str = "ffprobe",
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.cmd = cmd
+        self._slots = threading.BoundedSemaphore(max_workers)
+        self._lock = threading.Lock()
+        self._executable: Optional[str] = None
+        self._checked = False
+
+    @property
+    def available(self) -> bool:
+        """True if ffprobe could be found, only looked up on first access"""
+        with self._lock:
+            if not self._checked:
+                self._executable = shutil.which(self.cmd)
+                self._checked = True
+                if self._executable is None:
+                    log.warning(
+                        "Could not find ffprobe, creation time will only be read "
+                        "from MP4 and MOV videos. Make sure FFmpeg is installed "
+                        "correctly and added to path"
+                    )
+        return self._executable is not None
+
+    def probe(self, path: Path) -> dict:
+        """Returns ffprobe format and stream information of file
+
+        Raises:
+            FFprobeNotFoundError: If ffprobe is not installed
+            MetaDataError: If ffprobe failed or timed out
+        """
+        if not self.available:
+            raise FFprobeNotFoundError("Could not find ffprobe")
+
+        args = [self._executable, "-show_format", "-show_streams", "-of", "json"]
+        args.append(str(path))
+
+        with self._slots:
+            try:
+                result = subprocess.run(
+                    args, capture_output=True, timeout=self.timeout, check=True
+                )
+            except subprocess.TimeoutExpired as e:
+                raise exceptions.MetaDataError(
+                    f"ffprobe timed out after {self.timeout} s on file: {path}"
+                ) from e
+            except (subprocess.CalledProcessError, OSError) as e:
+                raise exceptions.MetaDataError(
+                    f"Could not retrive meta data from file: {path}"
+                ) from e
+
+        try:
+            return json.loads(result.stdout.decode("utf-8"))
+        except ValueError as e:
+            raise exceptions.MetaDataError(
+                f"Could not parse ffprobe output for file: {path}"
+            ) from e
+
+
+_pool = ProbePool()
+
+
+def get_pool() -> ProbePool:
+    """Returns the pool used for metadata extraction"""
+    return _pool
+
+
+def configure(
+    max_workers: int = DEFAULT_MAX_WORKERS, timeout: float = DEFAULT_TIMEOUT
+) -> ProbePool:
+    """Replaces the pool used for metadata extraction"""
+    global _pool
+    _pool = ProbePool(max_workers=max_workers, timeout=timeout)
+    return _pool
@@ -0,0 +1,129 @@
+"""Counters and timers for the stages of a run
+
+Stages record into a process wide `Stats` instance returned by `get()`. Counts
+are plain totals, like number of skipped files or transferred bytes, while
+timings keep a histogram of how long each operation took. All of it can be
+printed as a table or written as JSON at the end of a run.
+"""
+
+import bisect
+import contextlib
+import json
+from pathlib import Path
+import threading
+import time
+from typing import Dict, Iterator, List, Optional
+
+from rich.table import Table
+
+# Upper bounds in seconds of the latency histogram buckets
+BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+
+
+class Timing:
+    """Latency histogram of one kind of operation"""
+
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        # One bucket per bound and a last one for anything slower
+        self.buckets = [0] * (len(BUCKETS) + 1)
+
+    def add(self, seconds: float) -> None:
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+        self.buckets[bisect.bisect_left(BUCKETS, seconds)] += 1
+
+    def to_dict(self) -> dict:
+        bounds: List[Optional[float]] = [*BUCKETS, None]
+        return {
+            "count": self.count,
+            "total": self.total,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "histogram": [
+                {"le": bound, "count": count}
+                for bound, count in zip(bounds, self.buckets)
+            ],
+        }
+
+
+class Stats:
+    """Named counts and timings, can be used from several threads at once"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.counts: Dict[str, int] = {}
+        self.timings: Dict[str, Timing] = {}
+        self._lock = threading.Lock()
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + value
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = Timing()
+            timing.add(seconds)
+
+    @contextlib.contextmanager
+    def time(self, name: str) -> Iterator[None]:
+        """Records how long the block took, also if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                "elapsed": time.perf_counter() - self.started,
+                "counts": dict(sorted(self.counts.items())),
+                "timings": {
+                    name: timing.to_dict()
+                    for name, timing in sorted(self.timings.items())
+                },
+            }
+
+    def write(self, path: Path) -> None:
+        """Writes counts and timings as JSON"""
+        path.write_text(json.dumps(self.to_dict(), indent=2), encoding="utf-8")
+
+    def table(self) -> Table:
+        """Returns summary of counts and timings for printing"""
+        data = self.to_dict()
+        table = Table("Stage", "Count", "Total s", "Mean ms", "Max ms")
+        table.title = f"Run statistics, {data['elapsed']:.2f} s"
+        for name, timing in data["timings"].items():
+            table.add_row(
+                name,
+                str(timing["count"]),
+                f"{timing['total']:.3f}",
+                f"{timing['mean'] * 1000:.2f}",
+                f"{timing['max'] * 1000:.2f}",
+            )
+        for name, value in data["counts"].items():
+            table.add_row(name, str(value), "", "", "")
+        return table
+
+
+_stats = Stats()
+
+
+def get() -> Stats:
+    """Returns the statistics of the current run"""
+    return _stats
+
+
+def reset() -> Stats:
+    """Starts collecting statistics for a new run"""
+    global _stats
+    _stats = Stats()
+    return _stats
@@ -0,0 +1,152 @@
+"""Compiled destination directory formats
+
+A `dir_format` is parsed once into a `PathTemplate`. Loosely formatted strings,
+where every letter may be a format code, are translated into a single strftime
+pattern up front. Formatted directories are memoized on the part of the date
+the format actually uses, so files from the same day share one `Path`.
+
+Besides strftime codes a format may contain tokens in braces, which are filled
+in from the file being transferred:
+
+    {ext}   Lower case file extension without leading dot, e.g. jpg
+    {media} "image" or "video"
+"""
+
+from datetime import datetime
+import functools
+from pathlib import Path
+import re
+from typing import Callable, Dict, Hashable, List, Optional, Tuple
+
+from imgtrf import extractors
+
+# Memoized directories are dropped when there are more than this many
+MAX_MEMOIZED = 65536
+
+_TOKEN = re.compile(r"\{(\w+)\}")
+_DIRECTIVE = re.compile(r"%[-_0^#]?(.)")
+
+# Format codes that only depend on the date, or on the date and hour or minute
+_DATE_CODES = set("aAbBCdDeFgGhjmuUVwWxyY%")
+_HOUR_CODES = _DATE_CODES | set("HIklpP")
+_MINUTE_CODES = _HOUR_CODES | set("MR")
+
+# Date used to find out which letters strftime accepts as format codes
+_PROBE = datetime(2000, 1, 1)
+
+
+def _extension(path: Path) -> str:
+    return path.suffix[1:].lower()
+
+
+def _media(path: Path) -> str:
+    extractor = extractors.get(_extension(path))
+    return extractor.media if extractor is not None else "other"
+
+
+TOKENS: Dict[str, Callable[[Path], str]] = {
+    "ext": _extension,
+    "media": _media,
+}
+
+
+class PathTemplate:
+    """Formats relative destination directories from a `dir_format`
+
+    Raises:
+        ValueError: If the format contains an unknown token
+    """
+
+    def __init__(self, dir_format: str):
+        self.dir_format = dir_format
+        # Each part is either a strftime pattern or the name of a token
+        self._parts: List[Tuple[bool, str]] = []
+        loose = "%" not in dir_format
+        position = 0
+        for match in _TOKEN.finditer(dir_format):
+            name = match.group(1)
+            if name not in TOKENS:
+                raise ValueError(f"Unknown token '{{{name}}}' in '{dir_format}'")
+            self._add_pattern(dir_format[position : match.start()], loose)
+            self._parts.append((True, name))
+            position = match.end()
+        self._add_pattern(dir_format[position:], loose)
+
+        self.tokens = [text for is_token, text in self._parts if is_token]
+        self._truncate = _truncation(
+            "".join(text for is_token, text in self._parts if not is_token)
+        )
+        self._memo: Dict[Hashable, Path] = {}
+
+    def format(self, date_time: datetime, path: Optional[Path] = None) -> Path:
+        """Returns relative directory for a file created at `date_time`
+
+        Raises:
+            ValueError: If the format has tokens and `path` is not given
+        """
+        values: Tuple[str, ...] = ()
+        if self.tokens:
+            if path is None:
+                raise ValueError(f"'{self.dir_format}' needs a file to format")
+            values = tuple(TOKENS[name](path) for name in self.tokens)
+
+        key = (self._truncate(date_time), values)
+        directory = self._memo.get(key)
+        if directory is None:
+            if len(self._memo) >= MAX_MEMOIZED:
+                self._memo.clear()
+            directory = self._memo[key] = self._render(date_time, values)
+        return directory
+
+    def _render(self, date_time: datetime, values: Tuple[str, ...]) -> Path:
+        tokens = iter(values)
+        text = "".join(
+            next(tokens) if is_token else date_time.strftime(text)
+            for is_token, text in self._parts
+        )
+        return Path(text)
+
+    def _add_pattern(self, text: str, loose: bool) -> None:
+        if text:
+            self._parts.append((False, _loose_to_strftime(text) if loose else text))
+
+
+@functools.lru_cache(maxsize=32)
+def compile_template(dir_format: str) -> PathTemplate:
+    """Returns compiled template, compiled only once per format"""
+    return PathTemplate(dir_format)
+
+
+def _loose_to_strftime(text: str) -> str:
+    """Translates a format where every letter may be a format code
+
+    Letters that strftime does not accept on this platform are kept as is.
+    """
+    pattern = ""
+    for char in text:
+        if char.isascii() and char.isalpha() and _is_format_code(char):
+            pattern += f"%{char}"
+        else:
+            pattern += char
+    return pattern
+
+
+@functools.lru_cache(maxsize=None)
+def _is_format_code(char: str) -> bool:
+    try:
+        _PROBE.strftime(f"%{char}")
+    except ValueError:
+        return False
+    return True
+
+
+def _truncation(pattern: str) -> Callable[[datetime], Hashable]:
+    """Returns function keeping only the part of a date used by pattern"""
+    codes = set(_DIRECTIVE.findall(pattern))
+    if codes <= _DATE_CODES:
+        return lambda date_time: date_time.date()
+    if codes <= _HOUR_CODES:
+        return lambda date_time: date_time.replace(minute=0, second=0, microsecond=0)
+    if codes <= _MINUTE_CODES:
+        return lambda date_time: date_time.replace(second=0, microsecond=0)
+    return lambda date_time: date_time
@@ -0,0 +1,431 @@
+"""Transfer of single files between directories
+
+When source and destination are on the same file system a file can often be
+transferred without copying any data, by renaming, hard linking or cloning it.
+The mode is only a preference: it is applied per file when both paths are on
+the same device and falls back on a real copy otherwise.
+
+Real copies are made in the kernel with `copy_file_range` or `sendfile` where
+available, and with a large reusable buffer otherwise. When written data is
+flushed to disk is decided by a `Durability` policy.
+
+Copied and cloned data is written to a temporary file next to the destination
+that is renamed into place once complete, so an interrupted transfer never
+leaves a partial file under the destination name. Unless the policy leaves
+flushing to the operating system, copied data is flushed before the rename as
+well, so neither does a power loss.
+
+A verified copy hashes the data on the same read that feeds the write, and reads
+the temporary file back and compares the two before it is renamed into place.
+"""
+
+import contextlib
+import errno
+from enum import Enum
+import logging
+import os
+from pathlib import Path
+import shutil
+import sys
+import threading
+from typing import Dict, Iterator, NamedTuple, Optional, Set, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+from imgtrf import device
+from imgtrf import exceptions
+from imgtrf.dedup import hash_file, new_hash
+
+log = logging.getLogger(__name__)
+
+DEFAULT_BUFFER_SIZE = 8 * 1024**2
+DEFAULT_SYNC_INTERVAL = 256 * 1024**2
+TEMP_SUFFIX = ".imgtrf-part"
+
+# ioctl request to share data blocks of one file with another, linux/fs.h
+FICLONE = 0x40049409
+
+# Errors meaning that the file system can not link or clone the file. A link
+# can not replace an existing file either, copying does.
+_UNSUPPORTED_ERRNOS = {
+    errno.EEXIST,
+    errno.EXDEV,
+    errno.EPERM,
+    errno.EMLINK,
+    errno.EINVAL,
+    errno.ENOTTY,
+    errno.EOPNOTSUPP,
+    errno.ENOSYS,
+}
+
+
+# Errors meaning that a kernel copy function can not be used for these files
+_KERNEL_COPY_ERRNOS = {
+    errno.EXDEV,
+    errno.EINVAL,
+    errno.ENOSYS,
+    errno.EOPNOTSUPP,
+    errno.EBADF,
+}
+
+
+class VerificationError(exceptions.ImgtrfError, OSError):
+    """Destination content does not match the source"""
+
+
+class Mode(str, Enum):
+    """How a file is transferred when source and destination share a device"""
+
+    COPY = "copy"
+    RENAME = "rename"
+    HARDLINK = "hardlink"
+    REFLINK = "reflink"
+
+
+class Sync(str, Enum):
+    """When copied files are flushed to disk
+
+    NONE leaves it to the operating system. Otherwise the data of every copied
+    file is synced before it is renamed into place. FILE then syncs its
+    directory right away, so the file is on disk once transferred, while BATCH
+    syncs the directories of written files together every `sync_interval`
+    bytes and at the end of a run.
+    """
+
+    NONE = "none"
+    FILE = "file"
+    BATCH = "batch"
+
+
+class TransferResult(NamedTuple):
+    """Outcome of transferring a single file
+
+    `digest` is the hash of the copied content, only set for verified copies.
+    """
+
+    mode: Mode
+    size: int
+    digest: Optional[str] = None
+
+
+class Durability:
+    """Keeps track of directories with entries that are not yet flushed to disk
+
+    The data of a written file is synced with `sync_data` before the file is
+    renamed into place, what is left is the directory entry. Directories are
+    synced once per flush no matter how many files were written to them. Can
+    be used from several threads at once.
+    """
+
+    def __init__(self, policy: Sync = Sync.NONE, interval=DEFAULT_SYNC_INTERVAL):
+        self.policy = policy
+        self.interval = interval
+        self._dirs: Set[str] = set()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def sync_data(self, path: Path) -> None:
+        """Syncs data of a file that is yet to be renamed into place"""
+        if self.policy != Sync.NONE:
+            _fsync(os.fspath(path))
+
+    def add_file(self, path: Path, size: int, sync_now: bool = False) -> None:
+        """Registers file renamed into place, syncs its directory if `sync_now`"""
+        if self.policy == Sync.NONE:
+            return
+
+        if sync_now or self.policy == Sync.FILE:
+            _fsync_dir(os.fspath(path.parent))
+            return
+
+        with self._lock:
+            self._dirs.add(os.fspath(path.parent))
+            self._bytes += size
+            flush = self._bytes >= self.interval
+        if flush:
+            self.flush()
+
+    def add_link(self, path: Path, sync_now: bool = False) -> None:
+        """Registers a renamed or linked file, syncs its directory if `sync_now`"""
+        if self.policy == Sync.NONE:
+            return
+        if sync_now:
+            _fsync_dir(os.fspath(path.parent))
+            return
+        with self._lock:
+            self._dirs.add(os.fspath(path.parent))
+
+    def flush(self) -> None:
+        """Syncs the directories of all files registered since the last flush"""
+        with self._lock:
+            dirs, self._dirs = self._dirs, set()
+            self._bytes = 0
+
+        for path in dirs:
+            _fsync_dir(path)
+
+
+def copy_file(
+    src_file_path: Path,
+    dest_path: Path,
+    mode: Mode = Mode.COPY,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    durability: Optional[Durability] = None,
+    verify: bool = False,
+) -> TransferResult:
+    """Copies file, returns the mode that was actually used and the size
+
+    With `verify`, copied data is hashed and compared with the destination.
+
+    Raises:
+        ValueError: If mode is `Mode.RENAME`, which would remove the source
+        VerificationError: If the copied data does not match the source, the
+            destination is left untouched
+    """
+    if mode == Mode.RENAME:
+        raise ValueError("Files can not be renamed when copying")
+    return _transfer(
+        src_file_path,
+        dest_path,
+        mode,
+        remove_source=False,
+        buffer_size=buffer_size,
+        durability=durability or _NO_DURABILITY,
+        verify=verify,
+    )
+
+
+def move_file(
+    src_file_path: Path,
+    dest_path: Path,
+    mode: Mode = Mode.RENAME,
+    buffer_size: int = DEFAULT_BUFFER_SIZE,
+    durability: Optional[Durability] = None,
+    verify: bool = False,
+) -> TransferResult:
+    """Moves file, returns the mode that was actually used and the size
+
+    Unless durability policy is `Sync.NONE`, a copied or linked file and its
+    directory are synced before its source is removed. With `verify` the source
+    is only removed once the copied data has been read back and found identical.
+
+    Raises:
+        VerificationError: If the copied data does not match the source, the
+            destination is left untouched and the source kept
+    """
+    return _transfer(
+        src_file_path,
+        dest_path,
+        mode,
+        remove_source=True,
+        buffer_size=buffer_size,
+        durability=durability or _NO_DURABILITY,
+        verify=verify,
+    )
+
+
+def _transfer(
+    src_file_path: Path,
+    dest_path: Path,
+    mode: Mode,
+    remove_source: bool,
+    buffer_size: int,
+    durability: Durability,
+    verify: bool = False,
+) -> TransferResult:
+    if mode != Mode.COPY and not same_device(src_file_path, dest_path.parent):
+        log.debug("%s and %s on different devices, copying", src_file_path, dest_path)
+        mode = Mode.COPY
+
+    if mode != Mode.COPY:
+        try:
+            _ZERO_COPY[mode](src_file_path, dest_path)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+            log.debug("%s not supported for %s, copying: %s", mode.value, dest_path, e)
+            mode = Mode.COPY
+        else:
+            # A rename moves the source, a link leaves it to be removed below
+            durability.add_link(
+                dest_path, sync_now=remove_source and mode != Mode.RENAME
+            )
+
+    digest = None
+    if mode == Mode.COPY:
+        size, digest = _copy(src_file_path, dest_path, buffer_size, verify, durability)
+        durability.add_file(dest_path, size, sync_now=remove_source)
+    else:
+        size = os.stat(dest_path).st_size
+
+    if remove_source and mode != Mode.RENAME:
+        os.remove(src_file_path)
+    return TransferResult(mode, size, digest)
+
+
+def _copy(
+    src_file_path: Path,
+    dest_path: Path,
+    buffer_size: int,
+    verify: bool = False,
+    durability: Optional[Durability] = None,
+) -> Tuple[int, Optional[str]]:
+    """Copies data and metadata like `shutil.copy2`
+
+    Returns number of bytes and, if `verify`, the hash of the copied data. The
+    data is synced according to `durability` before it is renamed into place.
+    """
+    digest = new_hash() if verify else None
+    with _atomic_write(dest_path) as temp_path:
+        with open(src_file_path, "rb") as src, open(temp_path, "wb") as dest:
+            size = copy_data(src, dest, buffer_size, digest=digest)
+        shutil.copystat(src_file_path, temp_path)
+        (durability or _NO_DURABILITY).sync_data(temp_path)
+        if digest is not None:
+            _verify(temp_path, dest_path, digest.hexdigest())
+
+    if digest is None:
+        return size, None
+    return size, digest.hexdigest()
+
+
+def _verify(temp_path: Path, dest_path: Path, digest: str) -> None:
+    """Reads back written data, raises if its hash differs from `digest`"""
+    if hash_file(temp_path) != digest:
+        raise VerificationError(f"Content of {dest_path} does not match its source")
+
+
+def temp_path_for(dest_path: Path) -> Path:
+    """Returns the temporary path a file is written to before it is renamed"""
+    return dest_path.with_name(f".{dest_path.name}{TEMP_SUFFIX}")
+
+
+@contextlib.contextmanager
+def _atomic_write(dest_path: Path) -> Iterator[Path]:
+    """Yields temporary path that replaces `dest_path` when the block succeeds
+
+    The temporary file is removed if the block fails.
+    """
+    temp_path = temp_path_for(dest_path)
+    try:
+        yield temp_path
+        os.replace(temp_path, dest_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+def copy_data(src, dest, buffer_size: int = DEFAULT_BUFFER_SIZE, digest=None) -> int:
+    """Copies all data between open binary files, returns number of bytes
+
+    Tries `os.copy_file_range` and `os.sendfile` before falling back on reading
+    and writing through a buffer of `buffer_size` bytes. If a hash object is
+    given as `digest`, data is always copied through the buffer and the hash is
+    updated with every chunk read. Every chunk counts towards the rate set by
+    `device.configure`.
+    """
+    src_fd = src.fileno()
+    dest_fd = dest.fileno()
+
+    # Data copied in the kernel never passes through here to be hashed
+    kernel_copies = _KERNEL_COPY if digest is None else ()
+    for kernel_copy in kernel_copies:
+        size = 0
+        try:
+            while True:
+                sent = kernel_copy(src_fd, dest_fd, size, buffer_size)
+                if sent == 0:
+                    return size
+                size += sent
+                device.throttle(sent)
+        except OSError as e:
+            # Only fall back if nothing has been written yet
+            if size or e.errno not in _KERNEL_COPY_ERRNOS:
+                raise
+
+    size = 0
+    buffer = bytearray(buffer_size)
+    view = memoryview(buffer)
+    while True:
+        read = src.readinto(buffer)
+        if not read:
+            return size
+        chunk = view[:read]
+        if digest is not None:
+            digest.update(chunk)
+        dest.write(chunk)
+        size += read
+        device.throttle(read)
+
+
+def _copy_file_range(src_fd: int, dest_fd: int, offset: int, count: int) -> int:
+    return os.copy_file_range(src_fd, dest_fd, count, offset, offset)
+
+
+def _sendfile(src_fd: int, dest_fd: int, offset: int, count: int) -> int:
+    os.lseek(dest_fd, offset, os.SEEK_SET)
+    return os.sendfile(dest_fd, src_fd, offset, count)
+
+
+_KERNEL_COPY = []
+if hasattr(os, "copy_file_range"):
+    _KERNEL_COPY.append(_copy_file_range)
+if sys.platform.startswith("linux") and hasattr(os, "sendfile"):
+    # Only Linux supports sendfile to a regular file
+    _KERNEL_COPY.append(_sendfile)
+
+
+def _fsync(path: str) -> None:
+    # Windows requires write access to flush a file
+    flags = os.O_RDWR if sys.platform == "win32" else os.O_RDONLY
+    fd = os.open(path, flags)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _fsync_dir(path: str) -> None:
+    if sys.platform == "win32":
+        # Directories can not be opened for syncing on Windows
+        return
+    _fsync(path)
+
+
+_NO_DURABILITY = Durability(Sync.NONE)
+
+
+def same_device(src_file_path: Path, dest_dir: Path) -> bool:
+    """True if file and directory are on the same device"""
+    return os.stat(src_file_path).st_dev == device.device_of(os.fspath(dest_dir))
+
+
+def _rename(src_file_path: Path, dest_path: Path) -> None:
+    os.replace(src_file_path, dest_path)
+
+
+def _hardlink(src_file_path: Path, dest_path: Path) -> None:
+    os.link(src_file_path, dest_path)
+
+
+def _reflink(src_file_path: Path, dest_path: Path) -> None:
+    if fcntl is None:
+        raise OSError(errno.ENOSYS, "Reflinks not supported on this platform")
+
+    with _atomic_write(dest_path) as temp_path:
+        with open(src_file_path, "rb") as src, open(temp_path, "wb") as dest:
+            fcntl.ioctl(dest.fileno(), FICLONE, src.fileno())
+        shutil.copystat(src_file_path, temp_path)
+
+
+_ZERO_COPY = {
+    Mode.RENAME: _rename,
+    Mode.HARDLINK: _hardlink,
+    Mode.REFLINK: _reflink,
+}
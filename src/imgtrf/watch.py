@@ -0,0 +1,331 @@
+"""Continuous ingest of files arriving in a directory
+
+A watcher reports paths of files created in, or moved into, the watched tree.
+On Linux it is notified by the kernel through inotify, elsewhere directories are
+polled and only those whose modification time changed are listed again. Either
+way the tree is only scanned in full once, when watching starts.
+
+Reported files are only handed on once their size and modification time have
+stayed the same for a while, so files that are still being written are not
+transferred half done. Files that settle at about the same time are handed on
+together as one batch.
+"""
+
+import ctypes
+import ctypes.util
+import logging
+import os
+from pathlib import Path
+import select
+import struct
+import sys
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple, Union
+
+log = logging.getLogger(__name__)
+
+DEFAULT_SETTLE_TIME = 2.0
+DEFAULT_POLL_INTERVAL = 5.0
+
+# Longest time the watch loop blocks before checking whether to stop
+_TICK = 0.5
+
+# inotify constants, linux/inotify.h
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT = struct.Struct("iIII")
+
+
+class InotifyWatcher:
+    """Watches a directory tree with inotify, Linux only
+
+    Every directory in the tree has its own watch, directories created later
+    are watched as they appear.
+    """
+
+    def __init__(self, root: Path):
+        self.root = root
+        self._libc = _load_libc()
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise _errno_error("inotify_init1")
+        self._dirs: Dict[int, str] = {}
+        self._add_tree(os.fspath(root))
+
+    @staticmethod
+    def available() -> bool:
+        return sys.platform.startswith("linux") and _load_libc() is not None
+
+    def poll(self, timeout: float) -> Set[str]:
+        """Waits up to timeout seconds, returns paths of new or written files"""
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+
+        paths: Set[str] = set()
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                return paths
+            self._parse(data, paths)
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+    def _parse(self, data: bytes, paths: Set[str]) -> None:
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, length = _EVENT.unpack_from(data, offset)
+            offset += _EVENT.size
+            name = os.fsdecode(data[offset : offset + length].rstrip(b"\0"))
+            offset += length
+
+            if mask & IN_Q_OVERFLOW:
+                log.warning("Missed file system events, scanning whole tree")
+                paths.update(_list_files(os.fspath(self.root)))
+                continue
+            if mask & IN_IGNORED:
+                self._dirs.pop(wd, None)
+                continue
+
+            directory = self._dirs.get(wd)
+            if directory is None or not name:
+                continue
+            path = os.path.join(directory, name)
+            if mask & IN_ISDIR:
+                # Files may have been created before the watch was added
+                self._add_tree(path)
+                paths.update(_list_files(path))
+            else:
+                paths.add(path)
+
+    def _add_tree(self, root: str) -> None:
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            wd = self._libc.inotify_add_watch(
+                self._fd, os.fsencode(directory), _WATCH_MASK
+            )
+            if wd < 0:
+                log.warning(f"Could not watch {directory}: {_errno_error(directory)}")
+                continue
+            self._dirs[wd] = directory
+            stack.extend(_list_dirs(directory))
+
+
+class PollingWatcher:
+    """Watches a directory tree by checking directories every `interval` seconds
+
+    Only directories with a new modification time are listed again, which
+    happens when entries are added to or removed from them.
+    """
+
+    def __init__(self, root: Path, interval: float = DEFAULT_POLL_INTERVAL):
+        self.root = root
+        self.interval = interval
+        # Modification time and entries of every known directory
+        self._dirs: Dict[str, Tuple[int, Set[str]]] = {}
+        self._next_poll = time.monotonic() + interval
+        self._add_tree(os.fspath(root))
+
+    def poll(self, timeout: float) -> Set[str]:
+        """Waits up to timeout seconds, returns paths of new files"""
+        wait = self._next_poll - time.monotonic()
+        if wait > timeout:
+            time.sleep(timeout)
+            return set()
+        time.sleep(max(wait, 0))
+        self._next_poll = time.monotonic() + self.interval
+
+        paths: Set[str] = set()
+        for directory, (mtime_ns, names) in list(self._dirs.items()):
+            try:
+                if os.stat(directory).st_mtime_ns == mtime_ns:
+                    continue
+            except FileNotFoundError:
+                del self._dirs[directory]
+                continue
+
+            for name, is_dir in self._scan(directory):
+                if name in names:
+                    continue
+                path = os.path.join(directory, name)
+                if is_dir:
+                    paths.update(self._add_tree(path))
+                else:
+                    paths.add(path)
+        return paths
+
+    def close(self) -> None:
+        pass
+
+    def _add_tree(self, root: str) -> List[str]:
+        """Starts watching directories below root, returns the files in them"""
+        files = []
+        stack = [root]
+        while stack:
+            directory = stack.pop()
+            for name, is_dir in self._scan(directory):
+                path = os.path.join(directory, name)
+                if is_dir:
+                    stack.append(path)
+                else:
+                    files.append(path)
+        return files
+
+    def _scan(self, directory: str) -> List[Tuple[str, bool]]:
+        """Lists directory and remembers its entries"""
+        try:
+            mtime_ns = os.stat(directory).st_mtime_ns
+            with os.scandir(directory) as entries:
+                listing = [
+                    (entry.name, entry.is_dir(follow_symlinks=False))
+                    for entry in entries
+                ]
+        except OSError as e:
+            log.warning(f"Could not list directory {directory}: {e}")
+            return []
+        self._dirs[directory] = (mtime_ns, {name for name, _ in listing})
+        return listing
+
+
+Watcher = Union[InotifyWatcher, PollingWatcher]
+
+
+def create_watcher(
+    root: Path, polling: bool = False, interval: float = DEFAULT_POLL_INTERVAL
+) -> Watcher:
+    """Returns an inotify watcher if supported, unless `polling`"""
+    if not polling and InotifyWatcher.available():
+        try:
+            return InotifyWatcher(root)
+        except OSError as e:
+            log.warning(f"Could not use inotify, polling instead: {e}")
+    return PollingWatcher(root, interval=interval)
+
+
+class Settler:
+    """Holds back files until they have stopped changing
+
+    A file is settled when its size and modification time have not changed for
+    `settle_time` seconds.
+    """
+
+    def __init__(
+        self,
+        settle_time: float = DEFAULT_SETTLE_TIME,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.settle_time = settle_time
+        self._clock = clock
+        # Size, modification time and since when they have been unchanged
+        self._pending: Dict[str, Tuple[int, int, float]] = {}
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def add(self, paths: Set[str]) -> None:
+        now = self._clock()
+        for path in paths:
+            if path not in self._pending:
+                self._pending[path] = (-1, -1, now)
+
+    def pop_settled(self) -> List[Path]:
+        """Returns files that have settled and stops tracking them"""
+        now = self._clock()
+        settled = []
+        for path, (size, mtime_ns, since) in list(self._pending.items()):
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                # Temporary file that was renamed or removed
+                del self._pending[path]
+                continue
+
+            if (stat.st_size, stat.st_mtime_ns) != (size, mtime_ns):
+                self._pending[path] = (stat.st_size, stat.st_mtime_ns, now)
+            elif now - since >= self.settle_time:
+                del self._pending[path]
+                settled.append(Path(path))
+        return sorted(settled)
+
+
+def watch(
+    watcher: Watcher,
+    transfer: Callable[[List[Path]], None],
+    settle_time: float = DEFAULT_SETTLE_TIME,
+    stop: Optional[threading.Event] = None,
+) -> None:
+    """Hands settled files reported by watcher to `transfer` in batches
+
+    Runs until `stop` is set, or forever if not given.
+    """
+    settler = Settler(settle_time)
+    while stop is None or not stop.is_set():
+        settler.add(watcher.poll(_TICK))
+        if not settler:
+            continue
+
+        batch = settler.pop_settled()
+        if batch:
+            log.info(f"Transferring {len(batch)} new files")
+            transfer(batch)
+
+
+def _list_files(directory: str) -> List[str]:
+    files = []
+    stack = [directory]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    else:
+                        files.append(entry.path)
+        except OSError:
+            continue
+    return files
+
+
+def _list_dirs(directory: str) -> List[str]:
+    try:
+        with os.scandir(directory) as entries:
+            return [e.path for e in entries if e.is_dir(follow_symlinks=False)]
+    except OSError:
+        return []
+
+
+_libc = None
+
+
+def _load_libc():
+    global _libc
+    if _libc is None and sys.platform.startswith("linux"):
+        try:
+            libc = ctypes.CDLL(ctypes.util.find_library("c"), use_errno=True)
+            libc.inotify_init1.argtypes = [ctypes.c_int]
+            libc.inotify_add_watch.argtypes = [
+                ctypes.c_int,
+                ctypes.c_char_p,
+                ctypes.c_uint32,
+            ]
+        except (OSError, AttributeError):
+            return None
+        _libc = libc
+    return _libc
+
+
+def _errno_error(name: str) -> OSError:
+    code = ctypes.get_errno()
+    return OSError(code, os.strerror(code) if code else "Unknown error", name)
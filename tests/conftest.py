@@ -1,10 +1,13 @@
 from datetime import datetime
+import struct
 from PIL import Image
 import piexif
 
 import pytest
 
+from imgtrf import device, meta
 from pathlib import Path
+from typing import Optional
 
 
 def create_image(directory: Path, file_name: str, creation_date: datetime) -> Path:
@@ -31,6 +34,75 @@ def create_image(directory: Path, file_name: str, creation_date: datetime) -> Pa
     return file_path
 
 
+def _box(box_type: bytes, content: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(content), box_type) + content
+
+
+def create_video(
+    directory: Path,
+    file_name: str,
+    creation_date: Optional[datetime],
+    moov_at_end: bool = False,
+    creation_date_key: Optional[str] = None,
+) -> Path:
+    """Create dummy MP4 file with creation time in movie header
+
+    An unset movie header creation time is written if `creation_date` is None.
+
+    Reference
+    ----------
+    https://developer.apple.com/documentation/quicktime-file-format
+    """
+    file_path = directory / file_name
+    seconds = 0
+    if creation_date is not None:
+        seconds = int((creation_date - datetime(1904, 1, 1)).total_seconds())
+
+    ftyp = _box(b"ftyp", b"isom" + struct.pack(">I", 512) + b"isomiso2mp41")
+    mdat = _box(b"mdat", bytes(1024))
+    mvhd = _box(b"mvhd", struct.pack(">B3xIII", 0, seconds, seconds, 1000) + bytes(84))
+    moov_content = mvhd
+    if creation_date_key is not None:
+        key = b"mdta" + b"com.apple.quicktime.creationdate"
+        keys = _box(
+            b"keys", struct.pack(">II", 0, 1) + struct.pack(">I", 4 + len(key)) + key
+        )
+        value = creation_date_key.encode()
+        data = _box(b"data", struct.pack(">II", 1, 0) + value)
+        ilst = _box(b"ilst", _box(struct.pack(">I", 1), data))
+        moov_content += _box(b"meta", _box(b"hdlr", bytes(25)) + keys + ilst)
+    moov = _box(b"moov", moov_content)
+
+    boxes = [ftyp, mdat, moov] if moov_at_end else [ftyp, moov, mdat]
+    file_path.write_bytes(b"".join(boxes))
+
+    return file_path
+
+
+@pytest.fixture(autouse=True)
+def cache_dir(
+    tmp_path_factory: pytest.TempPathFactory, monkeypatch: pytest.MonkeyPatch
+):
+    """Keep the metadata cache out of the users cache directory"""
+    path = tmp_path_factory.mktemp("cache")
+    monkeypatch.setenv("IMGTRF_CACHE_DIR", str(path))
+    yield path
+
+
+@pytest.fixture(autouse=True)
+def time_sources():
+    """Restore the default time sources after tests configuring them"""
+    yield
+    meta.configure()
+
+
+@pytest.fixture(autouse=True)
+def device_limits():
+    """Restore the default device slots and rate after tests configuring them"""
+    yield
+    device.configure()
+
+
 @pytest.fixture
 def temp_image(tmp_path: Path) -> Path:
     image_path = create_image(
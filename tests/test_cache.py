@@ -0,0 +1,73 @@
+from datetime import datetime
+import os
+from pathlib import Path
+
+from imgtrf import cache
+from imgtrf import meta
+from unittest.mock import patch
+
+
+def test_default_cache_dir(cache_dir: Path):
+    assert cache.default_cache_dir() == cache_dir
+
+
+def test_cache_roundtrip(tmp_path: Path, temp_image: Path):
+    creation_time = datetime(2020, 1, 1, 12, 0)
+    with cache.MetadataCache(tmp_path / "cache.sqlite") as metadata_cache:
+        assert metadata_cache.get(temp_image) is None
+
+        metadata_cache.put(temp_image, creation_time, "image")
+        assert metadata_cache.get(temp_image) == (creation_time, "image")
+
+        metadata_cache.invalidate(temp_image)
+        assert metadata_cache.get(temp_image) is None
+
+
+def test_cache_miss_when_file_changes(tmp_path: Path, temp_image: Path):
+    with cache.MetadataCache(tmp_path / "cache.sqlite") as metadata_cache:
+        metadata_cache.put(temp_image, datetime(2020, 1, 1), "image")
+
+        stat = temp_image.stat()
+        os.utime(temp_image, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+        assert metadata_cache.get(temp_image) is None
+
+
+def test_cache_persists(tmp_path: Path, temp_image: Path):
+    path = tmp_path / "cache.sqlite"
+    with cache.MetadataCache(path) as metadata_cache:
+        metadata_cache.put(temp_image, datetime(2020, 1, 1), "image")
+
+    with cache.MetadataCache(path) as metadata_cache:
+        assert metadata_cache.get(temp_image) == (datetime(2020, 1, 1), "image")
+
+
+def test_cache_evicts_least_recently_used(tmp_path: Path):
+    files = []
+    for i in range(3):
+        file = tmp_path / f"{i}.jpg"
+        file.write_bytes(b"x")
+        files.append(file)
+
+    metadata_cache = cache.MetadataCache(tmp_path / "cache.sqlite", max_entries=2)
+    for file in files:
+        metadata_cache.put(file, datetime(2020, 1, 1), "image")
+    metadata_cache.get(files[0])
+
+    assert metadata_cache.evict() == 1
+    assert len(metadata_cache) == 2
+    assert metadata_cache.get(files[1]) is None
+    metadata_cache.close()
+
+
+def test_get_creation_time_uses_cache(tmp_path: Path, temp_image: Path):
+    with cache.MetadataCache(tmp_path / "cache.sqlite") as metadata_cache:
+        assert meta.get_creation_time(temp_image, cache=metadata_cache) == datetime(
+            2020, 1, 1, 12, 0
+        )
+
+        with patch("imgtrf.meta.get_image_meta") as get_image_meta:
+            creation_time = meta.get_creation_time(temp_image, cache=metadata_cache)
+
+        get_image_meta.assert_not_called()
+        assert creation_time == datetime(2020, 1, 1, 12, 0)
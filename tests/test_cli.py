@@ -1,8 +1,10 @@
+import json
 from pathlib import Path
 
 import pytest
 
 from typer.testing import CliRunner
+from imgtrf import device
 from imgtrf.cli import app
 
 runner = CliRunner()
@@ -28,6 +30,38 @@ def test_copy_format(temp_directory: Path):
     assert (temp_directory / "destination" / "2020" / "01" / "file01.jpg").exists()
 
 
+def test_copy_jobs(temp_directory: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    result = runner.invoke(app, ["copy", "--jobs", "4", str(src_path), str(dest_path)])
+    assert result.exit_code == 0
+    assert (
+        temp_directory / "destination" / "2020" / "02" / "01" / "file02.jpg"
+    ).exists()
+
+
+def test_copy_no_cache(temp_directory: Path, cache_dir: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    result = runner.invoke(app, ["copy", "--no-cache", str(src_path), str(dest_path)])
+    assert result.exit_code == 0
+    assert not (cache_dir / "metadata.sqlite").exists()
+
+    result = runner.invoke(app, ["copy", str(src_path), str(dest_path)])
+    assert result.exit_code == 0
+    assert (cache_dir / "metadata.sqlite").exists()
+
+
+def test_copy_mode_rename(temp_directory: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    result = runner.invoke(
+        app, ["copy", "--mode", "rename", str(src_path), str(dest_path)]
+    )
+    assert result.exit_code == 2
+    assert (src_path / "file01.jpg").exists()
+
+
 def test_copy_not_a_directory(temp_directory: Path):
     src_path = temp_directory / "not-exists"
     dest_path = temp_directory / "destination"
@@ -48,6 +82,17 @@ def test_move(temp_directory: Path):
     assert not (temp_directory / "source" / "file01.jpg").exists()
 
 
+def test_move_hardlink(temp_directory: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    result = runner.invoke(
+        app, ["move", "--mode", "hardlink", str(src_path), str(dest_path)]
+    )
+    assert result.exit_code == 0
+    assert (dest_path / "2020" / "01" / "01" / "file01.jpg").exists()
+    assert not (src_path / "file01.jpg").exists()
+
+
 def test_move_format(temp_directory: Path):
     src_path = temp_directory / "source"
     dest_path = temp_directory / "destination"
@@ -74,4 +119,131 @@ def test_remove_empty(temp_directory: Path):
     assert not dir_to_be_removed.exists()
     assert (temp_directory / "source").exists()
     assert (temp_directory / "source" / "subfolder").exists()
-    assert (temp_directory / "destination").exists()
\ No newline at end of file
+    assert (temp_directory / "destination").exists()
+
+def test_move_verify_manifest(temp_directory: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    result = runner.invoke(
+        app, ["move", "--verify", "--manifest", str(src_path), str(dest_path)]
+    )
+    assert result.exit_code == 0
+    assert (dest_path / ".imgtrf-manifest.jsonl").exists()
+    assert not (src_path / "file01.jpg").exists()
+
+
+def test_copy_resume_without_journal(temp_directory: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    result = runner.invoke(app, ["copy", "--resume", str(src_path), str(dest_path)])
+    assert result.exit_code == 0
+    assert (dest_path / "2020" / "01" / "01" / "file01.jpg").exists()
+
+
+def test_copy_stats_profile(temp_directory: Path, tmp_path: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    stats_file = tmp_path / "stats.json"
+    profile_file = tmp_path / "run.prof"
+    result = runner.invoke(
+        app,
+        [
+            "--stats",
+            str(stats_file),
+            "--profile",
+            str(profile_file),
+            "copy",
+            str(src_path),
+            str(dest_path),
+        ],
+    )
+    assert result.exit_code == 0
+    assert json.loads(stats_file.read_text())["counts"]["transfer.files"] == 2
+    assert profile_file.stat().st_size > 0
+
+
+def test_copy_unknown_token(temp_directory: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    result = runner.invoke(
+        app, ["copy", "--dir-format", "{camera}/Y", str(src_path), str(dest_path)]
+    )
+    assert result.exit_code == 2
+    assert list(dest_path.iterdir()) == []
+
+
+def test_plan_apply(temp_directory: Path, tmp_path: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    plan_path = tmp_path / "plan.jsonl"
+    result = runner.invoke(
+        app, ["plan", str(src_path), str(dest_path), "--out", str(plan_path)]
+    )
+    assert result.exit_code == 0
+    assert "Planned 2 transfers" in result.stdout
+
+    for shard in ("1/2", "2/2"):
+        result = runner.invoke(app, ["apply", str(plan_path), "--shard", shard])
+        assert result.exit_code == 0
+    assert (dest_path / "2020" / "01" / "01" / "file01.jpg").exists()
+    assert (dest_path / "2020" / "02" / "01" / "file02.jpg").exists()
+
+
+def test_apply_invalid(tmp_path: Path):
+    plan_path = tmp_path / "plan.jsonl"
+    result = runner.invoke(app, ["apply", str(plan_path), "--shard", "3/2"])
+    assert result.exit_code == 2
+
+    result = runner.invoke(app, ["apply", str(plan_path)])
+    assert result.exit_code == 1
+
+
+def test_move_prune(temp_directory: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    result = runner.invoke(app, ["move", "--prune", str(src_path), str(dest_path)])
+    assert result.exit_code == 0
+    assert list(src_path.iterdir()) == []
+
+
+def test_copy_log_file(temp_directory: Path, tmp_path: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    log_file = tmp_path / "run.jsonl"
+    result = runner.invoke(
+        app,
+        ["--log-file", str(log_file), "--log-json", "copy"]
+        + [str(src_path), str(dest_path)],
+    )
+    assert result.exit_code == 0
+    lines = log_file.read_text().splitlines()
+    messages = [json.loads(line)["message"] for line in lines]
+    assert any(message.startswith("Copying") for message in messages)
+
+
+def test_copy_time_source_name(temp_directory: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    (src_path / "file01.jpg").rename(src_path / "IMG_20210304_101010.jpg")
+    result = runner.invoke(
+        app,
+        ["copy", "--time-source", "name", "--time-source", "metadata"]
+        + [str(src_path), str(dest_path)],
+    )
+    assert result.exit_code == 0
+    assert (dest_path / "2021" / "03" / "04" / "IMG_20210304_101010.jpg").exists()
+    assert (dest_path / "2020" / "02" / "01" / "file02.jpg").exists()
+
+
+def test_copy_device_limits(temp_directory: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    result = runner.invoke(
+        app,
+        ["copy", "--jobs", "4", "--device-jobs", "1", "--max-rate", "100"]
+        + [str(src_path), str(dest_path)],
+    )
+    assert result.exit_code == 0
+    assert (dest_path / "2020" / "01" / "01" / "file01.jpg").exists()
+    assert device._slots.jobs == 1
+    assert device._rate.bytes_per_second == 100 * 1024**2
@@ -1,9 +1,11 @@
 from pathlib import Path
 from datetime import datetime
+import time
 
 import pytest
 
 from imgtrf import core
+from imgtrf import exceptions
 
 
 def test_copy_files(temp_directory: Path):
@@ -34,6 +36,163 @@ def test_move_files(temp_directory: Path):
     assert not (temp_directory / "source" / "subfolder" / "file02.jpg").exists()
 
 
+def test_copy_files_concurrent(temp_directory: Path):
+    src_dir = temp_directory / "source"
+    dest_dir = temp_directory / "destination"
+
+    core.copy_files(
+        src_dir=src_dir, dest_dir=dest_dir, dir_format="%Y/%m/%d", jobs=4
+    )
+
+    assert (dest_dir / "2020" / "01" / "01" / "file01.jpg").exists()
+    assert (dest_dir / "2020" / "02" / "01" / "file02.jpg").exists()
+
+
+def test_create_src_dest_pairs_skips_unknown_date(temp_directory: Path):
+    src_dir = temp_directory / "source"
+    (src_dir / "notes.txt").write_text("no metadata here")
+
+    pairs = core._create_src_dest_pairs(
+        src_dir=src_dir,
+        dest_dir=temp_directory / "destination",
+        dir_format="%Y",
+        jobs=2,
+    )
+
+    assert sorted(src.name for src, _ in pairs) == ["file01.jpg", "file02.jpg"]
+
+
+@pytest.mark.parametrize("jobs", [1, 3])
+def test_map_concurrent_keeps_order(jobs: int):
+    items = list(range(50))
+    result = list(core._map_concurrent(lambda x: x * 2, iter(items), jobs=jobs))
+    assert result == [(x, x * 2) for x in items]
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_move_files_stream(temp_directory: Path, jobs: int):
+    src_dir = temp_directory / "source"
+    dest_dir = temp_directory / "destination"
+
+    core.move_files(
+        src_dir=src_dir, dest_dir=dest_dir, dir_format="%Y/%m", jobs=jobs, stream=True
+    )
+
+    assert (dest_dir / "2020" / "01" / "file01.jpg").exists()
+    assert (dest_dir / "2020" / "02" / "file02.jpg").exists()
+    assert not (src_dir / "file01.jpg").exists()
+
+
+def test_transfer_files_consumes_lazily(tmp_path: Path):
+    transferred = []
+
+    def pairs():
+        for i in range(20):
+            # Workers are bounded, so earlier files must be done by now
+            if i >= 10:
+                assert len(transferred) >= i - 4
+            yield tmp_path / f"{i}.jpg", tmp_path / "out" / f"{i}.jpg"
+
+    def transfer(src: Path, dest: Path) -> None:
+        transferred.append(src)
+
+    core._transfer_files(pairs(), transfer=transfer, description="Copying", jobs=2)
+
+    assert len(transferred) == 20
+
+
+def test_transfer_files_isolates_errors(tmp_path: Path):
+    sources = []
+    for name in ["a.jpg", "b.jpg", "c.jpg"]:
+        path = tmp_path / name
+        path.write_bytes(b"x" * 10)
+        sources.append(path)
+    missing = tmp_path / "missing.jpg"
+    pairs = [(src, tmp_path / "out" / src.name) for src in [sources[0], missing]]
+    pairs += [(src, tmp_path / "out" / src.name) for src in sources[1:]]
+
+    with pytest.raises(exceptions.TransferError) as error:
+        core._transfer_files(
+            pairs, transfer=core._copy_file, description="Copying", jobs=2
+        )
+
+    assert [path for path, _ in error.value.failed] == [missing]
+    assert sorted(p.name for p in (tmp_path / "out").iterdir()) == [
+        "a.jpg",
+        "b.jpg",
+        "c.jpg",
+    ]
+
+
+def test_in_flight_limit_allows_oversized_file():
+    limit = core._InFlightLimit(max_bytes=100, max_files=4)
+    reserved = limit.acquire(1000)
+    assert reserved == 100
+    assert limit.bytes == 100
+    limit.release(reserved)
+    assert limit.bytes == 0 and limit.files == 0
+
+
+@pytest.fixture
+def walk_tree(tmp_path: Path) -> Path:
+    for relative_path in [
+        "a.jpg",
+        "b.JPG",
+        ".DS_Store",
+        "notes.txt",
+        "sub/c.mp4",
+        "sub/thumbs/d.jpg",
+        "sub/deep/er/e.png",
+    ]:
+        path = tmp_path / relative_path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+    return tmp_path
+
+
+def _relative(paths, root: Path):
+    return sorted(path.relative_to(root).as_posix() for path in paths)
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_walk(walk_tree: Path, jobs: int):
+    assert len(list(core.walk(walk_tree, jobs=jobs))) == 7
+
+
+def test_walk_concurrent_keeps_order(
+    monkeypatch: pytest.MonkeyPatch, tmp_path: Path
+):
+    for number in range(20):
+        path = tmp_path / f"dir{number % 4}" / f"sub{number % 3}" / f"{number}.jpg"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(b"")
+    scan_dir = core._scan_dir
+
+    def slow_scan_dir(directory: str, *args):
+        # Directories listed first finish last
+        time.sleep(0.01 * (5 - len(directory) % 5))
+        return scan_dir(directory, *args)
+
+    monkeypatch.setattr(core, "_scan_dir", slow_scan_dir)
+    assert list(core.walk(tmp_path, jobs=8)) == list(core.walk(tmp_path))
+
+
+@pytest.mark.parametrize("jobs", [1, 4])
+def test_walk_extensions(walk_tree: Path, jobs: int):
+    paths = core.walk(walk_tree, extensions={"jpg", "mp4"}, jobs=jobs)
+    assert _relative(paths, walk_tree) == [
+        "a.jpg",
+        "b.JPG",
+        "sub/c.mp4",
+        "sub/thumbs/d.jpg",
+    ]
+
+
+def test_walk_include_exclude(walk_tree: Path):
+    paths = core.walk(walk_tree, include=["*.jpg", "sub/deep/*"], exclude=["thumbs"])
+    assert _relative(paths, walk_tree) == ["a.jpg", "sub/deep/er/e.png"]
+
+
 @pytest.mark.parametrize(
     "dir_format,expected_path",
     [
@@ -84,3 +243,62 @@ def test_remove_dirs_cwd(monkeypatch: pytest.MonkeyPatch, tmp_path: Path):
     core.remove_dirs(Path('.'))
     assert empty_path.exists()  # cwd should not be removed
     assert len([c for c in empty_path.iterdir()]) == 0 # empty
+
+
+def test_filter_paths(walk_tree: Path):
+    paths = list(core.walk(walk_tree))
+    filtered = core.filter_paths(
+        paths, walk_tree, extensions={"jpg"}, exclude=["thumbs"]
+    )
+    assert _relative(filtered, walk_tree) == ["a.jpg", "b.JPG"]
+
+
+def test_remove_dirs_deep(tmp_path: Path):
+    """Trees deeper than the recursion limit are removed as well"""
+    deep = tmp_path / "root"
+    deep.mkdir()
+    for _ in range(1100):
+        deep = deep / "d"
+        deep.mkdir()
+    (tmp_path / "root" / "d" / "keep.txt").write_text("keep")
+
+    assert core.remove_dirs(tmp_path / "root") == 1099
+    assert (tmp_path / "root" / "d" / "keep.txt").exists()
+    assert not (tmp_path / "root" / "d" / "d").exists()
+
+
+def test_prune_dirs(tmp_path: Path):
+    root = tmp_path / "root"
+    emptied = root / "a" / "b" / "c"
+    emptied.mkdir(parents=True)
+    (root / "x" / "y").mkdir(parents=True)
+    (root / "x" / "file.txt").write_text("keep")
+
+    assert core.prune_dirs([emptied, root / "x" / "y"], root) == 4
+    assert not (root / "a").exists()
+    assert (root / "x" / "file.txt").exists()
+    assert root.exists()
+
+
+def test_move_files_prune(temp_directory: Path):
+    src_path = temp_directory / "source"
+    other = src_path / "other"
+    other.mkdir()
+    core.move_files(src_path, temp_directory / "destination", "%Y", prune=True)
+
+    assert list(src_path.iterdir()) == [other]
+
+
+def test_throttled_task():
+    progress = core._create_progress()
+    task = core._ThrottledTask(progress, "Copying", total=0, interval=3600)
+    for submitted in range(1, 101):
+        task.set_total(submitted)
+        task.advance()
+    # Only the first total got through
+    assert progress.tasks[0].completed == 0
+    assert progress.tasks[0].total == 1
+
+    task.flush()
+    assert progress.tasks[0].completed == 100
+    assert progress.tasks[0].total == 100
@@ -0,0 +1,103 @@
+from datetime import datetime
+from pathlib import Path
+import shutil
+
+from unittest.mock import patch
+
+from imgtrf import core
+from imgtrf import dedup
+from conftest import create_image
+
+
+def _write(path: Path, content: bytes) -> Path:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return path
+
+
+def test_find_duplicate(tmp_path: Path):
+    known = _write(tmp_path / "known.jpg", b"a" * 1000)
+    same = _write(tmp_path / "same.jpg", b"a" * 1000)
+    other = _write(tmp_path / "other.jpg", b"b" * 1000)
+
+    deduplicator = dedup.Deduplicator()
+    deduplicator.add(known, 1000)
+
+    assert deduplicator.find_duplicate(same, 1000) == known
+    assert deduplicator.find_duplicate(other, 1000) is None
+    # Files not found to be duplicates become known
+    assert deduplicator.find_duplicate(known, 1000) == known
+
+
+def test_find_duplicate_unique_size_is_not_read(tmp_path: Path):
+    known = _write(tmp_path / "known.jpg", b"a" * 10)
+    deduplicator = dedup.Deduplicator()
+    deduplicator.add(known, 10)
+
+    with patch("imgtrf.dedup.open") as open_:
+        assert deduplicator.find_duplicate(tmp_path / "other.jpg", 20) is None
+
+    open_.assert_not_called()
+
+
+def test_find_duplicate_same_head_and_tail(tmp_path: Path):
+    block = dedup.BLOCK_SIZE
+    known = _write(tmp_path / "known.jpg", b"h" * block + b"1" * 10 + b"t" * block)
+    middle = _write(tmp_path / "middle.jpg", b"h" * block + b"2" * 10 + b"t" * block)
+
+    deduplicator = dedup.Deduplicator()
+    deduplicator.add(known, known.stat().st_size)
+
+    assert deduplicator.find_duplicate(middle, middle.stat().st_size) is None
+
+
+def test_find_duplicate_known_hash(tmp_path: Path):
+    same = _write(tmp_path / "same.jpg", b"a" * 1000)
+    deduplicator = dedup.Deduplicator()
+    deduplicator.add(tmp_path / "removed.jpg", 1000, full_hash=dedup.hash_file(same))
+
+    assert deduplicator.find_duplicate(same, 1000) == tmp_path / "removed.jpg"
+
+
+def test_copy_files_dedup(temp_directory: Path):
+    src_dir = temp_directory / "source"
+    dest_dir = temp_directory / "destination"
+
+    # Already imported under another name
+    archived = dest_dir / "archive" / "renamed.jpg"
+    archived.parent.mkdir()
+    shutil.copy(src_dir / "file01.jpg", archived)
+
+    # Different photo with the same name as a source file
+    taken = create_image(
+        src_dir / "subfolder", "file01.jpg", datetime(2020, 2, 1, 13, 00)
+    )
+    taken_name = dest_dir / "2020" / "02" / "01" / "file01.jpg"
+    taken_name.parent.mkdir(parents=True)
+    taken_name.write_bytes(b"something else")
+
+    core.copy_files(src_dir, dest_dir, "%Y/%m/%d", dedup=True)
+
+    assert not (dest_dir / "2020" / "01" / "01" / "file01.jpg").exists()
+    assert (dest_dir / "2020" / "02" / "01" / "file02.jpg").exists()
+    assert taken_name.read_bytes() == b"something else"
+    renamed = dest_dir / "2020" / "02" / "01" / "file01_1.jpg"
+    assert renamed.read_bytes() == taken.read_bytes()
+
+
+def test_move_files_dedup_stream(tmp_path: Path):
+    src_dir = tmp_path / "source"
+    dest_dir = tmp_path / "destination"
+    src_dir.mkdir()
+    dest_dir.mkdir()
+    photo = create_image(src_dir, "x.jpg", datetime(2020, 1, 1, 12, 00))
+    for minute in range(10):
+        create_image(src_dir, f"filler{minute}.jpg", datetime(2020, 1, 1, 0, minute))
+    # Indexed only once x.jpg has been moved away
+    _write(src_dir / "sub" / "x.jpg", photo.read_bytes())
+
+    core.move_files(src_dir, dest_dir, "%Y", dedup=True, stream=True)
+
+    assert (dest_dir / "2020" / "x.jpg").exists()
+    assert not (dest_dir / "2020" / "x_1.jpg").exists()
+    assert (src_dir / "sub" / "x.jpg").exists()
@@ -0,0 +1,118 @@
+import os
+from pathlib import Path
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from imgtrf import device, transfer
+from imgtrf.device import DeviceSlots, RateLimit
+
+
+def _concurrency(slots: DeviceSlots, devices) -> int:
+    """Returns the most threads found holding their slots at the same time"""
+    holding = []
+    most = [0]
+    lock = threading.Lock()
+
+    def work(device_id: int):
+        with slots.hold(device_id):
+            with lock:
+                holding.append(device_id)
+                most[0] = max(most[0], len(holding))
+            time.sleep(0.02)
+            with lock:
+                holding.remove(device_id)
+
+    threads = [threading.Thread(target=work, args=(d,)) for d in devices]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return most[0]
+
+
+def test_slots_per_device():
+    slots = DeviceSlots(jobs=1)
+    assert _concurrency(slots, [1, 1, 1]) == 1
+    assert _concurrency(slots, [1, 2]) == 2
+
+
+def test_slots_rotational(monkeypatch):
+    monkeypatch.setattr(device, "is_rotational", lambda device_id: device_id == 1)
+    slots = DeviceSlots()
+    assert slots.limit(1) == device.DEFAULT_ROTATIONAL_JOBS
+    assert slots.limit(2) is None
+    assert _concurrency(slots, [2, 2, 2]) == 3
+
+
+def test_hold_several_devices():
+    slots = DeviceSlots(jobs=1)
+    # Taken in the same order by both, so neither waits forever on the other
+    threads = [
+        threading.Thread(target=_concurrency, args=(slots, [1, 2])) for _ in range(2)
+    ]
+    with slots.hold(2, 1, 1):
+        for thread in threads:
+            thread.start()
+    for thread in threads:
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+
+
+def test_hold_missing_directory(tmp_path: Path):
+    device.configure(jobs=1)
+    with device.hold(tmp_path / "missing", tmp_path):
+        pass
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="Linux only")
+def test_is_rotational_network_file_system():
+    assert device.is_rotational(os.makedev(0, 50)) is False
+
+
+def test_rate_limit(monkeypatch):
+    now = [100.0]
+    sleeps = []
+    monkeypatch.setattr(device.time, "monotonic", lambda: now[0])
+    monkeypatch.setattr(device.time, "sleep", sleeps.append)
+    rate = RateLimit(bytes_per_second=1000)
+
+    rate.consume(500)
+    rate.consume(1500)
+    assert sleeps == [0.5, 2.0]
+
+    # Unused time is only saved up to a second
+    now[0] += 10
+    rate.consume(1000)
+    assert sleeps == [0.5, 2.0]
+    rate.consume(100)
+    assert sleeps[-1] == pytest.approx(0.1)
+
+
+def test_copy_throttled(tmp_path: Path, monkeypatch):
+    consumed = []
+    device.configure(max_rate=1024**2)
+    monkeypatch.setattr(device._rate, "consume", consumed.append)
+    src = tmp_path / "src.bin"
+    src.write_bytes(os.urandom(300_000))
+
+    with open(src, "rb") as src_file, open(tmp_path / "dest.bin", "wb") as dest:
+        transfer.copy_data(src_file, dest, buffer_size=64 * 1024)
+
+    assert sum(consumed) == 300_000
+    assert len(consumed) > 1
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Unix niceness")
+def test_lower_priority():
+    code = (
+        "import os; from imgtrf import device; "
+        "device.lower_priority(); print(os.nice(0))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "19"
@@ -0,0 +1,84 @@
+from datetime import datetime
+from pathlib import Path
+import struct
+
+import pytest
+from unittest.mock import patch
+from PIL import Image
+
+from imgtrf import exif
+from imgtrf import meta
+import piexif
+
+
+def _tiff(endian: str, date_time: bytes) -> bytes:
+    """Creates TIFF header with a single DateTime tag in IFD0"""
+    byte_order = b"II" if endian == "<" else b"MM"
+    header = byte_order + struct.pack(endian + "HI", 42, 8)
+    value_offset = 8 + 2 + 12 + 4
+    ifd = struct.pack(endian + "H", 1)
+    ifd += struct.pack(
+        endian + "HHII", exif.TAG_DATE_TIME, 2, len(date_time), value_offset
+    )
+    ifd += struct.pack(endian + "I", 0)
+    return header + ifd + date_time
+
+
+def test_read_creation_time(temp_image: Path):
+    assert exif.read_creation_time(temp_image) == datetime(2020, 1, 1, 12, 0)
+
+
+@pytest.mark.parametrize("endian", ["<", ">"])
+def test_read_date_tags_tiff(endian: str):
+    tags = exif.read_date_tags(_tiff(endian, b"2021:02:03 04:05:06\x00"))
+    assert tags == {exif.TAG_DATE_TIME: "2021:02:03 04:05:06"}
+
+
+def test_read_creation_time_without_exif(tmp_path: Path):
+    path = tmp_path / "no_exif.jpg"
+    with Image.new("RGB", (10, 20)) as image:
+        image.save(path)
+
+    assert exif.read_creation_time(path) is None
+
+
+def test_read_creation_time_blank_date(tmp_path: Path):
+    path = tmp_path / "blank_date.tif"
+    path.write_bytes(_tiff("<", b"    :  :     :  :  \x00"))
+
+    assert exif.read_creation_time(path) is None
+
+
+def test_read_creation_time_falls_back_on_original(tmp_path: Path):
+    path = tmp_path / "original.jpg"
+    exif_data = {"Exif": {piexif.ExifIFD.DateTimeOriginal: "2019:05:06 07:08:09"}}
+    with Image.new("RGB", (10, 20)) as image:
+        image.save(path, exif=piexif.dump(exif_data))
+
+    assert exif.read_creation_time(path) == datetime(2019, 5, 6, 7, 8, 9)
+
+
+@pytest.mark.parametrize(
+    "data", [b"", b"\x89PNG\r\n\x1a\n", b"\xff\xd8\xff\xe1\x00", b"II*\x00\xff\xff"]
+)
+def test_read_date_tags_invalid(data: bytes):
+    with pytest.raises(exif.ExifError):
+        exif.read_date_tags(data)
+
+
+def test_get_image_creation_time_skips_pillow(temp_image: Path):
+    with patch("imgtrf.meta.get_image_meta") as get_image_meta:
+        creation_time = meta.get_image_creation_time(temp_image)
+
+    get_image_meta.assert_not_called()
+    assert creation_time == datetime(2020, 1, 1, 12, 0)
+
+
+def test_get_image_creation_time_falls_back_on_pillow(tmp_path: Path):
+    path = tmp_path / "image.png"
+    with Image.new("RGB", (10, 20)) as image:
+        exif_data = Image.Exif()
+        exif_data[exif.TAG_DATE_TIME] = "2022:03:04 05:06:07"
+        image.save(path, exif=exif_data)
+
+    assert meta.get_image_creation_time(path) == datetime(2022, 3, 4, 5, 6, 7)
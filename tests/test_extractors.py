@@ -0,0 +1,64 @@
+from datetime import datetime
+from pathlib import Path
+import subprocess
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+from imgtrf import core, extractors, meta
+from imgtrf.extractors import Extractor
+
+HEIC = Extractor(
+    "heic", frozenset({"heic"}), "image", lambda path: datetime(2021, 6, 1)
+)
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    """Registry that is restored after the test"""
+    monkeypatch.setattr(extractors, "_by_extension", dict(extractors._by_extension))
+    monkeypatch.setattr(extractors, "_plugins_loaded", True)
+
+
+def test_builtin_extractors():
+    assert extractors.get("jpg") is extractors.IMAGE
+    assert extractors.get("mov") is extractors.VIDEO
+    assert extractors.get("txt") is None
+    assert extractors.for_path(Path("IMG_1.JPEG")) is extractors.IMAGE
+    assert extractors.supported_extensions() == meta.SUPPORTED_EXT
+
+
+def test_register(registry, tmp_path: Path):
+    extractors.register(HEIC)
+    file = tmp_path / "IMG_1.HEIC"
+    file.touch()
+
+    assert "heic" in extractors.supported_extensions()
+    assert meta.get_creation_time(file) == datetime(2021, 6, 1)
+    assert list(core.walk(tmp_path, extensions=extractors.supported_extensions()))
+
+
+def test_register_replaces(registry):
+    video = Extractor("mov", frozenset({"mov"}), "video", lambda path: None)
+    extractors.register(video)
+    assert extractors.get("mov") is video
+    assert extractors.get("mp4") is extractors.VIDEO
+
+
+def test_entry_point_plugins(registry, monkeypatch):
+    broken = SimpleNamespace(name="broken", value="missing:EXTRACTOR")
+    broken.load = lambda: __import__("missing_plugin_module")
+    plugin = SimpleNamespace(name="heic", value="plugin:HEIC", load=lambda: HEIC)
+    monkeypatch.setattr(extractors, "_entry_points", lambda: [broken, plugin])
+    monkeypatch.setattr(extractors, "_plugins_loaded", False)
+
+    assert extractors.get("heic") is HEIC
+
+
+def test_cli_import_is_lazy():
+    code = "import sys, imgtrf.cli; print('PIL' in sys.modules)"
+    output = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    ).stdout
+    assert output.strip() == "False"
@@ -0,0 +1,23 @@
+from datetime import datetime
+from typing import Optional
+
+import pytest
+
+from imgtrf import filename
+
+
+@pytest.mark.parametrize(
+    "name,expected",
+    [
+        ("IMG_20200101_123456.jpg", datetime(2020, 1, 1, 12, 34, 56)),
+        ("PXL_20211224_083015123.jpg", datetime(2021, 12, 24, 8, 30, 15)),
+        ("VID-20190511-WA0003.mp4", datetime(2019, 5, 11)),
+        ("Screenshot_2020-01-01-12-34-56.png", datetime(2020, 1, 1, 12, 34, 56)),
+        ("2020-02-30 to 2021-03-04.jpg", datetime(2021, 3, 4)),
+        ("IMG_1234.jpg", None),
+        ("DSC_20201301.jpg", None),
+        ("123420200101.jpg", None),
+    ],
+)
+def test_read_creation_time(name: str, expected: Optional[datetime]):
+    assert filename.read_creation_time(name) == expected
@@ -0,0 +1,115 @@
+import os
+from pathlib import Path
+
+import pytest
+from unittest.mock import patch
+
+from imgtrf import core
+from imgtrf.index import Compare, DestinationIndex, FileInfo
+
+
+def test_exists_lists_directory_once(tmp_path: Path):
+    (tmp_path / "a.jpg").write_bytes(b"a")
+    (tmp_path / "b.jpg").write_bytes(b"b")
+    index = DestinationIndex()
+
+    with patch("imgtrf.index.os.scandir", wraps=os.scandir) as scandir:
+        assert index.exists(tmp_path / "a.jpg")
+        assert index.exists(tmp_path / "b.jpg")
+        assert not index.exists(tmp_path / "c.jpg")
+
+    assert scandir.call_count == 1
+
+
+def test_exists_missing_directory(tmp_path: Path):
+    index = DestinationIndex()
+    assert not index.exists(tmp_path / "missing" / "a.jpg")
+
+    index.add(tmp_path / "missing" / "a.jpg", FileInfo(1, 0.0))
+    assert index.exists(tmp_path / "missing" / "a.jpg")
+
+
+@pytest.mark.parametrize(
+    "compare,dest_content,expected",
+    [
+        (Compare.NAME, b"different", True),
+        (Compare.SIZE, b"different", False),
+        (Compare.SIZE, b"same", True),
+        (Compare.SIZE_MTIME, b"same", True),
+    ],
+)
+def test_is_up_to_date(
+    tmp_path: Path, compare: Compare, dest_content: bytes, expected: bool
+):
+    src = tmp_path / "src.jpg"
+    src.write_bytes(b"same")
+    dest = tmp_path / "dest" / "src.jpg"
+    dest.parent.mkdir()
+    dest.write_bytes(dest_content)
+
+    assert DestinationIndex().is_up_to_date(src, dest, compare) is expected
+
+
+def test_is_up_to_date_mtime(tmp_path: Path):
+    src = tmp_path / "src.jpg"
+    src.write_bytes(b"same")
+    dest = tmp_path / "dest" / "src.jpg"
+    dest.parent.mkdir()
+    dest.write_bytes(b"same")
+    os.utime(dest, (0, 0))
+
+    assert not DestinationIndex().is_up_to_date(src, dest, Compare.SIZE_MTIME)
+
+
+def test_max_entries_drops_listings(tmp_path: Path):
+    for name in ["a", "b", "c"]:
+        (tmp_path / name).mkdir()
+        (tmp_path / name / "1.jpg").write_bytes(b"1")
+    index = DestinationIndex(max_entries=4, recent_files=1)
+
+    with patch("imgtrf.index.os.scandir", wraps=os.scandir) as scandir:
+        assert index.exists(tmp_path / "a" / "1.jpg")
+        assert index.exists(tmp_path / "b" / "1.jpg")
+        assert index.exists(tmp_path / "a" / "1.jpg")
+        # Listing c drops b, the least recently used
+        assert index.exists(tmp_path / "c" / "1.jpg")
+        assert scandir.call_count == 3
+        assert index.exists(tmp_path / "b" / "1.jpg")
+        assert scandir.call_count == 4
+
+
+def test_max_entries_keeps_recent_files(tmp_path: Path):
+    index = DestinationIndex(max_entries=1, recent_files=2)
+    for name in ["a", "b", "c"]:
+        index.add(tmp_path / name / "1.jpg", FileInfo(1, 0.0))
+
+    # Listings of a and b were dropped before their files were written
+    assert not index.exists(tmp_path / "a" / "1.jpg")
+    assert index.exists(tmp_path / "b" / "1.jpg")
+    assert index.lookup(tmp_path / "b" / "1.jpg") == FileInfo(1, 0.0)
+    assert index.exists(tmp_path / "c" / "1.jpg")
+
+
+def test_ensure_dir_creates_once(tmp_path: Path):
+    index = DestinationIndex()
+    directory = tmp_path / "2020" / "01"
+
+    index.ensure_dir(directory)
+    directory.rmdir()
+    index.ensure_dir(directory)
+
+    assert not directory.exists()
+
+
+def test_copy_files_compare_size(temp_directory: Path):
+    src_dir = temp_directory / "source"
+    dest_dir = temp_directory / "destination"
+    existing = dest_dir / "2020" / "01" / "01" / "file01.jpg"
+    existing.parent.mkdir(parents=True)
+    existing.write_bytes(b"same name, other photo")
+
+    core.copy_files(src_dir, dest_dir, "%Y/%m/%d", compare=Compare.NAME)
+    assert existing.read_bytes() == b"same name, other photo"
+
+    core.copy_files(src_dir, dest_dir, "%Y/%m/%d", compare=Compare.SIZE)
+    assert existing.read_bytes() == (src_dir / "file01.jpg").read_bytes()
@@ -0,0 +1,168 @@
+from pathlib import Path
+
+import pytest
+from unittest.mock import patch
+
+from imgtrf import core
+from imgtrf import exceptions
+from imgtrf import journal
+from imgtrf import transfer
+from imgtrf.journal import Journal
+
+
+def test_load(tmp_path: Path):
+    path = journal.path_for(tmp_path, tmp_path / "src")
+    with Journal(path, tmp_path / "src") as record:
+        pairs = [(tmp_path / "a.jpg", tmp_path / "x.jpg")]
+        pairs.append((tmp_path / "b.jpg", tmp_path / "y.jpg"))
+        list(record.plan(pairs))
+        record.done(tmp_path / "a.jpg")
+
+    state = journal.load(path, tmp_path / "src")
+    assert state.pending == [(tmp_path / "b.jpg", tmp_path / "y.jpg")]
+    assert state.planned == {str(tmp_path / "a.jpg"), str(tmp_path / "b.jpg")}
+    assert state.indexed
+
+    assert journal.load(tmp_path / "missing.jsonl", tmp_path) is None
+    with pytest.raises(journal.JournalError):
+        journal.load(path, tmp_path / "other")
+
+
+def test_load_interrupted_while_indexing(tmp_path: Path):
+    path = journal.path_for(tmp_path, tmp_path)
+    with Journal(path, tmp_path) as record:
+        plan = record.plan([(tmp_path / "a.jpg", tmp_path / "x.jpg")])
+        next(plan)
+    with open(path, "a") as file:
+        file.write('{"op": "done", "sr')
+
+    state = journal.load(path, tmp_path)
+    assert len(state.pending) == 1
+    assert not state.indexed
+
+
+def test_journal_removed_after_transfer(temp_directory: Path):
+    dest_dir = temp_directory / "destination"
+    core.copy_files(temp_directory / "source", dest_dir, "%Y/%m/%d")
+    assert not list(dest_dir.glob(f"{journal.JOURNAL_PREFIX}*"))
+
+
+def test_journal_per_source(temp_directory: Path):
+    src_dir = temp_directory / "source"
+    other_src_dir = src_dir / "subfolder"
+    dest_dir = temp_directory / "destination"
+    assert journal.path_for(dest_dir, src_dir) != journal.path_for(
+        dest_dir, other_src_dir
+    )
+
+    # A run from another source neither replaces nor removes this journal
+    path = journal.path_for(dest_dir, src_dir)
+    with Journal(path, src_dir) as record:
+        next(record.plan([(src_dir / "file01.jpg", dest_dir / "file01.jpg")]))
+    core.copy_files(other_src_dir, dest_dir, "%Y/%m/%d")
+    assert len(journal.load(path, src_dir).pending) == 1
+
+
+def test_remove_missing_journal(tmp_path: Path):
+    record = Journal(journal.path_for(tmp_path, tmp_path), tmp_path)
+    record.path.unlink()
+    record.remove()
+
+
+def test_journal_kept_after_failure(temp_directory: Path):
+    src_dir = temp_directory / "source"
+    dest_dir = temp_directory / "destination"
+    copy_file = core._copy_file
+
+    def fail(src_file_path: Path, dest_path: Path, **kwargs):
+        if src_file_path.name == "file02.jpg":
+            raise OSError("Disk full")
+        copy_file(src_file_path, dest_path, **kwargs)
+
+    with patch("imgtrf.core._copy_file", fail), pytest.raises(exceptions.TransferError):
+        core.copy_files(src_dir, dest_dir, "%Y/%m/%d")
+
+    state = journal.load(journal.path_for(dest_dir, src_dir), src_dir)
+    assert [src.name for src, _ in state.pending] == ["file02.jpg"]
+
+    # Resuming neither walks nor indexes the source again
+    with patch("imgtrf.core.walk") as walk:
+        core.copy_files(src_dir, dest_dir, "%Y/%m/%d", resume=True)
+    walk.assert_not_called()
+    assert (dest_dir / "2020" / "02" / "01" / "file02.jpg").exists()
+    assert not journal.path_for(dest_dir, src_dir).exists()
+
+
+def test_journal_kept_after_unexpected_error(temp_directory: Path):
+    src_dir = temp_directory / "source"
+    dest_dir = temp_directory / "destination"
+
+    def fail(src_file_path: Path, dest_path: Path, **kwargs):
+        raise RuntimeError("Bug")
+
+    with patch("imgtrf.core._copy_file", fail), pytest.raises(
+        exceptions.TransferError
+    ) as error:
+        core.copy_files(src_dir, dest_dir, "%Y/%m/%d", jobs=2)
+
+    assert all(isinstance(e, RuntimeError) for _, e in error.value.failed)
+    assert len(journal.load(journal.path_for(dest_dir, src_dir), src_dir).pending) == 2
+
+
+@pytest.mark.parametrize("stream", [False, True])
+def test_resume_interrupted_indexing(temp_directory: Path, stream: bool):
+    src_dir = temp_directory / "source"
+    dest_dir = temp_directory / "destination"
+    planned = dest_dir / "2020" / "01" / "01" / "file01.jpg"
+    with Journal(journal.path_for(dest_dir, src_dir), src_dir) as record:
+        next(record.plan([(src_dir / "file01.jpg", planned)]))
+
+    core.move_files(src_dir, dest_dir, "%Y/%m/%d", stream=stream, resume=True)
+
+    assert planned.exists()
+    assert (dest_dir / "2020" / "02" / "01" / "file02.jpg").exists()
+    assert not (src_dir / "file01.jpg").exists()
+
+
+def test_resume_removes_partial_files(temp_directory: Path):
+    src_dir = temp_directory / "source"
+    dest_dir = temp_directory / "destination"
+    planned = dest_dir / "2020" / "01" / "01" / "file01.jpg"
+    core.move_files(src_dir, dest_dir, "%Y/%m/%d")
+
+    # Left by an earlier attempt of a move that completed before the crash
+    partial = transfer.temp_path_for(planned)
+    partial.write_bytes(b"partial")
+    with Journal(journal.path_for(dest_dir, src_dir), src_dir) as record:
+        next(record.plan([(src_dir / "file01.jpg", planned)]))
+
+    core.move_files(src_dir, dest_dir, "%Y/%m/%d", resume=True)
+
+    assert planned.exists()
+    assert not partial.exists()
+
+
+def test_resume_move_finished_before_crash(temp_directory: Path):
+    src_dir = temp_directory / "source"
+    dest_dir = temp_directory / "destination"
+    core.move_files(src_dir, dest_dir, "%Y/%m/%d")
+
+    # Journal where both moves completed but were never marked as done
+    with Journal(journal.path_for(dest_dir, src_dir), src_dir) as record:
+        list(
+            record.plan(
+                [
+                    (
+                        src_dir / "file01.jpg",
+                        dest_dir / "2020" / "01" / "01" / "file01.jpg",
+                    ),
+                    (
+                        src_dir / "subfolder" / "file02.jpg",
+                        dest_dir / "2020" / "02" / "01" / "file02.jpg",
+                    ),
+                ]
+            )
+        )
+
+    core.move_files(src_dir, dest_dir, "%Y/%m/%d", resume=True)
+    assert not journal.path_for(dest_dir, src_dir).exists()
@@ -0,0 +1,59 @@
+import json
+import logging
+from pathlib import Path
+import threading
+
+from imgtrf import logger
+
+
+def test_log_func_formats_nothing_when_disabled(caplog):
+    class Unprintable:
+        def __repr__(self):
+            raise AssertionError("formatted")
+
+    log = logging.getLogger("imgtrf.test_log_func")
+    decorated = logger.log_func(log)(lambda value: value)
+
+    with caplog.at_level(logging.INFO, logger=log.name):
+        value = Unprintable()
+        assert decorated(value) is value
+
+    with caplog.at_level(logging.DEBUG, logger=log.name):
+        assert decorated(1) == 1
+    assert "<lambda> returned: 1" in caplog.messages
+
+
+def test_file_sink(tmp_path: Path):
+    log = logging.getLogger("imgtrf.test_file_sink")
+    log.setLevel(logging.CRITICAL)
+    log_file = tmp_path / "run.log"
+
+    sink = logger.FileSink(log_file, log=log)
+    thread = threading.Thread(target=log.info, args=("Copying %s", "a.jpg"))
+    thread.start()
+    thread.join()
+    log.debug("Not written")
+    sink.close()
+
+    lines = log_file.read_text().splitlines()
+    assert len(lines) == 1
+    assert lines[0].endswith("INFO imgtrf.test_file_sink Copying a.jpg")
+    assert log.level == logging.CRITICAL
+
+
+def test_file_sink_json(tmp_path: Path):
+    log = logging.getLogger("imgtrf.test_file_sink_json")
+    log_file = tmp_path / "run.jsonl"
+
+    sink = logger.FileSink(log_file, json_lines=True, level=logging.DEBUG, log=log)
+    log.debug("Reading %s", Path("a.jpg"))
+    try:
+        raise OSError("disk")
+    except OSError:
+        log.exception("Failed")
+    sink.close()
+
+    entries = [json.loads(line) for line in log_file.read_text().splitlines()]
+    assert entries[0]["message"] == "Reading a.jpg"
+    assert entries[0]["level"] == "DEBUG"
+    assert "OSError: disk" in entries[1]["exception"]
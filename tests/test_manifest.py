@@ -0,0 +1,86 @@
+from pathlib import Path
+import shutil
+
+from unittest.mock import patch
+
+from imgtrf import core
+from imgtrf import manifest
+from imgtrf.dedup import Deduplicator, hash_file
+from imgtrf.manifest import MANIFEST_NAME, Manifest
+from imgtrf.transfer import Mode, TransferResult
+
+
+def test_record_and_load(tmp_path: Path):
+    dest = tmp_path / "2020" / "image.jpg"
+    dest.parent.mkdir()
+    dest.write_bytes(b"image data")
+
+    with Manifest(tmp_path / MANIFEST_NAME) as record:
+        record.record(tmp_path / "src.jpg", dest, TransferResult(Mode.COPY, 10, "ab"))
+
+    (entry,) = manifest.read(tmp_path / MANIFEST_NAME)
+    assert entry["dest"] == str(Path("2020") / "image.jpg")
+    assert entry["mode"] == "copy"
+
+    hashes = manifest.load_hashes(tmp_path / MANIFEST_NAME)
+    assert hashes[str(Path("2020") / "image.jpg")].digest == "ab"
+
+
+def test_load_hashes_skips_malformed_lines(tmp_path: Path):
+    path = tmp_path / MANIFEST_NAME
+    path.write_text(
+        '{"dest": "a.jpg", "size": 1, "mtime_ns": 2, "hash": "ab"}\n'
+        '{"dest": "b.jpg", "size": 1, "mtime_ns": 2, "hash": "cd"}\n'
+        '{"dest": "b.jpg", "size": 1, "mtime_ns": 2, "hash": null}\n'
+        '{"dest": "c.jpg", "si'
+    )
+    assert list(manifest.load_hashes(path)) == ["a.jpg"]
+    assert manifest.load_hashes(tmp_path / "missing.jsonl") == {}
+
+
+def test_add_tree_uses_known_hashes(tmp_path: Path):
+    path = tmp_path / "image.jpg"
+    path.write_bytes(b"image data")
+    stat = path.stat()
+    hashes = {"image.jpg": manifest.KnownHash(stat.st_size, stat.st_mtime_ns, "ab")}
+
+    deduplicator = Deduplicator()
+    deduplicator.add_tree(tmp_path, hashes)
+    assert deduplicator._by_size[stat.st_size][0].full_hash == "ab"
+
+    # Modified files are hashed again
+    stale = {"image.jpg": manifest.KnownHash(stat.st_size, 0, "ab")}
+    deduplicator = Deduplicator()
+    deduplicator.add_tree(tmp_path, stale)
+    assert deduplicator._by_size[stat.st_size][0].full_hash is None
+
+
+def test_copy_files_manifest_seeds_dedup(temp_directory: Path):
+    src_dir = temp_directory / "source"
+    dest_dir = temp_directory / "destination"
+
+    core.copy_files(src_dir, dest_dir, "%Y/%m/%d", verify=True, manifest=True)
+    entries = list(manifest.read(dest_dir / MANIFEST_NAME))
+    assert len(entries) == 2
+    copied = dest_dir / entries[0]["dest"]
+    assert entries[0]["hash"] == hash_file(copied)
+
+    # Same photos imported again under new names are found without reading the
+    # files already in the destination
+    again = temp_directory / "again"
+    shutil.copytree(src_dir, again)
+    with patch("imgtrf.dedup._hash_partial") as hash_partial:
+        core.copy_files(again, dest_dir, "%Y/%m", dedup=True)
+    hash_partial.assert_not_called()
+    assert not (dest_dir / "2020" / "01" / "file01.jpg").exists()
+
+
+def test_move_files_verify(temp_directory: Path):
+    src_dir = temp_directory / "source"
+    dest_dir = temp_directory / "destination"
+
+    with patch("imgtrf.transfer.same_device", return_value=False):
+        core.move_files(src_dir, dest_dir, "%Y/%m/%d", verify=True)
+
+    assert (dest_dir / "2020" / "01" / "01" / "file01.jpg").exists()
+    assert not (src_dir / "file01.jpg").exists()
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 from typing import Dict, Optional
 
@@ -37,3 +38,32 @@ def test_get_image_creation_time(mock_meta: Dict, expected: Optional[datetime]):
         creation_time = meta.get_image_creation_time('path/should/not/matter')
 
     assert creation_time == expected
+
+
+def test_time_source_name_skips_file(tmp_path: Path):
+    meta.configure([meta.TimeSource.NAME, meta.TimeSource.METADATA])
+    path = tmp_path / "IMG_20200101_123456.jpg"
+
+    # Never opened, so it does not even have to exist
+    with patch("imgtrf.meta.get_image_creation_time") as get_image_creation_time:
+        assert meta.get_creation_time(path) == datetime(2020, 1, 1, 12, 34, 56)
+    get_image_creation_time.assert_not_called()
+
+
+def test_time_source_order(temp_image: Path):
+    named = temp_image.rename(temp_image.with_name("IMG_20210101_000000.jpg"))
+
+    meta.configure([meta.TimeSource.METADATA, meta.TimeSource.NAME])
+    assert meta.get_creation_time(named) == datetime(2020, 1, 1, 12, 0)
+
+    meta.configure([meta.TimeSource.NAME, meta.TimeSource.METADATA])
+    assert meta.get_creation_time(named) == datetime(2021, 1, 1)
+
+
+def test_time_source_mtime(tmp_path: Path):
+    path = tmp_path / "no_metadata.jpg"
+    path.write_bytes(b"not an image")
+    os.utime(path, (0, datetime(2019, 6, 1, 8, 0).timestamp()))
+
+    meta.configure([meta.TimeSource.METADATA, meta.TimeSource.MTIME])
+    assert meta.get_creation_time(path) == datetime(2019, 6, 1, 8, 0)
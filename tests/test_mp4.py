@@ -0,0 +1,84 @@
+from datetime import datetime
+from pathlib import Path
+import struct
+
+import pytest
+from unittest.mock import patch
+
+from imgtrf import meta
+from imgtrf import mp4
+from conftest import create_video
+
+
+@pytest.mark.parametrize("moov_at_end", [False, True])
+def test_read_creation_time(tmp_path: Path, moov_at_end: bool):
+    path = create_video(
+        tmp_path, "video.mp4", datetime(2021, 6, 7, 8, 9, 10), moov_at_end=moov_at_end
+    )
+    assert mp4.read_creation_time(path) == datetime(2021, 6, 7, 8, 9, 10)
+
+
+def test_read_creation_time_quicktime_key(tmp_path: Path):
+    path = create_video(
+        tmp_path,
+        "video.mov",
+        creation_date=None,
+        creation_date_key="2022-01-02T03:04:05+0100",
+    )
+    assert mp4.read_creation_time(path) == datetime(2022, 1, 2, 3, 4, 5)
+
+
+def test_read_creation_time_unset(tmp_path: Path):
+    path = create_video(tmp_path, "video.mp4", creation_date=None)
+    assert mp4.read_creation_time(path) is None
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"\xff\xd8\xff\xe0" + bytes(12),
+        b"\x00\x00\x00\x10ftypisom",
+        b"\x00\x00\x00\x08ftyp",
+    ],
+)
+def test_read_creation_time_invalid(tmp_path: Path, data: bytes):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(data)
+    with pytest.raises(mp4.Mp4Error):
+        mp4.read_creation_time(path)
+
+
+def test_read_creation_time_out_of_range(tmp_path: Path):
+    # Version 1 movie header with a creation time far beyond year 9999
+    mvhd = b"mvhd" + bytes([1, 0, 0, 0]) + b"\xff" * 8 + bytes(8)
+    moov = struct.pack(">I", 8 + 4 + len(mvhd)) + b"moov"
+    moov += struct.pack(">I", 4 + len(mvhd)) + mvhd
+    path = tmp_path / "video.mp4"
+    path.write_bytes(moov)
+
+    with pytest.raises(mp4.Mp4Error):
+        mp4.read_creation_time(path)
+    with patch("imgtrf.meta.get_video_meta", return_value={}):
+        assert meta.get_video_creation_time(path) is None
+
+
+def test_get_video_creation_time_skips_ffprobe(tmp_path: Path):
+    path = create_video(tmp_path, "video.mp4", datetime(2021, 6, 7, 8, 9, 10))
+    with patch("imgtrf.meta.get_video_meta") as get_video_meta:
+        creation_time = meta.get_video_creation_time(path)
+
+    get_video_meta.assert_not_called()
+    assert creation_time == datetime(2021, 6, 7, 8, 9, 10)
+
+
+def test_get_video_creation_time_falls_back_on_ffprobe(tmp_path: Path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(b"not a video")
+    ffprobe_meta = {
+        "format": {"tags": {"creation_time": "2020-01-01T12:00:00.000000Z"}}
+    }
+    with patch("imgtrf.meta.get_video_meta", return_value=ffprobe_meta):
+        creation_time = meta.get_video_creation_time(path)
+
+    assert creation_time == datetime(2020, 1, 1, 12, 0)
@@ -0,0 +1,163 @@
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+
+from imgtrf import core, plan
+from imgtrf.plan import PlanError, PlannedTransfer
+
+
+def _transfers(src: Path, dest: Path, sizes):
+    return [
+        PlannedTransfer(
+            src / f"file{number}.jpg",
+            dest / "2020" / f"file{number}.jpg",
+            size,
+            datetime(2020, 1, 1, 12, number),
+        )
+        for number, size in enumerate(sizes)
+    ]
+
+
+def test_write_read(tmp_path: Path):
+    src, dest = tmp_path / "source", tmp_path / "destination"
+    transfers = _transfers(src, dest, [10, 20, 30])
+    plan_path = tmp_path / "plan.jsonl"
+
+    assert plan.write(plan_path, iter(transfers), src, dest, "Y/m") == 3
+    loaded = plan.read(plan_path)
+
+    assert loaded[:3] == (src, dest, "Y/m")
+    assert list(loaded.transfers.transfers()) == transfers
+    assert '"src": "file0.jpg"' in plan_path.read_text()
+
+
+def test_write_interrupted_keeps_old_plan(tmp_path: Path):
+    plan_path = tmp_path / "plan.jsonl"
+    plan_path.write_text("old")
+
+    def failing():
+        yield from _transfers(tmp_path, tmp_path, [1])
+        raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        plan.write(plan_path, failing(), tmp_path, tmp_path, "Y")
+    assert plan_path.read_text() == "old"
+    assert list(tmp_path.iterdir()) == [plan_path]
+
+
+@pytest.mark.parametrize("content", ["", "[]\n", '{"version": 99}\n'])
+def test_read_not_a_plan(tmp_path: Path, content: str):
+    plan_path = tmp_path / "plan.jsonl"
+    plan_path.write_text(content)
+    with pytest.raises(PlanError):
+        plan.read(plan_path)
+
+
+def test_read_malformed_line(tmp_path: Path):
+    plan_path = tmp_path / "plan.jsonl"
+    plan.write(plan_path, _transfers(tmp_path, tmp_path, [1]), tmp_path, tmp_path, "Y")
+    with open(plan_path, "a") as file:
+        file.write('{"src": "cut')
+    with pytest.raises(PlanError, match="line 3"):
+        plan.read(plan_path)
+
+
+def test_relocate(tmp_path: Path):
+    table = plan.PlanTable(_transfers(Path("/mnt/a"), Path("/mnt/a/b"), [1]))
+    relocated = plan.relocate(
+        plan.Plan(Path("/mnt/a"), Path("/mnt/a/b"), "Y", table),
+        tmp_path / "a",
+        tmp_path / "b",
+    )
+    assert list(relocated.transfers) == [
+        (tmp_path / "a" / "file0.jpg", tmp_path / "b" / "2020" / "file0.jpg")
+    ]
+
+
+@pytest.mark.parametrize("text,expected", [("1/1", (1, 1)), ("3/4", (3, 4))])
+def test_parse_shard(text: str, expected):
+    assert plan.parse_shard(text) == expected
+
+
+@pytest.mark.parametrize("text", ["0/2", "3/2", "1", "a/b", "1/0"])
+def test_parse_shard_invalid(text: str):
+    with pytest.raises(ValueError):
+        plan.parse_shard(text)
+
+
+def test_shard_balances_bytes(tmp_path: Path):
+    transfers = _transfers(tmp_path, tmp_path, [100, 10, 10, 10, 50, 40, 60, 5, 5])
+    table = plan.PlanTable(transfers)
+    shards = [list(plan.shard(table, index, 3).transfers()) for index in (1, 2, 3)]
+
+    assert sorted(sum(shards, []), key=transfers.index) == transfers
+    totals = [sum(planned.size for planned in shard) for shard in shards]
+    # Shards differ by at most the largest file
+    assert max(totals) - min(totals) <= 100
+    assert shards[0] == list(plan.shard(table, 1, 3).transfers())
+
+
+def test_plan_table(tmp_path: Path):
+    transfers = _transfers(tmp_path / "source", tmp_path / "destination", [1, 2])
+    transfers.append(
+        PlannedTransfer(
+            tmp_path / "source" / "a.jpg",
+            tmp_path / "destination" / "2020" / "a_1.jpg",
+            3,
+            datetime(1969, 12, 31, 23, 59, 59, 5),
+        )
+    )
+    table = plan.PlanTable(transfers)
+    table.extend([(tmp_path / "b.jpg", tmp_path / "2021" / "b.jpg")])
+
+    assert len(table) == 4
+    assert list(table.transfers())[:3] == transfers
+    assert list(table)[3] == (tmp_path / "b.jpg", tmp_path / "2021" / "b.jpg")
+    assert list(table.transfers())[3][2:] == (None, None)
+
+
+def test_plan_and_apply_shards(temp_directory: Path, tmp_path: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    plan_path = tmp_path / "plan.jsonl"
+
+    count = core.plan_files(src_path, dest_path, "%Y/%m/%d", plan_path)
+    assert count == 2
+    assert list(dest_path.iterdir()) == []
+
+    core.apply_plan(plan_path, shard=(1, 2))
+    core.apply_plan(plan_path, shard=(2, 2), move=True)
+    assert (dest_path / "2020" / "01" / "01" / "file01.jpg").exists()
+    assert (dest_path / "2020" / "02" / "01" / "file02.jpg").exists()
+    assert len(list(src_path.rglob("*.jpg"))) == 1
+
+    # Applying again finds every destination in place
+    core.apply_plan(plan_path, shard=(1, 2))
+    core.apply_plan(plan_path, shard=(2, 2), move=True)
+
+
+def test_apply_skips_changed_source(temp_directory: Path, tmp_path: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    plan_path = tmp_path / "plan.jsonl"
+    core.plan_files(src_path, dest_path, "%Y", plan_path)
+
+    with open(src_path / "file01.jpg", "ab") as file:
+        file.write(b"changed")
+    core.apply_plan(plan_path)
+
+    assert not (dest_path / "2020" / "file01.jpg").exists()
+    assert (dest_path / "2020" / "file02.jpg").exists()
+
+
+def test_apply_relocated(temp_directory: Path, tmp_path: Path):
+    src_path = temp_directory / "source"
+    dest_path = temp_directory / "destination"
+    plan_path = tmp_path / "plan.jsonl"
+    core.plan_files(src_path, dest_path, "%Y", plan_path)
+
+    moved_src = src_path.rename(tmp_path / "mounted")
+    core.apply_plan(plan_path, src_dir=moved_src, dest_dir=tmp_path / "other")
+
+    assert (tmp_path / "other" / "2020" / "file01.jpg").exists()
@@ -0,0 +1,69 @@
+import json
+from pathlib import Path
+import sys
+
+import pytest
+
+from imgtrf import exceptions
+from imgtrf import meta
+from imgtrf import probe
+
+pytestmark = pytest.mark.skipif(
+    sys.platform == "win32", reason="fake ffprobe is a shell script"
+)
+
+FFPROBE_OUTPUT = {"format": {"tags": {"creation_time": "2020-01-01T12:00:00.000000Z"}}}
+
+
+def create_ffprobe(directory: Path, body: str) -> str:
+    """Create executable standing in for ffprobe"""
+    path = directory / "ffprobe"
+    path.write_text(f"#!{sys.executable}\n{body}\n")
+    path.chmod(0o755)
+    return str(path)
+
+
+def test_probe(tmp_path: Path):
+    cmd = create_ffprobe(tmp_path, f"print({json.dumps(FFPROBE_OUTPUT)!r})")
+    pool = probe.ProbePool(max_workers=2, cmd=cmd)
+
+    assert pool.probe(tmp_path / "video.avi") == FFPROBE_OUTPUT
+
+
+def test_probe_failure(tmp_path: Path):
+    cmd = create_ffprobe(tmp_path, "import sys; sys.exit(1)")
+    pool = probe.ProbePool(cmd=cmd)
+
+    with pytest.raises(exceptions.MetaDataError):
+        pool.probe(tmp_path / "video.avi")
+
+
+def test_probe_timeout(tmp_path: Path):
+    cmd = create_ffprobe(tmp_path, "import time; time.sleep(10)")
+    pool = probe.ProbePool(cmd=cmd, timeout=0.2)
+
+    with pytest.raises(exceptions.MetaDataError, match="timed out"):
+        pool.probe(tmp_path / "video.avi")
+
+
+def test_probe_not_found(tmp_path: Path, caplog: pytest.LogCaptureFixture):
+    pool = probe.ProbePool(cmd=str(tmp_path / "missing-ffprobe"))
+
+    for _ in range(3):
+        with pytest.raises(probe.FFprobeNotFoundError):
+            pool.probe(tmp_path / "video.avi")
+
+    assert len([r for r in caplog.records if "ffprobe" in r.getMessage()]) == 1
+
+
+def test_get_video_creation_time_with_pool(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+):
+    cmd = create_ffprobe(tmp_path, f"print({json.dumps(FFPROBE_OUTPUT)!r})")
+    video = tmp_path / "video.mp4"
+    video.write_bytes(b"not parsable by the mp4 reader")
+
+    monkeypatch.setattr(probe, "_pool", probe.ProbePool(cmd=cmd))
+    creation_time = meta.get_video_creation_time(video)
+
+    assert creation_time.year == 2020
@@ -0,0 +1,49 @@
+import json
+from pathlib import Path
+
+from imgtrf import core
+from imgtrf import stats
+
+
+def test_timing_histogram():
+    timing = stats.Timing()
+    for seconds in [0.00005, 0.002, 0.002, 10.0]:
+        timing.add(seconds)
+
+    result = timing.to_dict()
+    assert result["count"] == 4
+    assert result["max"] == 10.0
+    counts = {bucket["le"]: bucket["count"] for bucket in result["histogram"]}
+    assert counts[0.0001] == 1
+    assert counts[0.005] == 2
+    assert counts[None] == 1
+
+
+def test_stats_write(tmp_path: Path):
+    run_stats = stats.Stats()
+    run_stats.count("skipped.existing")
+    run_stats.count("transfer.bytes", 100)
+    with run_stats.time("transfer.file"):
+        pass
+
+    run_stats.write(tmp_path / "stats.json")
+    data = json.loads((tmp_path / "stats.json").read_text())
+    assert data["counts"] == {"skipped.existing": 1, "transfer.bytes": 100}
+    assert data["timings"]["transfer.file"]["count"] == 1
+    assert run_stats.table().row_count == 3
+
+
+def test_copy_files_records_stages(temp_directory: Path):
+    src_dir = temp_directory / "source"
+    dest_dir = temp_directory / "destination"
+
+    run_stats = stats.reset()
+    core.copy_files(src_dir, dest_dir, "%Y/%m/%d")
+    core.copy_files(src_dir, dest_dir, "%Y/%m/%d")
+
+    assert run_stats.counts["walk.files"] == 4
+    assert run_stats.counts["transfer.files"] == 2
+    assert run_stats.counts["transfer.bytes"] > 0
+    assert run_stats.counts["skipped.existing"] == 2
+    assert run_stats.timings["metadata.image"].count == 4
+    assert run_stats.timings["index.lookup"].count == 4
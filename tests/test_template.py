@@ -0,0 +1,54 @@
+from datetime import datetime
+from pathlib import Path
+
+import pytest
+from unittest.mock import patch
+
+from imgtrf import core
+from imgtrf.template import PathTemplate
+
+
+@pytest.mark.parametrize(
+    "dir_format,expected_path",
+    [
+        ("%Y/{media}/{ext}", Path("2023/image/jpg")),
+        ("Y/m/{ext}", Path("2023/01/jpg")),
+        ("{media}/Y-m-d", Path("image/2023-01-01")),
+    ],
+)
+def test_tokens(dir_format: str, expected_path: Path):
+    template = PathTemplate(dir_format)
+    assert template.format(datetime(2023, 1, 1), Path("IMG_1.JPG")) == expected_path
+
+
+def test_unknown_token():
+    with pytest.raises(ValueError):
+        PathTemplate("%Y/{camera}")
+
+
+def test_tokens_need_path():
+    with pytest.raises(ValueError):
+        PathTemplate("%Y/{ext}").format(datetime(2023, 1, 1))
+
+
+def test_memoized_per_day():
+    template = PathTemplate("Y/m/d")
+    with patch.object(template, "_render", wraps=template._render) as render:
+        first = template.format(datetime(2023, 1, 1, 8, 30))
+        second = template.format(datetime(2023, 1, 1, 22, 15))
+        template.format(datetime(2023, 1, 2, 8, 30))
+
+    assert first is second
+    assert render.call_count == 2
+
+
+def test_memoized_per_hour():
+    template = PathTemplate("%Y/%m/%d/%H")
+    assert template.format(datetime(2023, 1, 1, 8, 30)) == Path("2023/01/01/08")
+    assert template.format(datetime(2023, 1, 1, 9, 30)) == Path("2023/01/01/09")
+
+
+def test_copy_files_tokens(temp_directory: Path):
+    dest_dir = temp_directory / "destination"
+    core.copy_files(temp_directory / "source", dest_dir, "{media}/%Y")
+    assert (dest_dir / "image" / "2020" / "file01.jpg").exists()
@@ -0,0 +1,235 @@
+import os
+from pathlib import Path
+import sys
+
+import pytest
+from unittest.mock import patch
+
+from imgtrf import transfer
+from imgtrf.dedup import hash_file, new_hash
+from imgtrf.transfer import Mode
+
+
+@pytest.fixture
+def src_file(tmp_path: Path) -> Path:
+    path = tmp_path / "src" / "image.jpg"
+    path.parent.mkdir()
+    path.write_bytes(b"image data")
+    os.utime(path, (1_000_000_000, 1_000_000_000))
+    return path
+
+
+@pytest.fixture
+def dest_file(tmp_path: Path) -> Path:
+    path = tmp_path / "dest" / "image.jpg"
+    path.parent.mkdir()
+    return path
+
+
+def test_copy_file(src_file: Path, dest_file: Path):
+    assert transfer.copy_file(src_file, dest_file).mode == Mode.COPY
+    assert dest_file.read_bytes() == b"image data"
+    assert dest_file.stat().st_mtime == src_file.stat().st_mtime
+    assert src_file.exists()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="inodes")
+def test_copy_file_hardlink(src_file: Path, dest_file: Path):
+    assert transfer.copy_file(src_file, dest_file, Mode.HARDLINK).mode == Mode.HARDLINK
+    assert dest_file.stat().st_ino == src_file.stat().st_ino
+
+
+def test_copy_file_reflink(src_file: Path, dest_file: Path):
+    # Falls back on copying where the file system can not clone
+    used = transfer.copy_file(src_file, dest_file, Mode.REFLINK).mode
+    assert used in (Mode.REFLINK, Mode.COPY)
+    assert dest_file.read_bytes() == b"image data"
+    assert dest_file.stat().st_mtime == src_file.stat().st_mtime
+
+
+def test_copy_file_rename(src_file: Path, dest_file: Path):
+    with pytest.raises(ValueError):
+        transfer.copy_file(src_file, dest_file, Mode.RENAME)
+
+
+@pytest.mark.parametrize("mode", [Mode.HARDLINK, Mode.REFLINK])
+def test_copy_file_other_device(src_file: Path, dest_file: Path, mode: Mode):
+    with patch("imgtrf.transfer.same_device", return_value=False):
+        assert transfer.copy_file(src_file, dest_file, mode).mode == Mode.COPY
+    assert dest_file.read_bytes() == b"image data"
+
+
+def test_copy_file_hardlink_replaces_existing(src_file: Path, dest_file: Path):
+    dest_file.write_bytes(b"old")
+    assert transfer.copy_file(src_file, dest_file, Mode.HARDLINK).mode == Mode.COPY
+    assert dest_file.read_bytes() == b"image data"
+
+
+@pytest.mark.parametrize("mode", [Mode.RENAME, Mode.HARDLINK, Mode.COPY])
+def test_move_file(src_file: Path, dest_file: Path, mode: Mode):
+    transfer.move_file(src_file, dest_file, mode)
+    assert dest_file.read_bytes() == b"image data"
+    assert not src_file.exists()
+
+
+def test_move_file_other_device(src_file: Path, dest_file: Path):
+    with patch("imgtrf.transfer.same_device", return_value=False):
+        assert transfer.move_file(src_file, dest_file).mode == Mode.COPY
+    assert dest_file.read_bytes() == b"image data"
+    assert not src_file.exists()
+
+
+@pytest.mark.parametrize("kernel_copy", [True, False])
+def test_copy_data(tmp_path: Path, kernel_copy: bool):
+    src = tmp_path / "src.bin"
+    src.write_bytes(os.urandom(3 * 1024 + 17))
+    dest = tmp_path / "dest.bin"
+
+    kernel_copies = transfer._KERNEL_COPY if kernel_copy else []
+    with patch("imgtrf.transfer._KERNEL_COPY", kernel_copies):
+        with open(src, "rb") as src_file, open(dest, "wb") as dest_file:
+            size = transfer.copy_data(src_file, dest_file, buffer_size=1024)
+
+    assert size == src.stat().st_size
+    assert dest.read_bytes() == src.read_bytes()
+
+
+def test_copy_data_falls_back(tmp_path: Path):
+    src = tmp_path / "src.bin"
+    src.write_bytes(b"data" * 100)
+    dest = tmp_path / "dest.bin"
+
+    def unsupported(*args):
+        raise OSError(transfer.errno.EXDEV, "Cross-device link")
+
+    with patch("imgtrf.transfer._KERNEL_COPY", [unsupported]):
+        with open(src, "rb") as src_file, open(dest, "wb") as dest_file:
+            transfer.copy_data(src_file, dest_file)
+
+    assert dest.read_bytes() == src.read_bytes()
+
+
+def test_durability_none(src_file: Path, dest_file: Path):
+    durability = transfer.Durability(transfer.Sync.NONE)
+    with patch("imgtrf.transfer._fsync") as fsync:
+        transfer.copy_file(src_file, dest_file, durability=durability)
+        durability.flush()
+    fsync.assert_not_called()
+
+
+def _synced(fsync) -> list:
+    return [call.args[0] for call in fsync.call_args_list]
+
+
+def test_durability_file(src_file: Path, dest_file: Path):
+    durability = transfer.Durability(transfer.Sync.FILE)
+    renamed = []
+
+    def fsync(path: str):
+        renamed.append(dest_file.exists())
+
+    with patch("imgtrf.transfer._fsync", side_effect=fsync) as fsync_mock:
+        transfer.copy_file(src_file, dest_file, durability=durability)
+
+    # Data is synced before it is renamed into place, the directory after
+    synced = _synced(fsync_mock)
+    assert synced[0] == str(transfer.temp_path_for(dest_file))
+    assert renamed[0] is False
+    if sys.platform != "win32":
+        assert synced[1:] == [str(dest_file.parent)]
+
+
+def test_durability_batch(tmp_path: Path):
+    durability = transfer.Durability(transfer.Sync.BATCH, interval=25)
+    directory = tmp_path / "2020"
+    directory.mkdir()
+    with patch("imgtrf.transfer._fsync") as fsync:
+        durability.add_file(directory / "a.jpg", 10)
+        durability.add_file(directory / "b.jpg", 10)
+        assert fsync.call_count == 0
+
+        durability.add_file(directory / "c.jpg", 10)
+        synced = _synced(fsync)
+
+    # The directory is synced once for all three files
+    if sys.platform != "win32":
+        assert synced == [str(directory)]
+
+
+def test_move_file_syncs_before_removing_source(src_file: Path, dest_file: Path):
+    durability = transfer.Durability(transfer.Sync.BATCH)
+    source_kept = []
+
+    def fsync(path: str):
+        source_kept.append(src_file.exists())
+
+    with patch("imgtrf.transfer.same_device", return_value=False), patch(
+        "imgtrf.transfer._fsync", side_effect=fsync
+    ) as fsync_mock:
+        transfer.move_file(src_file, dest_file, durability=durability)
+
+    expected = [str(transfer.temp_path_for(dest_file))]
+    if sys.platform != "win32":
+        expected.append(str(dest_file.parent))
+    assert _synced(fsync_mock) == expected
+    assert all(source_kept)
+    assert not src_file.exists()
+
+
+@pytest.mark.skipif(sys.platform == "win32", reason="Directories are not synced")
+def test_move_file_hardlink_syncs_directory(src_file: Path, dest_file: Path):
+    durability = transfer.Durability(transfer.Sync.BATCH)
+    with patch("imgtrf.transfer._fsync") as fsync:
+        result = transfer.move_file(
+            src_file, dest_file, mode=Mode.HARDLINK, durability=durability
+        )
+
+    assert result.mode == Mode.HARDLINK
+    assert _synced(fsync) == [str(dest_file.parent)]
+
+
+def test_copy_file_verify(src_file: Path, dest_file: Path):
+    result = transfer.copy_file(src_file, dest_file, verify=True)
+    assert result.size == len(b"image data")
+    assert result.digest == hash_file(src_file)
+
+
+def test_copy_data_hashes_chunks(tmp_path: Path):
+    src = tmp_path / "src.bin"
+    src.write_bytes(os.urandom(3 * 1024 + 17))
+    dest = tmp_path / "dest.bin"
+
+    digest = new_hash()
+    with open(src, "rb") as src_file, open(dest, "wb") as dest_file:
+        transfer.copy_data(src_file, dest_file, buffer_size=1024, digest=digest)
+
+    assert digest.hexdigest() == hash_file(src)
+    assert dest.read_bytes() == src.read_bytes()
+
+
+def test_move_file_verify_mismatch_keeps_source(src_file: Path, dest_file: Path):
+    def corrupting_copy(src, dest, buffer_size, digest=None):
+        digest.update(src.read())
+        dest.write(b"corrupt")
+        return 7
+
+    with patch("imgtrf.transfer.same_device", return_value=False), patch(
+        "imgtrf.transfer.copy_data", corrupting_copy
+    ):
+        with pytest.raises(transfer.VerificationError):
+            transfer.move_file(src_file, dest_file, verify=True)
+
+    assert src_file.exists()
+    assert not dest_file.exists()
+
+
+def test_interrupted_copy_leaves_no_file(src_file: Path, dest_file: Path):
+    def interrupted_copy(src, dest, buffer_size, digest=None):
+        dest.write(b"image")
+        raise KeyboardInterrupt
+
+    with patch("imgtrf.transfer.copy_data", interrupted_copy):
+        with pytest.raises(KeyboardInterrupt):
+            transfer.copy_file(src_file, dest_file)
+
+    assert list(dest_file.parent.iterdir()) == []
@@ -0,0 +1,111 @@
+from datetime import datetime
+import os
+from pathlib import Path
+import threading
+import time
+
+import pytest
+
+from imgtrf import core
+from imgtrf import watch
+from conftest import create_image
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_settler(tmp_path: Path):
+    path = tmp_path / "upload.jpg"
+    path.write_bytes(b"half")
+    clock = FakeClock()
+    settler = watch.Settler(settle_time=2.0, clock=clock)
+
+    settler.add({str(path)})
+    assert settler.pop_settled() == []
+
+    clock.now = 1.5
+    path.write_bytes(b"half written")
+    assert settler.pop_settled() == []
+
+    clock.now = 3.0
+    assert settler.pop_settled() == []
+    clock.now = 3.5
+    assert settler.pop_settled() == [path]
+    assert len(settler) == 0
+
+
+def test_settler_drops_removed_files(tmp_path: Path):
+    settler = watch.Settler()
+    settler.add({str(tmp_path / "renamed.tmp")})
+    assert settler.pop_settled() == []
+    assert len(settler) == 0
+
+
+def _watchers():
+    params = [pytest.param(False, id="polling")]
+    available = watch.InotifyWatcher.available()
+    params.append(
+        pytest.param(
+            True,
+            id="inotify",
+            marks=pytest.mark.skipif(not available, reason="Requires inotify"),
+        )
+    )
+    return params
+
+
+@pytest.mark.parametrize("inotify", _watchers())
+def test_watcher_reports_new_files(tmp_path: Path, inotify: bool):
+    (tmp_path / "existing.jpg").write_bytes(b"old")
+    if inotify:
+        watcher = watch.InotifyWatcher(tmp_path)
+    else:
+        watcher = watch.PollingWatcher(tmp_path, interval=0)
+
+    try:
+        assert watcher.poll(0.1) == set()
+
+        (tmp_path / "new.jpg").write_bytes(b"new")
+        (tmp_path / "album").mkdir()
+        (tmp_path / "album" / "nested.jpg").write_bytes(b"nested")
+
+        reported = set()
+        deadline = time.monotonic() + 5
+        while len(reported) < 2 and time.monotonic() < deadline:
+            reported |= watcher.poll(0.1)
+    finally:
+        watcher.close()
+
+    assert reported == {
+        str(tmp_path / "new.jpg"),
+        str(tmp_path / "album" / "nested.jpg"),
+    }
+
+
+def test_watch_transfers_arriving_files(tmp_path: Path):
+    src_dir = tmp_path / "source"
+    src_dir.mkdir()
+    dest_dir = tmp_path / "destination"
+    expected = dest_dir / "2020" / "03" / "01" / "file03.jpg"
+
+    def transfer(batch):
+        core.copy_files(src_dir, dest_dir, "%Y/%m/%d", sources=batch)
+        stop.set()
+
+    stop = threading.Event()
+    watcher = watch.PollingWatcher(src_dir, interval=0)
+    thread = threading.Thread(
+        target=watch.watch, args=(watcher, transfer, 0.1, stop), daemon=True
+    )
+    thread.start()
+    create_image(src_dir, "file03.jpg", datetime(2020, 3, 1, 12, 00))
+    (src_dir / "notes.txt").write_text("not an image")
+    thread.join(timeout=10)
+
+    assert expected.exists()
+    assert os.listdir(dest_dir) == ["2020"]